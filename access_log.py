@@ -0,0 +1,179 @@
+# access_log.py
+import atexit
+import glob
+import gzip
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+
+from flask import g, request
+
+from streaming import install_response_close, on_response_close
+
+
+# 缓冲多少条或多少秒后写一次文件
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+# 队列中最多积压的记录数，写入跟不上时丢弃新记录而不是拖慢请求
+MAX_PENDING = 20000
+# 静态资源（draw.io 编辑器一次加载几百个文件）的端点，可以按比例抽样记录
+STATIC_ENDPOINTS = {'static', 'drawio_static', 'drawio_root_resources'}
+
+# 交给事件循环异步发送的响应：字节数取 Content-Length，耗时只到交出连接为止
+ASYNC_NOTE = ' (async hand-off, approximate)'
+
+_STOP = object()
+
+
+def compress_old_logs(logs_dir, today):
+    """把今天以前的 access_日期.log 压缩为 .log.gz"""
+    for path in glob.glob(os.path.join(logs_dir, 'access_*.log')):
+        date = os.path.basename(path)[len('access_'):-len('.log')]
+        if date >= today:
+            continue
+        tmp_path = f'{path}.gz.{os.getpid()}.tmp'
+        try:
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, path + '.gz')
+            os.remove(path)
+        except OSError as e:
+            # 多进程模式下其他进程可能已经压缩过
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if os.path.exists(path):
+                print(f"[警告] 压缩访问日志失败: {path}: {e}")
+
+
+class AccessLogWriter:
+    """
+    异步访问日志：请求线程只把字段放进队列，后台线程批量格式化并写入 access_日期.log
+    按记录的日期切换文件（跨天自动轮换），切换后在另一个线程中压缩旧文件
+    """
+
+    def __init__(self):
+        self.logs_dir = None
+        self.dropped = 0
+        self._queue = queue.Queue(MAX_PENDING)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_date = None
+
+    def init(self, logs_dir):
+        self.logs_dir = logs_dir
+        atexit.register(self.close)
+
+    def record(self, fields):
+        """fields 为 (时间戳, IP, 方法, 路径, 状态码, 字节数, 耗时毫秒, User-Agent, 是否异步发送)"""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        # 写入线程在首次记录时创建，多进程模式下每个子进程各自拥有
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._write(batch)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + FLUSH_INTERVAL
+                batch.append(item)
+            if batch and (len(batch) >= BATCH_SIZE or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        lines = []
+        for timestamp, ip, method, path, status, size, elapsed_ms, user_agent, async_sent in batch:
+            local = time.localtime(timestamp)
+            date = time.strftime('%Y-%m-%d', local)
+            if date != self._file_date:
+                self._flush(lines)
+                lines = []
+                self._open(date)
+            lines.append(f"{time.strftime('%Y-%m-%d %H:%M:%S', local)} - IP: {ip} | Method: {method} | "
+                         f"Path: {path} | Status: {status} | Bytes: {size} | Time: {elapsed_ms:.1f}ms"
+                         f"{ASYNC_NOTE if async_sent else ''} | User-Agent: {user_agent}\n")
+        self._flush(lines)
+
+    def _open(self, date):
+        if self._file is not None:
+            self._file.close()
+        self._file_date = date
+        self._file = open(os.path.join(self.logs_dir, f'access_{date}.log'), 'a', encoding='utf-8')
+        # 启动或跨天时压缩以前的日志，不阻塞写入
+        threading.Thread(target=compress_old_logs, args=(self.logs_dir, date),
+                         name='access-log-compress', daemon=True).start()
+
+    def _flush(self, lines):
+        if not lines:
+            return
+        try:
+            # 一次写入整批，多进程追加同一个文件时行不会交错
+            self._file.write(''.join(lines))
+            self._file.flush()
+        except OSError as e:
+            print(f"[警告] 写入访问日志失败: {e}")
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+access_log = AccessLogWriter()
+
+
+def init_app(app, logs_dir):
+    """
+    注册请求钩子：before_request 记下开始时间，响应体发送完时把状态码、实际发送的字节数和耗时交给后台线程
+    交给事件循环异步发送的大文件无法知道何时发完，这样的记录带有 ASYNC_NOTE 标注
+    """
+    access_log.init(logs_dir)
+    install_response_close(app)
+
+    @app.before_request
+    def start_access_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_access(response):
+        if request.endpoint in STATIC_ENDPOINTS and response.status_code < 400:
+            rate = app.config.get('ACCESS_LOG_STATIC_SAMPLE', 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return response
+        started = g.get('request_started')
+        timestamp = time.time()
+        fields = (request.environ.get('REMOTE_ADDR'), request.method, request.path, response.status_code)
+        user_agent = request.headers.get('User-Agent', 'Unknown')
+
+        def record(sent, async_sent):
+            elapsed_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+            access_log.record((timestamp, *fields, sent, elapsed_ms, user_agent, async_sent))
+
+        on_response_close(record)
+        return response
@@ -0,0 +1,113 @@
+# app_env.py
+"""程序目录、配置与日志位置、本机地址等运行环境信息，GUI 与无界面服务共用（不依赖 Flask 和 PyQt5）"""
+import os
+import sys
+import socket
+
+
+# =============================
+# 资源与路径处理函数
+# =============================
+
+def get_resource_path(relative_path):
+    """
+    获取资源路径：
+    - 开发环境：返回相对于 .py 文件的路径
+    - 打包环境：返回相对于 .exe 文件的路径（外部文件夹）
+    """
+    if getattr(sys, 'frozen', False):
+        # 打包环境：exe 所在目录
+        base_path = os.path.dirname(sys.executable)
+    else:
+        # 开发环境：.py 文件所在目录
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, relative_path)
+
+
+def get_config_path():
+    """获取配置文件路径，优先exe/py所在目录，否则用户目录"""
+    config_name = 'config.ini'
+    
+    # 获取程序所在目录（打包后是exe目录，开发时是.py文件目录）
+    if getattr(sys, 'frozen', False):
+        # 打包环境：exe所在目录
+        base_dir = os.path.dirname(sys.executable)
+        print(f"[调试] 打包模式 - exe目录: {base_dir}")
+    else:
+        # 开发环境：.py文件所在目录
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        print(f"[调试] 开发模式 - py目录: {base_dir}")
+    
+    program_dir_path = os.path.join(base_dir, config_name)
+    print(f"[调试] 配置文件路径: {program_dir_path}")
+    
+    # 如果配置文件已存在于程序目录，直接返回
+    if os.path.exists(program_dir_path):
+        print(f"[调试] 配置文件已存在")
+        return program_dir_path
+    
+    # 配置文件不存在，测试程序目录是否可写
+    try:
+        # 使用临时文件测试写权限
+        test_file = os.path.join(base_dir, '.config_write_test')
+        with open(test_file, 'w') as f:
+            f.write('test')
+        os.remove(test_file)
+        # 程序目录可写，使用程序目录
+        print(f"[调试] 程序目录可写，配置文件将创建在: {program_dir_path}")
+        return program_dir_path
+    except Exception as e:
+        # 程序目录不可写，使用用户目录
+        config_dir = os.path.join(os.path.expanduser("~"), ".yobboy_file_server")
+        os.makedirs(config_dir, exist_ok=True)
+        fallback_path = os.path.join(config_dir, config_name)
+        print(f"[调试] 程序目录不可写({e})，使用用户目录: {fallback_path}")
+        return fallback_path
+
+
+def get_logs_dir():
+    """获取日志目录，优先exe/py所在目录，否则用户目录"""
+    # 获取程序所在目录（打包后是exe目录，开发时是.py文件目录）
+    if getattr(sys, 'frozen', False):
+        # 打包环境：exe所在目录
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        # 开发环境：.py文件所在目录
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    logs_dir = os.path.join(base_dir, "logs")
+    try:
+        os.makedirs(logs_dir, exist_ok=True)
+        test_file = os.path.join(logs_dir, '.test')
+        with open(test_file, 'w'):
+            pass
+        os.remove(test_file)
+        return logs_dir
+    except:
+        logs_dir = os.path.join(os.path.expanduser("~"), ".yobboy_file_server", "logs")
+        os.makedirs(logs_dir, exist_ok=True)
+        return logs_dir
+
+
+def get_local_ips():
+    """获取本机所有 IPv4 地址 (除回环地址)"""
+    ip_list = []
+    try:
+        hostname = socket.gethostname()
+        addr_info = socket.getaddrinfo(hostname, None)
+        for info in addr_info:
+            if info[0] == socket.AF_INET:
+                ip = info[4][0]
+                if ip != '127.0.1' and ip not in ip_list:
+                    ip_list.append(ip)
+    except Exception as e:
+        print(f"获取本地 IP 时出错: {e}")
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            default_ip = s.getsockname()[0]
+            if default_ip not in ip_list:
+                ip_list.append(default_ip)
+    except Exception:
+        pass
+    return ip_list
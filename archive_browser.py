@@ -0,0 +1,239 @@
+# archive_browser.py
+import os
+import posixpath
+import struct
+import tarfile
+import zipfile
+
+from file_cache import FileCache
+from streaming import STREAM_CHUNK_SIZE, iter_file_range
+from tracing import traced
+
+
+# 支持浏览的压缩包类型（按文件名后缀判断，注意 .tar.gz 这类双后缀）
+ARCHIVE_EXTENSIONS = ['.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz']
+# 未压缩的 tar 成员可以直接按偏移读取，支持 Range
+PLAIN_TAR_EXTENSIONS = ['.tar']
+
+archive_index_cache = FileCache('archive_index', max_entries=64)
+
+
+def is_archive_name(name):
+    """根据文件名判断是否为可浏览的压缩包"""
+    lower = name.lower()
+    return any(lower.endswith(ext) for ext in ARCHIVE_EXTENSIONS)
+
+
+def split_archive_path(root_dir, rel_path):
+    """
+    将虚拟路径拆分为 (压缩包完整路径, 包内路径)
+    例如 'data/a.zip/docs/readme.txt' -> ('<root>/data/a.zip', 'docs/readme.txt')
+    路径中不包含压缩包时返回 (None, None)
+    """
+    parts = [p for p in rel_path.replace('\\', '/').split('/') if p]
+    current = root_dir
+    for i, part in enumerate(parts):
+        current = os.path.join(current, part)
+        if os.path.isdir(current):
+            continue
+        if os.path.isfile(current) and is_archive_name(part):
+            return current, '/'.join(parts[i + 1:])
+        break
+    return None, None
+
+
+def _normalize_member_name(name):
+    """统一包内路径：去掉开头的 ./ 和 /，目录不带结尾斜杠"""
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.strip('/')
+
+
+def _build_zip_index(full_path):
+    entries = {}
+    with zipfile.ZipFile(full_path) as zf:
+        for info in zf.infolist():
+            name = _normalize_member_name(info.filename)
+            if not name:
+                continue
+            entries[name] = {
+                'name': name,
+                'is_dir': info.is_dir(),
+                'size': info.file_size,
+                'compressed_size': info.compress_size,
+                'stored': info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1,
+                'encrypted': bool(info.flag_bits & 0x1),
+                'header_offset': info.header_offset,
+                # 压缩包中记录的原始名称（可能带 ./、开头的 / 或反斜杠），打开成员时要用它
+                'filename': info.filename,
+                'mtime': info.date_time
+            }
+    return entries
+
+
+def _build_tar_index(full_path):
+    entries = {}
+    plain = any(full_path.lower().endswith(ext) for ext in PLAIN_TAR_EXTENSIONS)
+    # 流式模式顺序读取，压缩的 tar 只需完整解压一遍即可建立索引
+    with tarfile.open(full_path, 'r|*') as tf:
+        for info in tf:
+            name = _normalize_member_name(info.name)
+            if not name or not (info.isfile() or info.isdir()):
+                continue
+            entries[name] = {
+                'name': name,
+                'is_dir': info.isdir(),
+                'size': info.size,
+                'stored': plain,
+                'encrypted': False,
+                'data_offset': info.offset_data,
+                'mtime': info.mtime
+            }
+    return entries
+
+
+def get_archive_index(full_path):
+    """
+    获取压缩包成员索引（按 mtime 缓存），返回:
+    {'entries': {包内路径: 成员信息}, 'children': {目录: {子项名: 是否目录}}}
+    """
+    def compute():
+        if full_path.lower().endswith('.zip'):
+            entries = _build_zip_index(full_path)
+        else:
+            entries = _build_tar_index(full_path)
+
+        # 根据成员路径推导目录树，补齐压缩包中未显式记录的中间目录
+        children = {'': {}}
+        for name, entry in entries.items():
+            parent = posixpath.dirname(name)
+            children.setdefault(parent, {})[posixpath.basename(name)] = entry['is_dir']
+            if entry['is_dir']:
+                children.setdefault(name, {})
+            while parent:
+                grandparent = posixpath.dirname(parent)
+                children.setdefault(grandparent, {})[posixpath.basename(parent)] = True
+                children.setdefault(parent, {})
+                parent = grandparent
+        return {'entries': entries, 'children': children}
+    return archive_index_cache.get_or_compute(full_path, compute)
+
+
+@traced('archive.list_dir')
+def list_archive_dir(full_path, inner_dir):
+    """列出压缩包内某个目录，返回 (子目录名列表, [(文件名, 成员信息)])；目录不存在返回 None"""
+    index = get_archive_index(full_path)
+    inner_dir = _normalize_member_name(inner_dir)
+    names = index['children'].get(inner_dir)
+    if names is None:
+        return None
+    directories = []
+    files = []
+    for name, is_dir in names.items():
+        member = posixpath.join(inner_dir, name) if inner_dir else name
+        if is_dir:
+            directories.append(name)
+        else:
+            files.append((name, index['entries'].get(member, {'size': 0})))
+    return directories, files
+
+
+def get_member_info(full_path, member):
+    """获取单个成员信息，不存在或是目录时返回 None"""
+    entry = get_archive_index(full_path)['entries'].get(_normalize_member_name(member))
+    if entry is None or entry['is_dir']:
+        return None
+    return entry
+
+
+def _zip_data_offset(full_path, header_offset):
+    """读取 zip 本地文件头，计算成员数据在压缩包中的起始偏移"""
+    with open(full_path, 'rb') as f:
+        f.seek(header_offset)
+        header = f.read(30)
+    signature, *_, name_len, extra_len = struct.unpack('<IHHHHHIIIHH', header)
+    if signature != 0x04034b50:
+        raise zipfile.BadZipFile('本地文件头损坏')
+    return header_offset + 30 + name_len + extra_len
+
+
+def _skip_and_limit(chunks, start, length):
+    """对顺序解压得到的数据流跳过前 start 字节，最多产出 length 字节"""
+    remaining = length
+    for chunk in chunks:
+        if start >= len(chunk):
+            start -= len(chunk)
+            continue
+        if start:
+            chunk = chunk[start:]
+            start = 0
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+        if remaining <= 0:
+            break
+
+
+def _iter_zip_member(full_path, filename):
+    with zipfile.ZipFile(full_path) as zf:
+        with zf.open(filename) as stream:
+            while True:
+                chunk = stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def _iter_tar_member(full_path, member):
+    with tarfile.open(full_path, 'r|*') as tf:
+        for info in tf:
+            if _normalize_member_name(info.name) != member:
+                continue
+            stream = tf.extractfile(info)
+            while True:
+                chunk = stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            break
+
+
+def open_member(full_path, member):
+    """
+    打开压缩包成员，返回 (成员信息, read_range, 是否支持随机读取)
+    - 未压缩成员（zip stored / 普通 tar）直接按偏移读取原文件，支持 Range
+    - 压缩成员边读边解压，只能顺序读取
+    """
+    member = _normalize_member_name(member)
+    entry = get_member_info(full_path, member)
+    if entry is None:
+        return None, None, False
+    if entry['encrypted']:
+        raise zipfile.BadZipFile('不支持加密的压缩包成员')
+
+    if entry['stored']:
+        if 'data_offset' in entry:
+            data_offset = entry['data_offset']
+        else:
+            data_offset = _zip_data_offset(full_path, entry['header_offset'])
+
+        def read_range(start, length):
+            return iter_file_range(full_path, data_offset + start, length)
+        return entry, read_range, True
+
+    is_zip = full_path.lower().endswith('.zip')
+
+    def read_range(start, length):
+        chunks = _iter_zip_member(full_path, entry['filename']) if is_zip else _iter_tar_member(full_path, member)
+        return _skip_and_limit(chunks, start, length)
+    return entry, read_range, False
+
+
+def read_member_head(full_path, member, limit):
+    """读取成员开头最多 limit 字节，用于文本预览"""
+    entry, read_range, _ = open_member(full_path, member)
+    if entry is None:
+        return None
+    return b''.join(read_range(0, min(limit, entry['size'])))
@@ -0,0 +1,143 @@
+# async_transfer.py
+import asyncio
+import os
+import socket
+import threading
+
+from werkzeug.wsgi import FileWrapper
+
+from streaming import ResponseBody
+
+
+# 响应体至少这么大才交给事件循环发送，小文件直接在工作线程中发送更快
+DEFAULT_MIN_BYTES = 1024 * 1024
+# 事件循环同时发送的连接数上限，超过后退回工作线程发送
+DEFAULT_MAX_TRANSFERS = 10000
+# 每次 sendfile 的字节数；每一段都要在 io_timeout 内发完，否则认为客户端已经失联
+PIECE_BYTES = 1024 * 1024
+
+
+class TransferFileWrapper(FileWrapper):
+    """
+    作为 environ['wsgi.file_wrapper'] 提供给应用，send_file/send_from_directory 返回的响应体会是它，
+    服务器据此认出“响应体是一个真实文件”，可以交给事件循环用 sendfile 发送
+    """
+
+
+def sendfile_source(application_iter):
+    """
+    应用返回的响应体如果是真实文件，返回 (文件对象, 起始偏移)，否则返回 None
+    Range 请求时 Werkzeug 会再包一层 _RangeWrapper，起始偏移取它的 start_byte
+    """
+    if isinstance(application_iter, ResponseBody):
+        application_iter = application_iter.body
+    inner = getattr(application_iter, 'iterable', None)
+    if isinstance(inner, TransferFileWrapper):
+        return inner.file, application_iter.start_byte
+    if isinstance(application_iter, TransferFileWrapper):
+        return application_iter.file, application_iter.file.tell()
+    return None
+
+
+class TransferEngine:
+    """
+    在单独线程的 asyncio 事件循环中发送大文件响应体：
+    工作线程发送完响应头后把套接字和文件交给这里，随即返回线程池处理下一个请求；
+    事件循环用非阻塞套接字 + sendfile 发送，慢速客户端只占用一个协程和几个文件描述符，而不是一个线程
+    发送结束后关闭连接（不再回到线程池继续处理长连接上的后续请求）
+    """
+
+    def __init__(self, max_transfers=DEFAULT_MAX_TRANSFERS, io_timeout=60):
+        self.max_transfers = max_transfers
+        self.io_timeout = io_timeout
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._tasks = set()
+        self.bytes_sent = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_loop(self):
+        # 事件循环在首次使用时创建，多进程模式下每个子进程各自拥有
+        if self._loop is None:
+            ready = threading.Event()
+
+            def run():
+                self._loop = asyncio.new_event_loop()
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name='async-transfer', daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self._loop
+
+    def try_reserve(self):
+        """占用一个发送名额，已满时返回 False，由调用方在工作线程中自行发送"""
+        with self._lock:
+            if self._active >= self.max_transfers:
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    def submit(self, connection, file, offset, count):
+        """
+        接管已经发送完响应头的连接：connection 是套接字对象（之后由引擎负责关闭），
+        file 的文件描述符会被复制一份，调用方可以照常关闭自己的文件对象
+        调用前必须已经 try_reserve() 成功
+        """
+        try:
+            handoff_file = open(os.dup(file.fileno()), 'rb')
+            sock = socket.socket(fileno=connection.detach())
+        except OSError:
+            self.release()
+            raise
+        loop = self._ensure_loop()
+        loop.call_soon_threadsafe(self._start, sock, handoff_file, offset, count)
+
+    def _start(self, sock, file, offset, count):
+        task = self._loop.create_task(self._send(sock, file, offset, count))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, sock, file, offset, count):
+        sent = 0
+        try:
+            sock.setblocking(False)
+            while sent < count:
+                piece = min(PIECE_BYTES, count - sent)
+                written = await asyncio.wait_for(
+                    self._loop.sock_sendfile(sock, file, offset + sent, piece, fallback=True),
+                    timeout=self.io_timeout)
+                if not written:
+                    # 文件在发送过程中被截短
+                    break
+                sent += written
+            self.completed += 1
+        except (OSError, asyncio.TimeoutError):
+            # 客户端断开或超时未接收
+            self.failed += 1
+        finally:
+            self.bytes_sent += sent
+            file.close()
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            sock.close()
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            active = self._active
+        return {'active': active, 'completed': self.completed, 'failed': self.failed, 'bytes_sent': self.bytes_sent}
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
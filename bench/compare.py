@@ -0,0 +1,104 @@
+# compare.py
+"""
+比较两份 http_bench.py 报告（旧 → 新），逐场景列出吞吐量与延迟的变化
+
+吞吐量下降或 p95/p99 延迟上升超过阈值（百分比）时视为退化，退出码为 1，可用于 CI。
+
+用法：
+    python bench/compare.py base.json new.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+
+# (字段, 显示名, 数值越大越好)
+COLUMNS = [
+    ('rps', 'req/s', True),
+    ('p50_ms', 'p50', False),
+    ('p95_ms', 'p95', False),
+    ('p99_ms', 'p99', False),
+]
+# 参与退化判断的字段
+CHECKED = ('rps', 'p95_ms', 'p99_ms')
+# 请求数太少时百分位没有意义，不参与判断
+MIN_REQUESTS = 20
+
+
+def change_pct(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(base, new, threshold):
+    """返回 (表格行, 退化列表)"""
+    rows = []
+    regressions = []
+    sections = [(name, base['scenarios'].get(name), stats) for name, stats in new['scenarios'].items()]
+    sections.append(('TOTAL', base.get('total'), new.get('total')))
+    for name, old_stats, new_stats in sections:
+        if not old_stats:
+            rows.append([name, '（旧报告中没有该场景）'])
+            continue
+        cells = [name]
+        enough = min(old_stats.get('requests', 0), new_stats.get('requests', 0)) >= MIN_REQUESTS
+        for key, label, higher_better in COLUMNS:
+            old, cur = old_stats.get(key), new_stats.get(key)
+            pct = change_pct(old, cur)
+            if pct is None:
+                cells.append(f'{label} {old} → {cur}')
+                continue
+            worse = -pct if higher_better else pct
+            mark = ''
+            if enough and key in CHECKED and worse > threshold:
+                mark = ' !'
+                regressions.append(f'{name} {label}: {old} → {cur} ({pct:+.1f}%)')
+            cells.append(f'{label} {old} → {cur} ({pct:+.1f}%){mark}')
+        errors_old, errors_new = old_stats.get('errors', 0), new_stats.get('errors', 0)
+        if errors_new > errors_old:
+            regressions.append(f'{name} 错误数: {errors_old} → {errors_new}')
+        cells.append(f'错误 {errors_old} → {errors_new}')
+        rows.append(cells)
+    return rows, regressions
+
+
+def describe(report):
+    git = report.get('meta', {}).get('git') or {}
+    commit = (git.get('commit') or '未知')[:12]
+    return commit + (' (有未提交修改)' if git.get('dirty') else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较两份压测报告')
+    parser.add_argument('base', help='基准报告')
+    parser.add_argument('new', help='新报告')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定为退化的变化百分比')
+    args = parser.parse_args()
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f'基准: {describe(base)}  新: {describe(new)}  阈值: {args.threshold}%')
+    base_params = base.get('meta', {}).get('params', {})
+    new_params = new.get('meta', {}).get('params', {})
+    changed = sorted(k for k in set(base_params) | set(new_params)
+                     if k != 'output' and base_params.get(k) != new_params.get(k))
+    if changed:
+        print(f"[警告] 两次运行的参数不同: {', '.join(changed)}")
+    rows, regressions = compare(base, new, args.threshold)
+    width = max(len(row[0]) for row in rows)
+    for row in rows:
+        print(row[0].ljust(width), ' | '.join(row[1:]), sep='  ')
+    if regressions:
+        print(f'\n退化 {len(regressions)} 项:')
+        for item in regressions:
+            print(f'  {item}')
+        sys.exit(1)
+    print('\n没有超过阈值的退化')
+
+
+if __name__ == '__main__':
+    main()
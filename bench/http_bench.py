@@ -0,0 +1,445 @@
+# http_bench.py
+"""
+端到端 HTTP 压测：在合成文件树上以 `main.py run` 启动服务器，并发请求主要端点，输出 JSON 报告
+
+场景（按权重随机选择，每个工作线程一个长连接）：
+    browse_wide / browse_deep        /file_browser 浏览大目录和深层目录
+    preview_markdown / preview_log / preview_image
+                                     /get_preview_content 预览超大 Markdown、日志、图片
+    download_range                   /download 对大日志的随机范围请求
+    download_image                   /download 完整下载图片
+    drawio_asset                     /drawio/ 下的静态资源
+另有若干“慢客户端”以很低的速率下载大日志，占住服务器连接，用于观察它们对其他请求延迟的影响。
+
+报告包含每个场景的请求数、错误数、吞吐量和 p50/p95/p99 延迟，以及当前 git 提交，
+可用 bench/compare.py 比较两次运行的结果。
+
+用法：
+    python bench/http_bench.py --tree /tmp/bench-tree -o report.json [--duration 30 --concurrency 16 --slow-clients 8]
+    python bench/http_bench.py --tree /tmp/bench-tree --url http://127.0.0.1:5000 --password 密码   # 压测已运行的服务器
+使用 --url 时服务器的根目录需要就是 --tree 指定的目录。
+"""
+import argparse
+import configparser
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from make_tree import make_tree
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRAWIO_DIR = os.path.join(REPO_DIR, 'static', 'drawio')
+# 参与压测的 draw.io 资源（编辑器加载时实际请求的文件）
+DRAWIO_ASSETS = [
+    'js/PreConfig.js',
+    'js/PostConfig.js',
+    'js/viewer.min.js',
+    'js/shapes.min.js',
+    'styles/grapheditor.css',
+    'images/logo.png',
+]
+DEFAULT_WEIGHTS = {
+    'browse_wide': 10,
+    'browse_deep': 10,
+    'preview_markdown': 5,
+    'preview_log': 2,
+    'preview_image': 10,
+    'download_range': 20,
+    'download_image': 10,
+    'drawio_asset': 20,
+}
+RANGE_MIN = 64 * 1024
+RANGE_MAX = 1024 * 1024
+READ_CHUNK = 64 * 1024
+REQUEST_TIMEOUT = 120
+SERVER_START_TIMEOUT = 60
+PERCENTILES = (50, 95, 99)
+
+
+def git_revision():
+    """当前提交与工作区是否有未提交修改，不在 git 仓库中时返回 None"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': bool(dirty)}
+
+
+def percentile(sorted_values, pct):
+    """最近秩法，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    summary = {
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else None,
+        'max_ms': round(values[-1] * 1000, 3) if values else None,
+    }
+    for pct in PERCENTILES:
+        value = percentile(values, pct)
+        summary[f'p{pct}_ms'] = round(value * 1000, 3) if value is not None else None
+    return summary
+
+
+class ServerProcess:
+    """用临时配置文件以 `main.py run` 启动服务器，结束时终止"""
+
+    def __init__(self, tree, password, port, mode, threads, workers, log_path):
+        self.port = port
+        self.config_dir = tempfile.mkdtemp(prefix='yobboy-bench-')
+        config = configparser.ConfigParser()
+        config['settings'] = {'root_dir': os.path.abspath(tree), 'password': password}
+        config['server'] = {'mode': mode, 'host': '127.0.0.1', 'port': str(port)}
+        if threads:
+            config['server']['threads'] = str(threads)
+        if workers:
+            config['server']['workers'] = str(workers)
+        self.config_file = os.path.join(self.config_dir, 'config.ini')
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            config.write(f)
+        self.log = open(log_path, 'w', encoding='utf-8')
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, 'main.py'), 'run', '--config', self.config_file],
+            cwd=REPO_DIR, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f'服务器启动失败（退出码 {self.process.returncode}），请查看 {self.log.name}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise SystemExit(f'服务器在 {SERVER_START_TIMEOUT} 秒内没有开始监听，请查看 {self.log.name}')
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.log.close()
+        shutil.rmtree(self.config_dir, ignore_errors=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def login(host, port, password):
+    """登录并返回 Cookie 请求头的值"""
+    conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+    try:
+        body = urllib.parse.urlencode({'password': password})
+        conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        cookies = [value.split(';', 1)[0] for key, value in response.getheaders() if key.lower() == 'set-cookie']
+    finally:
+        conn.close()
+    if not any(c.startswith('session=') for c in cookies):
+        raise SystemExit('登录失败，请检查密码')
+    return '; '.join(cookies)
+
+
+class Scenarios:
+    """根据 manifest 生成每个场景的请求 (方法, 路径, 请求体, 额外请求头)"""
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.drawio_assets = [a for a in DRAWIO_ASSETS if os.path.isfile(os.path.join(DRAWIO_DIR, a))]
+
+    @staticmethod
+    def _preview(filepath):
+        body = json.dumps({'filepath': filepath})
+        return 'POST', '/get_preview_content', body, {'Content-Type': 'application/json'}
+
+    def build(self, name, rng):
+        m = self.manifest
+        if name == 'browse_wide':
+            return 'GET', '/file_browser?path=' + urllib.parse.quote(m['wide_dir']), None, {}
+        if name == 'browse_deep':
+            return 'GET', '/file_browser?path=' + urllib.parse.quote(m['deep_dir']), None, {}
+        if name == 'preview_markdown':
+            return self._preview(m['markdown'])
+        if name == 'preview_log':
+            return self._preview(m['preview_log'])
+        if name == 'preview_image':
+            return self._preview(rng.choice(m['images']))
+        if name == 'download_range':
+            length = rng.randint(RANGE_MIN, RANGE_MAX)
+            start = rng.randint(0, max(0, m['big_log_size'] - length))
+            return 'GET', '/download/' + urllib.parse.quote(m['big_log']), None, \
+                {'Range': f'bytes={start}-{start + length - 1}'}
+        if name == 'download_image':
+            return 'GET', '/download/' + urllib.parse.quote(rng.choice(m['images'])), None, {}
+        if name == 'drawio_asset':
+            return 'GET', '/drawio/' + rng.choice(self.drawio_assets), None, {}
+        raise ValueError(name)
+
+
+class Worker(threading.Thread):
+    """在一个长连接上循环发送请求，连接被服务器关闭或出错时重连"""
+
+    def __init__(self, index, host, port, cookie, scenarios, names, weights, deadline, seed):
+        super().__init__(name=f'bench-worker-{index}', daemon=True)
+        self.host, self.port = host, port
+        self.cookie = cookie
+        self.scenarios = scenarios
+        self.names, self.weights = names, weights
+        self.deadline = deadline
+        self.rng = random.Random(seed * 1000 + index)
+        self.results = {name: {'latencies': [], 'errors': 0, 'bytes': 0, 'status': {}} for name in names}
+        self.reconnects = 0
+
+    def run(self):
+        conn = None
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            method, path, body, headers = self.scenarios.build(name, self.rng)
+            headers = dict(headers, Cookie=self.cookie)
+            result = self.results[name]
+            if conn is None:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                size = 0
+                while True:
+                    chunk = response.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                elapsed = time.perf_counter() - started
+            except (OSError, http.client.HTTPException):
+                result['errors'] += 1
+                conn.close()
+                conn = None
+                self.reconnects += 1
+                continue
+            status = str(response.status)
+            result['status'][status] = result['status'].get(status, 0) + 1
+            if response.status >= 400:
+                result['errors'] += 1
+            else:
+                result['latencies'].append(elapsed)
+                result['bytes'] += size
+            if response.will_close:
+                conn.close()
+                conn = None
+                self.reconnects += 1
+        if conn is not None:
+            conn.close()
+
+
+class SlowClient(threading.Thread):
+    """用很小的接收缓冲区、按固定速率读取完整下载，模拟弱网下载者"""
+
+    def __init__(self, index, host, port, cookie, path, rate, deadline):
+        super().__init__(name=f'bench-slow-{index}', daemon=True)
+        self.host, self.port = host, port
+        self.cookie = cookie
+        self.path = path
+        self.rate = rate
+        self.deadline = deadline
+        self.bytes = 0
+        self.first_byte = None
+        self.error = None
+
+    def run(self):
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.settimeout(REQUEST_TIMEOUT)
+            started = time.perf_counter()
+            sock.connect((self.host, self.port))
+            sock.sendall((f'GET {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                          f'Cookie: {self.cookie}\r\nConnection: close\r\n\r\n').encode('latin-1'))
+            # 每 0.1 秒最多读取 rate/10 字节
+            step = max(1, self.rate // 10)
+            while time.monotonic() < self.deadline:
+                tick = time.monotonic()
+                data = sock.recv(step)
+                if not data:
+                    break
+                if self.first_byte is None:
+                    self.first_byte = time.perf_counter() - started
+                self.bytes += len(data)
+                time.sleep(max(0.0, 0.1 - (time.monotonic() - tick)))
+            sock.close()
+        except OSError as e:
+            self.error = str(e)
+
+
+def build_report(args, workers, slow_clients, elapsed, target):
+    scenarios = {}
+    all_latencies = []
+    total_errors = total_bytes = 0
+    for name in workers[0].results:
+        latencies, errors, size, status = [], 0, 0, {}
+        for worker in workers:
+            result = worker.results[name]
+            latencies.extend(result['latencies'])
+            errors += result['errors']
+            size += result['bytes']
+            for code, count in result['status'].items():
+                status[code] = status.get(code, 0) + count
+        all_latencies.extend(latencies)
+        total_errors += errors
+        total_bytes += size
+        scenarios[name] = dict({
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / elapsed, 2),
+            'bytes': size,
+            'status': status,
+        }, **latency_summary(latencies))
+    report = {
+        'meta': {
+            'git': git_revision(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(time.time() - elapsed)),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': target,
+            'params': {k: v for k, v in vars(args).items() if k != 'password'},
+        },
+        'duration_s': round(elapsed, 3),
+        'scenarios': scenarios,
+        'total': dict({
+            'requests': len(all_latencies),
+            'errors': total_errors,
+            'rps': round(len(all_latencies) / elapsed, 2),
+            'bytes': total_bytes,
+            'reconnects': sum(w.reconnects for w in workers),
+        }, **latency_summary(all_latencies)),
+    }
+    if slow_clients:
+        first_bytes = sorted(c.first_byte for c in slow_clients if c.first_byte is not None)
+        report['slow_clients'] = {
+            'clients': len(slow_clients),
+            'rate_bytes_per_s': args.slow_rate,
+            'bytes': sum(c.bytes for c in slow_clients),
+            'errors': sum(1 for c in slow_clients if c.error),
+            'no_response': sum(1 for c in slow_clients if c.first_byte is None),
+            'first_byte_p50_ms': round(percentile(first_bytes, 50) * 1000, 3) if first_bytes else None,
+            'first_byte_max_ms': round(first_bytes[-1] * 1000, 3) if first_bytes else None,
+        }
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='文件服务器端到端压测')
+    parser.add_argument('--tree', required=True, help='合成文件树目录，不存在时自动生成')
+    parser.add_argument('--scale', type=float, default=1.0, help='生成文件树的规模系数')
+    parser.add_argument('--seed', type=int, default=1234, help='文件树与请求序列的随机种子')
+    parser.add_argument('--url', help='压测已运行的服务器（如 http://127.0.0.1:5000），不指定时自动启动')
+    parser.add_argument('--password', default='bench', help='登录密码（自动启动时写入临时配置）')
+    parser.add_argument('--mode', default='production', choices=('development', 'production'), help='自动启动时的服务模式')
+    parser.add_argument('--threads', type=int, help='自动启动时每个进程的工作线程数')
+    parser.add_argument('--workers', type=int, help='自动启动时的进程数')
+    parser.add_argument('--duration', type=float, default=30, help='压测时长（秒）')
+    parser.add_argument('--warmup', type=float, default=3, help='正式计时前的预热时长（秒），结果不计入报告')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发连接数')
+    parser.add_argument('--slow-clients', type=int, default=8, dest='slow_clients', help='慢客户端数量')
+    parser.add_argument('--slow-rate', type=int, default=32 * 1024, dest='slow_rate', help='慢客户端的读取速率（字节/秒）')
+    parser.add_argument('--scenarios', help='只运行指定场景（逗号分隔），默认全部：' + ','.join(DEFAULT_WEIGHTS))
+    parser.add_argument('-o', '--output', help='报告输出文件，不指定时打印到标准输出')
+    return parser.parse_args()
+
+
+def run_load(args, host, port, cookie, scenarios, names, weights, duration):
+    deadline = time.monotonic() + duration
+    workers = [Worker(i, host, port, cookie, scenarios, names, weights, deadline, args.seed)
+               for i in range(args.concurrency)]
+    slow_path = '/download/' + urllib.parse.quote(scenarios.manifest['big_log'])
+    slow_clients = [SlowClient(i, host, port, cookie, slow_path, args.slow_rate, deadline)
+                    for i in range(args.slow_clients)]
+    started = time.perf_counter()
+    # 先让慢客户端占住连接，再开始正常请求
+    for client in slow_clients:
+        client.start()
+    for worker in workers:
+        worker.start()
+    for thread in workers + slow_clients:
+        thread.join()
+    return workers, slow_clients, time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+    manifest = make_tree(args.tree, args.scale, args.seed)
+    names = args.scenarios.split(',') if args.scenarios else list(DEFAULT_WEIGHTS)
+    unknown = [n for n in names if n not in DEFAULT_WEIGHTS]
+    if unknown:
+        raise SystemExit(f"未知场景: {', '.join(unknown)}")
+    weights = [DEFAULT_WEIGHTS[n] for n in names]
+    scenarios = Scenarios(manifest)
+    if 'drawio_asset' in names and not scenarios.drawio_assets:
+        raise SystemExit(f'{DRAWIO_DIR} 中没有找到 draw.io 资源')
+
+    server = None
+    if args.url:
+        parsed = urllib.parse.urlsplit(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+        target = args.url
+    else:
+        host, port = '127.0.0.1', free_port()
+        log_path = os.path.join(tempfile.gettempdir(), f'yobboy-bench-server-{port}.log')
+        server = ServerProcess(args.tree, args.password, port, args.mode, args.threads, args.workers, log_path)
+        target = f'main.py run ({args.mode})'
+        print(f'启动服务器: 端口 {port}，日志 {log_path}', file=sys.stderr)
+    try:
+        if server:
+            server.wait_ready()
+        cookie = login(host, port, args.password)
+        if args.warmup > 0:
+            print(f'预热 {args.warmup} 秒...', file=sys.stderr)
+            run_load(args, host, port, cookie, scenarios, names, weights, args.warmup)
+        print(f'压测 {args.duration} 秒，{args.concurrency} 个并发连接，{args.slow_clients} 个慢客户端...',
+              file=sys.stderr)
+        workers, slow_clients, elapsed = run_load(args, host, port, cookie, scenarios, names, weights,
+                                                  args.duration)
+    finally:
+        if server:
+            server.stop()
+
+    report = build_report(args, workers, slow_clients, elapsed, target)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        total = report['total']
+        print(f"完成: {total['requests']} 个请求，{total['rps']} req/s，p95 {total['p95_ms']} ms，"
+              f"错误 {total['errors']}，报告已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# make_tree.py
+"""
+生成压测用的合成文件树（同样的 scale 与 seed 生成完全相同的内容）：
+
+    wide/       大量小文件的单层目录（不同扩展名）
+    deep/       多层嵌套目录，每层几个文件
+    docs/       超大 Markdown（标题、列表、代码块、表格、图片链接）
+    logs/       一个供预览的中等日志和一个供范围下载的大日志
+    images/     Pillow 生成的 JPEG 图片
+
+根目录下的 manifest.json 记录生成参数和压测要用到的路径；参数相同时不重复生成。
+
+用法：
+    python bench/make_tree.py 目标目录 [--scale 1.0] [--seed 1234]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+
+from PIL import Image
+
+
+MANIFEST_NAME = 'manifest.json'
+# scale = 1 时各部分的规模
+WIDE_FILES = 5000
+DEEP_LEVELS = 30
+DEEP_FILES_PER_LEVEL = 5
+MARKDOWN_BYTES = 5 * 1024 * 1024
+PREVIEW_LOG_BYTES = 8 * 1024 * 1024
+BIG_LOG_BYTES = 128 * 1024 * 1024
+IMAGES = 300
+IMAGE_SIZE = (640, 480)
+
+WIDE_EXTENSIONS = ['.txt', '.md', '.py', '.json', '.csv', '.log', '.bin', '.xml']
+WORDS = ('file server preview cache stream range index thread socket latency markdown image '
+         'archive digest metadata browse download upload render template queue worker').split()
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _write_wide(root, rng, count):
+    wide = os.path.join(root, 'wide')
+    os.makedirs(wide)
+    for i in range(count):
+        ext = WIDE_EXTENSIONS[i % len(WIDE_EXTENSIONS)]
+        with open(os.path.join(wide, f'file_{i:05d}{ext}'), 'w', encoding='utf-8') as f:
+            f.write(_sentence(rng, rng.randint(5, 200)) + '\n')
+
+
+def _write_deep(root, rng, levels, files_per_level):
+    current = os.path.join(root, 'deep')
+    parts = []
+    for level in range(levels):
+        parts.append(f'level_{level:02d}')
+        current = os.path.join(current, parts[-1])
+        os.makedirs(current)
+        for i in range(files_per_level):
+            with open(os.path.join(current, f'note_{i}.md'), 'w', encoding='utf-8') as f:
+                f.write(f'# 第 {level} 层\n\n{_sentence(rng, 40)}\n')
+    return 'deep/' + '/'.join(parts)
+
+
+def _write_markdown(path, rng, size):
+    with open(path, 'w', encoding='utf-8') as f:
+        written = 0
+        section = 0
+        while written < size:
+            section += 1
+            block = [f'## 第 {section} 节 {_sentence(rng, 3)}\n\n']
+            block.extend(f'{_sentence(rng, 30)}\n\n' for _ in range(3))
+            block.extend(f'- {_sentence(rng, 6)}\n' for _ in range(5))
+            block.append('\n```python\n')
+            block.extend(f'def func_{section}_{i}(x):\n    return x * {i}\n' for i in range(4))
+            block.append('```\n\n| 名称 | 数值 | 说明 |\n| --- | --- | --- |\n')
+            block.extend(f'| item{i} | {rng.randint(0, 9999)} | {_sentence(rng, 4)} |\n' for i in range(5))
+            block.append(f'\n![图片 {section}](../images/img_{section % 50:04d}.jpg)\n\n')
+            text = ''.join(block)
+            f.write(text)
+            written += len(text.encode('utf-8'))
+
+
+def _write_log(path, rng, size):
+    levels = ['INFO', 'INFO', 'INFO', 'DEBUG', 'WARNING', 'ERROR']
+    with open(path, 'w', encoding='utf-8') as f:
+        written = 0
+        line_no = 0
+        while written < size:
+            lines = []
+            for _ in range(1000):
+                line_no += 1
+                lines.append(f'2024-01-{line_no % 28 + 1:02d} 12:{line_no % 60:02d}:{line_no * 7 % 60:02d} '
+                             f'{rng.choice(levels)} [worker-{line_no % 16}] {_sentence(rng, 10)} id={line_no}\n')
+            text = ''.join(lines)
+            f.write(text)
+            written += len(text)
+
+
+def _write_images(root, rng, count):
+    images = os.path.join(root, 'images')
+    os.makedirs(images)
+    width, height = IMAGE_SIZE
+    for i in range(count):
+        # 渐变底色加随机色块，JPEG 压缩后大小接近真实照片的量级
+        base = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        tint = Image.new('RGB', (width, height), (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        image = Image.blend(base, tint, 0.5)
+        for _ in range(20):
+            x, y = rng.randint(0, width - 60), rng.randint(0, height - 60)
+            color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+            image.paste(color, (x, y, x + rng.randint(10, 60), y + rng.randint(10, 60)))
+        image.save(os.path.join(images, f'img_{i:04d}.jpg'), quality=85)
+
+
+def make_tree(root, scale=1.0, seed=1234):
+    """生成（或复用）合成文件树，返回 manifest 字典"""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('scale') == scale and manifest.get('seed') == seed:
+            return manifest
+    if os.path.isdir(root) and os.listdir(root):
+        if not os.path.exists(manifest_path):
+            raise SystemExit(f'{root} 不是空目录，也不是之前生成的文件树，请换一个目录')
+        shutil.rmtree(root)
+    os.makedirs(root, exist_ok=True)
+
+    rng = random.Random(seed)
+    _write_wide(root, rng, max(1, int(WIDE_FILES * scale)))
+    deep_path = _write_deep(root, rng, DEEP_LEVELS, DEEP_FILES_PER_LEVEL)
+    os.makedirs(os.path.join(root, 'docs'))
+    _write_markdown(os.path.join(root, 'docs', 'huge.md'), rng, int(MARKDOWN_BYTES * scale))
+    os.makedirs(os.path.join(root, 'logs'))
+    _write_log(os.path.join(root, 'logs', 'app.log'), rng, int(PREVIEW_LOG_BYTES * scale))
+    _write_log(os.path.join(root, 'logs', 'big.log'), rng, int(BIG_LOG_BYTES * scale))
+    image_count = max(1, int(IMAGES * scale))
+    _write_images(root, rng, image_count)
+
+    manifest = {
+        'scale': scale,
+        'seed': seed,
+        'wide_dir': 'wide',
+        'deep_dir': deep_path,
+        'markdown': 'docs/huge.md',
+        'preview_log': 'logs/app.log',
+        'big_log': 'logs/big.log',
+        'big_log_size': os.path.getsize(os.path.join(root, 'logs', 'big.log')),
+        'images': [f'images/img_{i:04d}.jpg' for i in range(image_count)],
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成压测用的合成文件树')
+    parser.add_argument('root', help='目标目录（不存在时创建）')
+    parser.add_argument('--scale', type=float, default=1.0, help='规模系数，1.0 约 200 MB')
+    parser.add_argument('--seed', type=int, default=1234, help='随机种子')
+    args = parser.parse_args()
+    manifest = make_tree(args.root, args.scale, args.seed)
+    print(f"已生成: {args.root}（{len(manifest['images'])} 张图片，大日志 {manifest['big_log_size']} 字节）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+# micro_bench.py
+"""
+routes.py 热点函数的微基准：
+    markdown.*    render_markdown_content / process_image_paths
+    listing.*     classify_entries（文件列表的分类循环）
+    preview.*     render_code_preview（代码预览的 HTML 转义）
+
+输入在内存中按固定种子生成，不访问文件系统。每个用例自动确定循环次数（每轮约 0.2 秒），
+重复若干轮取单次调用的最小值（受系统抖动影响最小）和中位数。
+
+基准结果与机器相关，bench/baselines/micro.json 应在用于比较的同一台机器上生成：
+    python bench/micro_bench.py                       # 运行并打印结果
+    python bench/micro_bench.py --save-baseline       # 运行并保存为基准
+    python bench/micro_bench.py --compare             # 运行并与基准比较，退化超过阈值时退出码为 1
+    python bench/micro_bench.py --compare --current result.json   # 用已有结果比较，不重新运行
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from collections import namedtuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from routes import render_markdown_content, process_image_paths, classify_entries, render_code_preview  # noqa: E402
+from http_bench import git_revision  # noqa: E402
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'micro.json')
+DEFAULT_THRESHOLD = 20.0
+TARGET_ROUND_SECONDS = 0.2
+DEFAULT_REPEAT = 5
+SEED = 1234
+
+WORDS = ('file server preview cache stream range index thread socket latency markdown image '
+         'archive digest metadata browse download upload render template queue worker').split()
+LISTING_EXTENSIONS = ['.txt', '.md', '.py', '.jpg', '.png', '.pdf', '.docx', '.mp4', '.mp3', '.zip', '.log', '.bin']
+KIND_BY_EXTENSION = {'.jpg': 'image', '.png': 'image', '.pdf': 'pdf', '.docx': 'office', '.mp4': 'video',
+                     '.mp3': 'audio', '.zip': 'archive', '.bin': 'binary'}
+MEDIA_EXTENSIONS = ('.mp4', '.mp3')
+
+# 与 os.DirEntry 相同的两个属性，classify_entries 只用到它们
+Entry = namedtuple('Entry', 'name path')
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_markdown(size, image_every=1, seed=SEED):
+    """生成约 size 字节的 Markdown：标题、段落、列表、代码块、表格，每 image_every 节一张相对路径图片"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    section = 0
+    while total < size:
+        section += 1
+        block = [f'## 第 {section} 节 {_sentence(rng, 3)}\n\n', f'{_sentence(rng, 40)} **{rng.choice(WORDS)}**\n\n']
+        block.extend(f'- [{"x" if i % 2 else " "}] {_sentence(rng, 6)}\n' for i in range(4))
+        block.append(f'\n```python\ndef f{section}(x):\n    return x < {section} and x > 0\n```\n\n')
+        block.append('| 名称 | 数值 |\n| --- | --- |\n')
+        block.extend(f'| {rng.choice(WORDS)} | {rng.randint(0, 9999)} |\n' for _ in range(3))
+        if section % image_every == 0:
+            block.append(f'\n![图 {section}](images/img_{section:04d}.png "标题")\n\n')
+        text = ''.join(block)
+        parts.append(text)
+        total += len(text.encode('utf-8'))
+    return ''.join(parts)
+
+
+def make_image_markdown(count, seed=SEED):
+    """图片密集的 Markdown：相对路径、绝对 URL、/download 链接混合"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        choice = i % 4
+        if choice == 0:
+            lines.append(f'![图 {i}](http://example.com/{i}.png)')
+        elif choice == 1:
+            lines.append(f'![图 {i}](/download/images/{i}.png)')
+        else:
+            lines.append(f'{_sentence(rng, 5)} ![图 {i}](../assets/img_{i}.jpg "说明 {i}")')
+    return '\n'.join(lines) + '\n'
+
+
+def make_listing(count, seed=SEED):
+    """生成 classify_entries 的输入：约 5% 为目录，部分文件扩展名与嗅探结果不符，部分有媒体信息和摘要"""
+    rng = random.Random(seed)
+    entries, type_infos, media_stats, media_infos, digests = [], {}, {}, {}, {}
+    for i in range(count):
+        if i % 20 == 0:
+            entries.append((Entry(f'dir_{i:05d}', f'/root/dir_{i:05d}'), True, None))
+            continue
+        ext = rng.choice(LISTING_EXTENSIONS)
+        name = f'File_{i:05d}{ext.upper() if i % 7 == 0 else ext}'
+        path = f'/root/{name}'
+        entries.append((Entry(name, path), False, None))
+        kind = KIND_BY_EXTENSION.get(ext, 'text')
+        # 改名为 .txt 的图片
+        if ext == '.txt' and i % 10 == 1:
+            type_infos[path] = {'kind': 'image', 'ext': '.png', 'encoding': None}
+        else:
+            type_infos[path] = {'kind': kind, 'ext': ext if kind != 'text' else None,
+                                'encoding': 'utf-8' if kind == 'text' else None}
+        if ext in MEDIA_EXTENSIONS:
+            media_stats[path] = None
+            if i % 2:
+                media_infos[path] = {'duration': 123.4, 'width': 1920, 'height': 1080}
+        if i % 3:
+            digests[path] = {'sha256': f'{i:064x}'}
+    return entries, 'some/dir', type_infos, media_stats, media_infos, digests
+
+
+def make_code(size, seed=SEED):
+    """HTML/JS 源码：大量需要转义的 < > &"""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = (f'<div class="{rng.choice(WORDS)}">{_sentence(rng, 4)} &amp; '
+                f'<span data-x="{rng.randint(0, 99)}">{rng.choice(WORDS)}</span></div>\n')
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)
+
+
+def make_log(size, seed=SEED):
+    """日志文本：几乎没有需要转义的字符"""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        i += 1
+        line = f'2024-01-01 12:00:{i % 60:02d} INFO [worker-{i % 16}] {_sentence(rng, 10)} id={i}\n'
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)
+
+
+def build_cases():
+    """返回 {用例名: 无参调用}，输入在这里一次生成好"""
+    small_md = make_markdown(4 * 1024)
+    large_md = make_markdown(512 * 1024)
+    image_md = make_image_markdown(5000)
+    plain_md = make_markdown(1024 * 1024, image_every=50)
+    listing_small = make_listing(100)
+    listing_large = make_listing(5000)
+    code = make_code(1024 * 1024)
+    log = make_log(4 * 1024 * 1024)
+    return {
+        'markdown.render_4k': lambda: render_markdown_content(small_md, 'docs/readme.md'),
+        'markdown.render_512k': lambda: render_markdown_content(large_md, 'docs/huge.md'),
+        'markdown.image_paths_dense': lambda: process_image_paths(image_md, 'docs/gallery.md'),
+        'markdown.image_paths_1m': lambda: process_image_paths(plain_md, 'docs/huge.md'),
+        'listing.classify_100': lambda: classify_entries(*listing_small),
+        'listing.classify_5000': lambda: classify_entries(*listing_large),
+        'preview.escape_html_1m': lambda: render_code_preview(code, '.html'),
+        'preview.escape_log_4m': lambda: render_code_preview(log, '.log'),
+    }
+
+
+def measure(func, repeat=DEFAULT_REPEAT):
+    """与 timeit 相同：关闭 GC，先确定每轮循环次数，再重复多轮，返回单次调用的秒数"""
+    func()
+    number = 1
+    while True:
+        elapsed = _time_loop(func, number)
+        if elapsed >= TARGET_ROUND_SECONDS:
+            break
+        number *= 10 if elapsed < TARGET_ROUND_SECONDS / 10 else 2
+    rounds = [elapsed / number] + [_time_loop(func, number) / number for _ in range(repeat - 1)]
+    return {'min_s': min(rounds), 'median_s': statistics.median(rounds), 'number': number, 'repeat': repeat}
+
+
+def _time_loop(func, number):
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def run(filter_text=None, repeat=DEFAULT_REPEAT):
+    results = {}
+    for name, func in build_cases().items():
+        if filter_text and filter_text not in name:
+            continue
+        results[name] = measure(func, repeat)
+        print(f"{name:<30} {format_time(results[name]['min_s']):>12} "
+              f"(中位数 {format_time(results[name]['median_s'])}, {results[name]['number']} 次 × {repeat} 轮)",
+              file=sys.stderr)
+    return {
+        'meta': {
+            'git': git_revision(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f'{seconds:.3f} s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.3f} ms'
+    return f'{seconds * 1e6:.1f} µs'
+
+
+def compare(baseline, current, threshold):
+    """按单次调用的最小耗时比较，返回退化的用例列表"""
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:<30} （基准中没有该用例）')
+            continue
+        pct = (result['min_s'] - base['min_s']) / base['min_s'] * 100
+        mark = ''
+        if pct > threshold:
+            mark = ' !'
+            regressions.append(name)
+        print(f"{name:<30} {format_time(base['min_s']):>12} → {format_time(result['min_s']):>12} ({pct:+.1f}%){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='routes.py 热点函数微基准')
+    parser.add_argument('--filter', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='每个用例重复的轮数')
+    parser.add_argument('-o', '--output', help='把结果写入文件')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基准文件路径')
+    parser.add_argument('--save-baseline', action='store_true', dest='save_baseline', help='把结果保存为基准')
+    parser.add_argument('--compare', action='store_true', help='与基准比较')
+    parser.add_argument('--current', help='与基准比较时使用已有的结果文件，不重新运行')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='判定为退化的变慢百分比')
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+    else:
+        current = run(args.filter, args.repeat)
+    text = json.dumps(current, ensure_ascii=False, indent=2) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f'基准已保存: {args.baseline}', file=sys.stderr)
+    if not args.compare:
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    base_git = (baseline['meta'].get('git') or {}).get('commit') or '未知'
+    print(f'基准: {base_git[:12]} ({baseline["meta"].get("platform")})  阈值: {args.threshold}%')
+    if baseline['meta'].get('platform') != current['meta'].get('platform'):
+        print('[警告] 基准来自不同的平台，比较结果仅供参考')
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n退化 {len(regressions)} 项: {', '.join(regressions)}")
+        sys.exit(1)
+    print('\n没有超过阈值的退化')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# startup_bench.py
+"""
+启动开销：在全新的解释器中执行各启动路径，记录导入耗时、进程总耗时和峰值常驻内存（RSS）
+
+    python_only     空解释器（基线）
+    routes_import   import routes
+    server_import   import headless（`main.py run` 服务子进程的导入路径）
+    server_app      import headless 并创建 Flask 应用
+    gui_import      import gui（需要 PyQt5，未安装时记为错误）
+
+另用 `python -X importtime` 列出服务导入路径中耗时最多的顶层包。
+
+用法：
+    python bench/startup_bench.py [--repeat 5] [-o startup.json]
+    python bench/startup_bench.py --compare old.json [-o new.json]   # 与之前的结果比较
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from http_bench import REPO_DIR, git_revision
+
+
+CASES = {
+    'python_only': 'pass',
+    'routes_import': 'import routes',
+    'server_import': 'import headless',
+    'server_app': 'import headless; headless.create_app()',
+    'gui_import': 'import gui',
+}
+# 子进程在执行完被测语句后输出一行以此开头的 JSON
+RESULT_MARKER = '@@startup@@'
+CHILD_TEMPLATE = '''
+import time
+_started = time.perf_counter()
+{statement}
+_elapsed = time.perf_counter() - _started
+import json, sys
+try:
+    import resource
+    _peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    _peak = _peak if sys.platform == 'darwin' else _peak * 1024
+except ImportError:
+    _peak = None
+print({marker!r} + json.dumps({{'import_s': _elapsed, 'peak_rss': _peak, 'modules': len(sys.modules)}}))
+'''
+IMPORTTIME_TOP = 15
+
+
+def run_case(statement):
+    code = CHILD_TEMPLATE.format(statement=statement, marker=RESULT_MARKER)
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+            result['wall_s'] = wall
+            return result
+    error = (proc.stderr.strip().splitlines() or ['没有输出'])[-1]
+    return {'error': error}
+
+
+def summarize(runs):
+    ok = [r for r in runs if 'error' not in r]
+    if not ok:
+        return {'error': runs[0]['error']}
+    peaks = [r['peak_rss'] for r in ok if r['peak_rss'] is not None]
+    return {
+        'import_ms': round(statistics.median(r['import_s'] for r in ok) * 1000, 2),
+        'import_min_ms': round(min(r['import_s'] for r in ok) * 1000, 2),
+        'wall_ms': round(statistics.median(r['wall_s'] for r in ok) * 1000, 2),
+        'peak_rss_mb': round(statistics.median(peaks) / 1024 / 1024, 1) if peaks else None,
+        'modules': ok[0]['modules'],
+        'runs': len(ok),
+    }
+
+
+def import_breakdown(statement):
+    """按顶层包汇总 -X importtime 的自身耗时，返回耗时最多的若干项"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=REPO_DIR,
+                          capture_output=True, text=True)
+    totals = Counter()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if self_us.isdigit():
+            totals[name.split('.', 1)[0]] += int(self_us)
+    return [{'package': name, 'self_ms': round(us / 1000, 2)} for name, us in totals.most_common(IMPORTTIME_TOP)]
+
+
+def compare(old, new):
+    for name, result in new['cases'].items():
+        base = old['cases'].get(name)
+        if not base or 'error' in base or 'error' in result:
+            print(f'{name:<15} （至少一次运行失败，无法比较）')
+            continue
+        cells = []
+        for key, label in (('import_ms', '导入'), ('wall_ms', '进程'), ('peak_rss_mb', 'RSS')):
+            a, b = base.get(key), result.get(key)
+            if a and b is not None:
+                cells.append(f'{label} {a} → {b} ({(b - a) / a * 100:+.1f}%)')
+        print(f'{name:<15}', ' | '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量启动导入耗时与内存')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例运行的次数（取中位数）')
+    parser.add_argument('-o', '--output', help='把结果写入文件')
+    parser.add_argument('--compare', help='与之前保存的结果比较')
+    args = parser.parse_args()
+
+    # 先运行一次生成字节码缓存，避免第一次的编译耗时计入
+    for statement in CASES.values():
+        subprocess.run([sys.executable, '-c', statement], cwd=REPO_DIR, capture_output=True)
+    cases = {}
+    for name, statement in CASES.items():
+        cases[name] = summarize([run_case(statement) for _ in range(args.repeat)])
+        result = cases[name]
+        if 'error' in result:
+            print(f"{name:<15} 失败: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{name:<15} 导入 {result['import_ms']:>8} ms  进程 {result['wall_ms']:>8} ms  "
+                  f"RSS {result['peak_rss_mb']} MB  模块 {result['modules']}", file=sys.stderr)
+    report = {
+        'meta': {
+            'git': git_revision(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'cases': cases,
+        'server_import_breakdown': import_breakdown(CASES['server_import']),
+    }
+    print('\n服务导入路径耗时最多的包:', file=sys.stderr)
+    for item in report['server_import_breakdown']:
+        print(f"  {item['package']:<20} {item['self_ms']:>8} ms", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        print()
+        compare(old, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# block_delta.py
+import hashlib
+import math
+import os
+import threading
+
+from file_cache import PersistentFileCache, file_signature, get_cache_dir
+
+
+# 块大小取文件大小的平方根（向上取 2 的幂），限制在此范围内：
+# 块越小差异越精细，但签名越大；4 GB 的文件对应 64 KB 的块、约 768 KB 的签名
+MIN_BLOCK_SIZE = 4 * 1024
+MAX_BLOCK_SIZE = 1024 * 1024
+# 强校验和（BLAKE2b）截取的字节数
+STRONG_BYTES = 8
+# 每条签名记录：4 字节弱校验和（大端 uint32）+ 强校验和
+RECORD_SIZE = 4 + STRONG_BYTES
+# 计算签名时每次读取的字节数（至少一块），控制 NumPy 临时数组的内存占用
+SLAB_BYTES = 4 * 1024 * 1024
+
+block_signature_cache = PersistentFileCache('block_signature')
+
+
+def choose_block_size(size):
+    if size <= 0:
+        return MIN_BLOCK_SIZE
+    block_size = 1 << math.ceil(math.log2(math.sqrt(size)))
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, block_size))
+
+
+def file_version(st):
+    """文件版本标识，客户端请求差异时带回，文件在两次请求之间被修改时拒绝"""
+    return f'{st.st_ino}-{st.st_size}-{st.st_mtime_ns}'
+
+
+def weak_checksums(blocks):
+    """
+    rsync 的滚动校验和：a = Σx，b = Σ(L-i)·x，均取低 16 位，结果为 (b << 16) | a
+    blocks 为 (块数, 块大小) 的 uint8 数组，一次计算整批块
+    """
+    import numpy as np
+
+    length = blocks.shape[1]
+    values = blocks.astype(np.uint64)
+    a = values.sum(axis=1) & 0xFFFF
+    b = (values * np.arange(length, 0, -1, dtype=np.uint64)).sum(axis=1) & 0xFFFF
+    return ((b << 16) | a).astype('>u4')
+
+
+def strong_checksum(data):
+    return hashlib.blake2b(data, digest_size=STRONG_BYTES).digest()
+
+
+def _signature_path(full_path):
+    key = hashlib.sha1(full_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_cache_dir(), 'block_signatures', key + '.sig')
+
+
+def compute_signature(full_path, sig_path, block_size):
+    """逐批读取文件，写出签名文件；最后一个不足整块的块补零后计算"""
+    # NumPy 只在计算签名时需要，不拖慢服务启动
+    import numpy as np
+
+    os.makedirs(os.path.dirname(sig_path), exist_ok=True)
+    # 同一文件被并发请求时各自写临时文件，最后原子替换
+    tmp_path = f'{sig_path}.{threading.get_ident()}.tmp'
+    blocks = 0
+    with open(full_path, 'rb') as f, open(tmp_path, 'wb') as out:
+        while True:
+            data = f.read(max(block_size, SLAB_BYTES // block_size * block_size))
+            if not data:
+                break
+            padded = data + b'\0' * (-len(data) % block_size)
+            arr = np.frombuffer(padded, dtype=np.uint8).reshape(-1, block_size)
+            weak = weak_checksums(arr).tobytes()
+            records = []
+            for i in range(len(arr)):
+                records.append(weak[i * 4:i * 4 + 4])
+                records.append(strong_checksum(padded[i * block_size:(i + 1) * block_size]))
+            out.write(b''.join(records))
+            blocks += len(arr)
+    os.replace(tmp_path, sig_path)
+    return blocks
+
+
+def get_signature(full_path, st=None):
+    """
+    返回 (签名文件路径, 块大小, 块数)，按 inode/大小/mtime 缓存
+    签名文件是连续的 RECORD_SIZE 字节记录，第 i 条对应文件的第 i 块
+    """
+    if st is None:
+        st = os.stat(full_path)
+    sig_path = _signature_path(full_path)
+    info = block_signature_cache.get(full_path, st)
+    if info is None or not os.path.exists(sig_path):
+        block_size = choose_block_size(st.st_size)
+        blocks = compute_signature(full_path, sig_path, block_size)
+        info = {'block_size': block_size, 'blocks': blocks}
+        # 计算期间文件被修改时不缓存
+        if file_signature(full_path) == file_signature(full_path, st):
+            block_signature_cache.set(full_path, info, st)
+            block_signature_cache.flush()
+    return sig_path, info['block_size'], info['blocks']
+
+
+def parse_block_ranges(ranges, block_count):
+    """校验客户端请求的块区间 [[起始块, 结束块), ...]，返回规范化后的列表；不合法时返回 None"""
+    result = []
+    last_end = 0
+    if not isinstance(ranges, list):
+        return None
+    for item in ranges:
+        if not isinstance(item, list) or len(item) != 2 or not all(isinstance(v, int) for v in item):
+            return None
+        start, end = item
+        if start < last_end or end <= start or end > block_count:
+            return None
+        result.append((start, end))
+        last_end = end
+    return result
+
+
+def delta_length(ranges, block_size, file_size):
+    return sum(min(end * block_size, file_size) - start * block_size for start, end in ranges)
+
+
+def iter_blocks(full_path, ranges, block_size, file_size, chunk_size=1024 * 1024):
+    """按顺序输出请求的块区间内的原始数据（最后一块为实际长度，不补零）"""
+    with open(full_path, 'rb') as f:
+        for start, end in ranges:
+            offset = start * block_size
+            remaining = min(end * block_size, file_size) - offset
+            f.seek(offset)
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
@@ -0,0 +1,225 @@
+# duplicate_finder.py
+import hashlib
+import os
+import stat
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from file_cache import PersistentFileCache
+from file_digest import digest_service
+
+
+# 部分哈希读取文件开头和结尾各多少字节
+PARTIAL_BYTES = 16 * 1024
+# 读取部分哈希的线程数（只做少量随机读取，瓶颈在磁盘寻道而不是 CPU）
+PARTIAL_WORKERS = 8
+# 每个目录保留的扫描结果数（按目录记录最近一次）
+MAX_SCANS = 16
+
+partial_hash_cache = PersistentFileCache('partial_hash', max_memory_entries=8192)
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+def partial_hash(full_path, size):
+    """文件开头与结尾各 PARTIAL_BYTES 字节的 SHA-256，小文件即整个文件"""
+    sha256 = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        sha256.update(f.read(PARTIAL_BYTES))
+        if size > PARTIAL_BYTES:
+            f.seek(max(size - PARTIAL_BYTES, PARTIAL_BYTES))
+            sha256.update(f.read(PARTIAL_BYTES))
+    return sha256.hexdigest()
+
+
+class DuplicateScan:
+    """
+    一次重复文件扫描，逐级缩小候选范围：
+    1. 按文件大小分组，大小唯一的文件不可能重复
+    2. 同大小的文件比较开头和结尾的部分哈希
+    3. 部分哈希仍然相同的才计算完整 SHA-256（优先使用已缓存的摘要）
+    硬链接（同一 inode）只算一个文件
+    """
+
+    def __init__(self, root_dir, rel_path, min_size=1):
+        self.root_dir = root_dir
+        self.rel_path = rel_path
+        self.scan_dir = os.path.normpath(os.path.join(root_dir, rel_path))
+        self.min_size = min_size
+        self.status = 'running'
+        self.stage = 'scanning'
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.counts = {'files': 0, 'size_candidates': 0, 'partial_candidates': 0, 'hashed': 0}
+        self.groups = []
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _check_cancelled(self):
+        if self._cancel.is_set():
+            raise ScanCancelled()
+
+    def run(self):
+        try:
+            by_size = self._group_by_size()
+            by_partial = self._group_by_partial(by_size)
+            self.groups = self._group_by_digest(by_partial)
+            self.status = 'done'
+        except ScanCancelled:
+            self.status = 'cancelled'
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            print(f"[警告] 重复文件扫描失败: {e}")
+        finally:
+            self.stage = None
+            self.finished_at = time.time()
+            partial_hash_cache.flush()
+
+    def _group_by_size(self):
+        self.stage = 'scanning'
+        by_size = defaultdict(list)
+        seen_inodes = set()
+        stack = [self.scan_dir]
+        while stack:
+            self._check_cancelled()
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        self.counts['files'] += 1
+                        if st.st_size < self.min_size or not stat.S_ISREG(st.st_mode):
+                            continue
+                        inode = (st.st_dev, st.st_ino)
+                        if st.st_ino and inode in seen_inodes:
+                            continue
+                        seen_inodes.add(inode)
+                        by_size[st.st_size].append((entry.path, st))
+            except OSError:
+                continue
+        groups = [files for files in by_size.values() if len(files) > 1]
+        self.counts['size_candidates'] = sum(len(files) for files in groups)
+        return groups
+
+    def _group_by_partial(self, size_groups):
+        self.stage = 'partial'
+        candidates = [item for files in size_groups for item in files]
+        cached = partial_hash_cache.get_many({path: st for path, st in candidates})
+
+        def compute(item):
+            path, st = item
+            if path in cached:
+                return cached[path]
+            self._check_cancelled()
+            try:
+                value = partial_hash(path, st.st_size)
+            except OSError:
+                return None
+            partial_hash_cache.set(path, value, st)
+            return value
+
+        with ThreadPoolExecutor(max_workers=PARTIAL_WORKERS, thread_name_prefix='partial-hash') as pool:
+            hashes = list(pool.map(compute, candidates))
+        self._check_cancelled()
+
+        by_partial = defaultdict(list)
+        for (path, st), value in zip(candidates, hashes):
+            if value is not None:
+                by_partial[(st.st_size, value)].append((path, st))
+        groups = [files for files in by_partial.values() if len(files) > 1]
+        self.counts['partial_candidates'] = sum(len(files) for files in groups)
+        return groups
+
+    def _group_by_digest(self, partial_groups):
+        self.stage = 'full'
+        stats = {path: st for files in partial_groups for path, st in files}
+        by_digest = defaultdict(list)
+        digests = digest_service.iter_digests(stats)
+        try:
+            for path, digest in digests:
+                # 等待进程池结果期间也能响应取消
+                self._check_cancelled()
+                self.counts['hashed'] += 1
+                by_digest[(stats[path].st_size, digest['sha256'])].append(path)
+        finally:
+            # 取消时立即关闭生成器，剩余的文件不再提交
+            digests.close()
+
+        groups = []
+        for (size, sha256), paths in by_digest.items():
+            if len(paths) < 2:
+                continue
+            paths.sort()
+            groups.append({
+                'size': size,
+                'sha256': sha256,
+                'paths': [os.path.relpath(p, self.root_dir).replace(os.sep, '/') for p in paths],
+                'reclaimable': size * (len(paths) - 1),
+            })
+        groups.sort(key=lambda g: g['reclaimable'], reverse=True)
+        return groups
+
+    def to_dict(self, limit=None):
+        groups = self.groups if limit is None else self.groups[:limit]
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'path': self.rel_path,
+            'status': self.status,
+            'stage': self.stage,
+            'error': self.error,
+            'elapsed': round(elapsed, 2),
+            'counts': self.counts,
+            'group_count': len(self.groups),
+            'reclaimable': sum(g['reclaimable'] for g in self.groups),
+            'groups': groups,
+        }
+
+
+class DuplicateFinder:
+    """按目录（完整路径）记录最近一次扫描，同一目录同时只运行一次扫描"""
+
+    def __init__(self):
+        self._scans = {}
+        self._lock = threading.Lock()
+
+    def start(self, root_dir, rel_path, min_size=1):
+        scan = DuplicateScan(root_dir, rel_path, min_size)
+        with self._lock:
+            running = self._scans.get(scan.scan_dir)
+            if running is not None and running.status == 'running':
+                return running
+            self._scans[scan.scan_dir] = scan
+            while len(self._scans) > MAX_SCANS:
+                del self._scans[next(iter(self._scans))]
+        threading.Thread(target=scan.run, name='duplicate-scan', daemon=True).start()
+        return scan
+
+    def get(self, root_dir, rel_path):
+        with self._lock:
+            return self._scans.get(os.path.normpath(os.path.join(root_dir, rel_path)))
+
+    def cancel(self, root_dir, rel_path):
+        scan = self.get(root_dir, rel_path)
+        if scan is None:
+            return False
+        scan.cancel()
+        return True
+
+
+duplicate_finder = DuplicateFinder()
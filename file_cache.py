@@ -0,0 +1,271 @@
+# file_cache.py
+import os
+import sys
+import json
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+# 所有缓存实例的登记表，便于统一查看命中率和占用
+_cache_registry = []
+
+
+def get_cache_dir():
+    """获取缓存目录，优先exe/py所在目录，否则用户目录"""
+    if getattr(sys, 'frozen', False):
+        # 打包环境：exe所在目录
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        # 开发环境：.py文件所在目录
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    cache_dir = os.path.join(base_dir, "cache")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        test_file = os.path.join(cache_dir, '.test')
+        with open(test_file, 'w'):
+            pass
+        os.remove(test_file)
+        return cache_dir
+    except OSError:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".yobboy_file_server", "cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+
+
+def deep_sizeof(obj, seen=None):
+    """估算对象及其包含的容器、字符串等占用的字节数（同一对象只计一次）"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def file_signature(path, st=None):
+    """根据 inode、大小和修改时间生成文件签名，文件变化后签名随之改变"""
+    if st is None:
+        st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class FileCache:
+    """
+    按文件签名失效的进程内 LRU 缓存：
+    - 键为 (文件路径, 子键)，子键用于区分同一文件的不同结果（如分页）
+    - 取值时比对文件签名，文件被修改后旧结果自动作废
+    """
+
+    def __init__(self, name, max_entries=128):
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _cache_registry.append(self)
+
+    def get(self, path, key=None, st=None):
+        """读取缓存，文件不存在或已修改时返回 None"""
+        try:
+            signature = file_signature(path, st)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get((path, key))
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end((path, key))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, path, value, key=None, st=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        try:
+            signature = file_signature(path, st)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[(path, key)] = (signature, value)
+            self._entries.move_to_end((path, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, path, compute, key=None):
+        """命中则直接返回，否则调用 compute() 计算并写入缓存"""
+        st = os.stat(path)
+        value = self.get(path, key, st)
+        if value is None:
+            value = compute()
+            self.set(path, value, key, st)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def memory_usage(self):
+        """估算缓存条目（键与值）占用的内存字节数"""
+        with self._lock:
+            entries = list(self._entries.items())
+        seen = set()
+        return sum(deep_sizeof(key, seen) + deep_sizeof(entry, seen) for key, entry in entries)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+
+class PersistentFileCache:
+    """
+    持久化到 SQLite 的文件结果缓存，服务器重启后仍然有效：
+    - 每个命名空间保存 {文件路径: (inode, 大小, mtime, JSON 值)}
+    - 前面加一层内存 LRU，重复访问不查数据库
+    - 写入先进入缓冲区，批量提交，避免首次浏览大目录时逐条提交
+    """
+
+    _db_lock = threading.Lock()
+    _local = threading.local()
+    _db_path = None
+
+    def __init__(self, namespace, max_memory_entries=4096, flush_threshold=256):
+        self.namespace = namespace
+        self.memory = FileCache(f'{namespace}(内存)', max_memory_entries)
+        self.flush_threshold = flush_threshold
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @classmethod
+    def _connection(cls):
+        """每个线程使用独立的数据库连接"""
+        conn = getattr(cls._local, 'conn', None)
+        if conn is None:
+            with cls._db_lock:
+                if cls._db_path is None:
+                    cls._db_path = os.path.join(get_cache_dir(), 'file_cache.sqlite3')
+                conn = sqlite3.connect(cls._db_path, timeout=10)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS file_cache (
+                        namespace TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        ino INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        value TEXT NOT NULL,
+                        PRIMARY KEY (namespace, path)
+                    )
+                """)
+            cls._local.conn = conn
+        return conn
+
+    def get(self, path, st=None):
+        """读取缓存，文件不存在或签名不一致时返回 None"""
+        try:
+            if st is None:
+                st = os.stat(path)
+        except OSError:
+            return None
+        value = self.memory.get(path, st=st)
+        if value is not None:
+            return value
+        row = self._connection().execute(
+            'SELECT ino, size, mtime_ns, value FROM file_cache WHERE namespace = ? AND path = ?',
+            (self.namespace, path)).fetchone()
+        if row is None or tuple(row[:3]) != file_signature(path, st):
+            return None
+        value = json.loads(row[3])
+        self.memory.set(path, value, st=st)
+        return value
+
+    def get_many(self, stats):
+        """批量读取，stats 为 {路径: os.stat_result}，返回 {路径: 值}（仅包含命中项）"""
+        found = {}
+        missing = []
+        for path, st in stats.items():
+            value = self.memory.get(path, st=st)
+            if value is not None:
+                found[path] = value
+            else:
+                missing.append(path)
+        conn = self._connection()
+        for i in range(0, len(missing), 500):
+            batch = missing[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f'SELECT path, ino, size, mtime_ns, value FROM file_cache '
+                f'WHERE namespace = ? AND path IN ({placeholders})',
+                [self.namespace] + batch).fetchall()
+            for path, ino, size, mtime_ns, value in rows:
+                if (ino, size, mtime_ns) == file_signature(path, stats[path]):
+                    found[path] = json.loads(value)
+                    self.memory.set(path, found[path], st=stats[path])
+        return found
+
+    def set(self, path, value, st=None):
+        """写入缓存（先进入缓冲区，达到阈值后批量提交）"""
+        try:
+            signature = file_signature(path, st)
+        except OSError:
+            return
+        self.memory.set(path, value, st=st)
+        with self._pending_lock:
+            self._pending.append((self.namespace, path) + signature + (json.dumps(value, ensure_ascii=False),))
+            should_flush = len(self._pending) >= self.flush_threshold
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """提交缓冲区中的写入"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO file_cache VALUES (?, ?, ?, ?, ?, ?)', pending)
+        except sqlite3.Error as e:
+            print(f"[警告] 写入文件缓存失败: {e}")
+
+    def delete(self, path):
+        self.memory.set(path, None)
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM file_cache WHERE namespace = ? AND path = ?', (self.namespace, path))
+
+    def get_or_compute(self, path, compute, st=None):
+        if st is None:
+            st = os.stat(path)
+        value = self.get(path, st)
+        if value is None:
+            value = compute()
+            self.set(path, value, st)
+        return value
+
+
+def all_caches():
+    """返回当前进程中登记的全部缓存实例"""
+    return list(_cache_registry)
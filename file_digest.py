@@ -0,0 +1,192 @@
+# file_digest.py
+import base64
+import hashlib
+import itertools
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+from file_cache import PersistentFileCache, file_signature
+from tracing import traced
+
+
+# 计算摘要的进程数
+HASH_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# 批量计算时每个进程最多排队的文件数
+PENDING_PER_WORKER = 2
+# 全部工作进程合计的读取速率上限（字节/秒），避免后台校验拖慢正在进行的下载；0 表示不限速
+HASH_IO_RATE = 256 * 1024 * 1024
+# 每次读取的块大小
+HASH_BLOCK = 1024 * 1024
+# 下载时如果摘要尚未缓存，小于此大小的文件直接计算，更大的文件交给后台
+INLINE_HASH_MAX = 8 * 1024 * 1024
+# 浏览目录时自动在后台计算摘要的文件大小上限，更大的文件在下载或生成校验清单时才计算
+LISTING_HASH_MAX = 64 * 1024 * 1024
+# 每次浏览目录最多提交后台计算的总字节数，其余文件在之后的浏览中继续补算；0 表示浏览时不计算
+LISTING_HASH_BUDGET = 256 * 1024 * 1024
+
+# 快速校验和：安装了 xxhash 时使用 XXH64，否则使用标准库的 CRC32
+FAST_ALGORITHM = 'xxh64' if xxhash is not None else 'crc32'
+
+digest_cache = PersistentFileCache('digest', max_memory_entries=8192)
+
+
+def hash_file(full_path, rate=0):
+    """
+    读取一遍文件，同时计算 SHA-256 与快速校验和
+    rate 为本进程的读取速率上限（字节/秒），超出时休眠
+    在工作进程中执行，只依赖标准库（与可选的 xxhash），便于序列化与启动
+    """
+    sha256 = hashlib.sha256()
+    if xxhash is not None:
+        fast = xxhash.xxh64()
+    else:
+        fast = None
+        crc = 0
+    start = time.monotonic()
+    total = 0
+    with open(full_path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            sha256.update(block)
+            if fast is not None:
+                fast.update(block)
+            else:
+                crc = zlib.crc32(block, crc)
+            total += len(block)
+            if rate:
+                # 简单的令牌桶：读得比限速快时等待
+                ahead = total / rate - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+    return {
+        'sha256': sha256.hexdigest(),
+        'fast': fast.hexdigest() if fast is not None else f'{crc:08x}',
+        'fast_algorithm': FAST_ALGORITHM,
+    }
+
+
+class DigestService:
+    """
+    文件摘要服务：
+    - 结果按 inode/大小/mtime 持久缓存，文件未修改时不再重复读取
+    - 计算在进程池中进行，多个大文件可以同时利用多个 CPU 核心
+    - 同一文件同时只提交一次
+    """
+
+    def __init__(self, workers=HASH_WORKERS, rate=HASH_IO_RATE):
+        self.workers = workers
+        self.rate = rate
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            except (OSError, NotImplementedError) as e:
+                # 某些受限环境无法创建子进程，hashlib 计算时会释放 GIL，线程池同样有效
+                print(f"[警告] 无法创建摘要进程池，改用线程池: {e}")
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='file-digest')
+        return self._executor
+
+    def get_cached(self, full_path, st=None):
+        return digest_cache.get(full_path, st)
+
+    @traced('cache.digest')
+    def get_cached_many(self, stats):
+        return digest_cache.get_many(stats)
+
+    def submit(self, full_path, st=None):
+        """提交后台计算，返回 Future（结果为摘要字典）"""
+        if st is None:
+            st = os.stat(full_path)
+        with self._lock:
+            future = self._futures.get(full_path)
+            if future is not None:
+                return future
+            per_worker_rate = self.rate // self.workers if self.rate else 0
+            future = self._get_executor().submit(hash_file, full_path, per_worker_rate)
+            self._futures[full_path] = future
+        future.add_done_callback(lambda f: self._finished(full_path, st, f))
+        return future
+
+    def _finished(self, full_path, st, future):
+        with self._lock:
+            self._futures.pop(full_path, None)
+            idle = not self._futures
+        if future.cancelled() or future.exception() is not None:
+            if not future.cancelled():
+                print(f"[警告] 计算文件摘要失败 {full_path}: {future.exception()}")
+            return
+        try:
+            # 计算期间文件被修改时结果作废
+            if file_signature(full_path) != file_signature(full_path, st):
+                return
+        except OSError:
+            return
+        digest_cache.set(full_path, future.result(), st)
+        if idle:
+            digest_cache.flush()
+
+    def get(self, full_path, st=None):
+        """返回摘要，未缓存时计算并等待结果"""
+        if st is None:
+            st = os.stat(full_path)
+        digest = self.get_cached(full_path, st)
+        if digest is None:
+            digest = self.submit(full_path, st).result()
+        return digest
+
+    def iter_digests(self, stats):
+        """
+        批量获取摘要，stats 为 {完整路径: os.stat_result}
+        先返回已缓存的，其余并行计算、按完成顺序返回 (路径, 摘要)；读取失败的文件跳过
+        同时提交的文件不超过 PENDING_PER_WORKER × 进程数，调用方中途停止迭代（如扫描被取消）时不会留下大量排队的计算
+        """
+        cached = self.get_cached_many(stats)
+        for path, digest in cached.items():
+            yield path, digest
+        remaining = ((path, st) for path, st in stats.items() if path not in cached)
+        limit = self.workers * PENDING_PER_WORKER
+        futures = {}
+        while True:
+            for path, st in itertools.islice(remaining, limit - len(futures)):
+                futures[self.submit(path, st)] = path
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = futures.pop(future)
+                try:
+                    digest = future.result()
+                except Exception:
+                    continue
+                yield path, digest
+
+
+digest_service = DigestService()
+
+
+def digest_headers(digest):
+    """根据摘要生成 Repr-Digest（RFC 9530）与旧式 Digest（RFC 3230）响应头"""
+    value = base64.b64encode(bytes.fromhex(digest['sha256'])).decode('ascii')
+    return {
+        'Repr-Digest': f'sha-256=:{value}:',
+        'Digest': f'SHA-256={value}',
+    }
+
+
+def strong_etag(digest):
+    """由内容摘要得到的强 ETag，文件内容不变时在不同服务器和重启之间保持一致"""
+    return 'sha256-' + digest['sha256']
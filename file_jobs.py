@@ -0,0 +1,381 @@
+# file_jobs.py
+import errno
+import itertools
+import os
+import queue
+import shutil
+import stat
+import threading
+import time
+
+
+# 每次 copy_file_range / sendfile 调用复制的字节数，也是进度更新与取消检查的粒度
+COPY_CHUNK = 8 * 1024 * 1024
+# 内核零拷贝不可用时的普通读写缓冲区
+FALLBACK_BUFFER = 1024 * 1024
+# 保留在列表中的已结束任务数
+MAX_FINISHED_JOBS = 50
+# 计算瞬时速度的时间窗口（秒）
+SPEED_WINDOW = 3.0
+
+JOB_OPERATIONS = ('copy', 'move', 'delete')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class FileJob:
+    """一个复制/移动/删除任务及其进度"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, op, sources, dest_dir=None, labels=None):
+        self.id = str(next(self._ids))
+        self.op = op
+        self.sources = sources
+        self.dest_dir = dest_dir
+        self.labels = labels or [os.path.basename(s) for s in sources]
+        self.status = 'queued'
+        self.error = None
+        self.current = ''
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.total_files = 0
+        self.done_files = 0
+        # 移动时直接重命名完成的条目数（不产生数据复制）
+        self.renamed = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._samples = []
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def add_progress(self, nbytes=0, files=0):
+        self.done_bytes += nbytes
+        self.done_files += files
+        now = time.monotonic()
+        self._samples.append((now, self.done_bytes))
+        while len(self._samples) > 2 and now - self._samples[0][0] > SPEED_WINDOW:
+            self._samples.pop(0)
+
+    def to_dict(self):
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0
+        throughput = self.done_bytes / elapsed if elapsed > 0 else 0
+        speed = 0
+        if self.status == 'running' and len(self._samples) >= 2:
+            (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+            speed = (b1 - b0) / (t1 - t0) if t1 > t0 else 0
+        eta = None
+        if speed > 0 and self.total_bytes > self.done_bytes:
+            eta = (self.total_bytes - self.done_bytes) / speed
+        return {
+            'id': self.id,
+            'op': self.op,
+            'sources': self.labels,
+            'status': self.status,
+            'error': self.error,
+            'current': os.path.basename(self.current),
+            'total_bytes': self.total_bytes,
+            'done_bytes': self.done_bytes,
+            'total_files': self.total_files,
+            'done_files': self.done_files,
+            'renamed': self.renamed,
+            'elapsed': round(elapsed, 2),
+            'throughput': int(throughput),
+            'speed': int(speed),
+            'eta': round(eta, 1) if eta is not None else None,
+            'created_at': self.created_at,
+        }
+
+
+def _scan(path):
+    """统计路径下的文件数与字节数（符号链接不跟随）"""
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return 1, st.st_size if stat.S_ISREG(st.st_mode) else 0
+    files, size = 0, 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+            try:
+                entry_st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            files += 1
+            if stat.S_ISREG(entry_st.st_mode):
+                size += entry_st.st_size
+    return files, size
+
+
+def _copy_data(src_fd, dst_fd, size, job):
+    """
+    在两个文件描述符之间复制数据，依次尝试：
+    copy_file_range（同一文件系统上可由内核/文件系统直接完成，支持时还能共享数据块）、
+    sendfile（数据不经过用户态）、普通读写
+    """
+    offset = 0
+    for method in ('copy_file_range', 'sendfile'):
+        func = getattr(os, method, None)
+        if func is None:
+            continue
+        try:
+            while offset < size:
+                job.check_cancelled()
+                count = min(COPY_CHUNK, size - offset)
+                if method == 'copy_file_range':
+                    copied = func(src_fd, dst_fd, count, offset, offset)
+                else:
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    copied = func(dst_fd, src_fd, offset, count)
+                if copied == 0:
+                    # 源文件在复制过程中被截断
+                    return offset
+                offset += copied
+                job.add_progress(copied)
+            return offset
+        except OSError as e:
+            # 跨文件系统（旧内核）、文件系统不支持等情况换下一种方式，从当前位置继续
+            if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF):
+                raise
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        job.check_cancelled()
+        chunk = os.read(src_fd, FALLBACK_BUFFER)
+        if not chunk:
+            return offset
+        view = memoryview(chunk)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        offset += len(chunk)
+        job.add_progress(len(chunk))
+
+
+def _copy_file(src, dst, job):
+    """复制单个文件：先写入同目录下的临时文件，完成后再改名，取消或失败时不留下半个文件"""
+    job.current = src
+    tmp = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.part-{job.id}')
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        st = os.fstat(src_fd)
+        dst_fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, stat.S_IMODE(st.st_mode) | stat.S_IWUSR)
+        try:
+            _copy_data(src_fd, dst_fd, st.st_size, job)
+        finally:
+            os.close(dst_fd)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    finally:
+        os.close(src_fd)
+    job.add_progress(files=1)
+
+
+def _copy_tree(src, dst, job):
+    st = os.lstat(src)
+    if stat.S_ISLNK(st.st_mode):
+        os.symlink(os.readlink(src), dst)
+        job.add_progress(files=1)
+    elif stat.S_ISDIR(st.st_mode):
+        os.mkdir(dst)
+        with os.scandir(src) as entries:
+            names = [entry.name for entry in entries]
+        for name in names:
+            job.check_cancelled()
+            _copy_tree(os.path.join(src, name), os.path.join(dst, name), job)
+        shutil.copystat(src, dst)
+    elif stat.S_ISREG(st.st_mode):
+        _copy_file(src, dst, job)
+    else:
+        # 设备文件、FIFO 等不复制
+        job.add_progress(files=1)
+
+
+def _delete_tree(path, job):
+    job.current = path
+    st = os.lstat(path)
+    if stat.S_ISDIR(st.st_mode):
+        with os.scandir(path) as entries:
+            names = [entry.name for entry in entries]
+        for name in names:
+            job.check_cancelled()
+            _delete_tree(os.path.join(path, name), job)
+        os.rmdir(path)
+    else:
+        os.unlink(path)
+        job.add_progress(st.st_size if stat.S_ISREG(st.st_mode) else 0, files=1)
+
+
+class JobManager:
+    """
+    后台文件操作队列：
+    - 任务按提交顺序由一个工作线程依次执行，避免多个大任务同时争抢磁盘
+    - 移动优先使用 rename（同一文件系统上瞬间完成），跨文件系统时复制后删除源文件
+    - 复制过程中可随时取消，已完成的文件保留，正在复制的文件会被清理
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='file-jobs', daemon=True)
+            self._thread.start()
+
+    def submit(self, op, sources, dest_dir=None, labels=None):
+        job = FileJob(op, sources, dest_dir, labels)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.finished_at]
+            for old in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+                del self._jobs[old.id]
+            self._ensure_started()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in reversed(list(self._jobs.values()))]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job._cancel.is_set():
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                continue
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                self._execute(job)
+                job.status = 'done'
+            except JobCancelled:
+                job.status = 'cancelled'
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+                print(f"[警告] 文件任务 {job.id} ({job.op}) 失败: {e}")
+            finally:
+                job.current = ''
+                job.finished_at = time.time()
+
+    def _execute(self, job):
+        if job.op == 'delete':
+            for src in job.sources:
+                files, size = _scan(src)
+                job.total_files += files
+                job.total_bytes += size
+            for src in job.sources:
+                job.check_cancelled()
+                _delete_tree(src, job)
+            return
+
+        # 先检查全部目标，避免移动到一半才发现后面的文件冲突
+        targets = []
+        for src in job.sources:
+            name = os.path.basename(src)
+            dst = os.path.join(job.dest_dir, name)
+            if os.path.lexists(dst) or any(dst == other for _, other in targets):
+                raise FileExistsError(f'目标已存在: {name}')
+            targets.append((src, dst))
+
+        pending = []
+        for src, dst in targets:
+            if job.op == 'move':
+                try:
+                    # rename 不会跨文件系统，成功时只是修改目录项
+                    os.rename(src, dst)
+                    job.renamed += 1
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+            pending.append((src, dst))
+
+        for src, _ in pending:
+            files, size = _scan(src)
+            job.total_files += files
+            job.total_bytes += size
+        for src, dst in pending:
+            job.check_cancelled()
+            try:
+                _copy_tree(src, dst, job)
+            except JobCancelled:
+                if os.path.isdir(dst) and not os.path.islink(dst):
+                    # 未完成的目录复制整体移除，避免留下不完整的目录树
+                    shutil.rmtree(dst, ignore_errors=True)
+                raise
+            if job.op == 'move':
+                # 跨文件系统的移动：复制完成后再删除源文件
+                if os.path.isdir(src) and not os.path.islink(src):
+                    shutil.rmtree(src)
+                else:
+                    os.unlink(src)
+
+
+job_manager = JobManager()
+
+
+def is_within_root(path, root_dir):
+    """path 是否在 root_dir 之内（含根目录本身）；按路径组成部分比较，/data2 不算在 /data 之内"""
+    root_dir = os.path.normpath(root_dir)
+    try:
+        return os.path.commonpath([root_dir, os.path.normpath(path)]) == root_dir
+    except ValueError:
+        # Windows 上位于不同盘符
+        return False
+
+
+def validate_job(op, sources, dest_dir, root_dir):
+    """检查任务参数，返回错误信息，合法时返回 None"""
+    if op not in JOB_OPERATIONS:
+        return '不支持的操作'
+    if not sources:
+        return '请选择要操作的文件'
+    root_dir = os.path.normpath(root_dir)
+    for src in sources:
+        if not is_within_root(src, root_dir):
+            return '访问被拒绝'
+        if src == root_dir:
+            return '不能操作根目录本身'
+        if not os.path.lexists(src):
+            return f'文件不存在: {os.path.basename(src)}'
+    if op == 'delete':
+        return None
+    if not dest_dir or not is_within_root(dest_dir, root_dir):
+        return '访问被拒绝'
+    if not os.path.isdir(dest_dir):
+        return '目标文件夹不存在'
+    for src in sources:
+        if dest_dir == src or dest_dir.startswith(src + os.sep):
+            return '不能复制或移动到自身的子文件夹中'
+        if os.path.lexists(os.path.join(dest_dir, os.path.basename(src))):
+            return f'目标已存在: {os.path.basename(src)}'
+    return None
@@ -0,0 +1,206 @@
+# file_types.py
+import os
+import stat
+
+from file_cache import PersistentFileCache
+from tracing import traced
+
+
+# 嗅探时读取的文件头字节数
+SNIFF_SIZE = 8192
+
+# 魔数签名表: (偏移, 魔数, 类别, MIME 类型, 对应的标准扩展名)
+# 类别与 routes.py 中的文件类型常量对应，用于纠正扩展名错误的文件
+SIGNATURES = [
+    (0, b'\x89PNG\r\n\x1a\n', 'image', 'image/png', '.png'),
+    (0, b'\xff\xd8\xff', 'image', 'image/jpeg', '.jpg'),
+    (0, b'GIF87a', 'image', 'image/gif', '.gif'),
+    (0, b'GIF89a', 'image', 'image/gif', '.gif'),
+    (0, b'%PDF-', 'pdf', 'application/pdf', '.pdf'),
+    (0, b'fLaC', 'audio', 'audio/flac', '.flac'),
+    (0, b'OggS', 'audio', 'audio/ogg', '.ogg'),
+    (0, b'\x30\x26\xb2\x75\x8e\x66\xcf\x11', 'video', 'video/x-ms-wmv', '.wmv'),
+    (0, b'\x1a\x45\xdf\xa3', 'video', 'video/webm', '.webm'),
+    (0, b'SQLite format 3\x00', 'sqlite', 'application/vnd.sqlite3', '.sqlite'),
+    (0, b'\x1f\x8b', 'archive', 'application/gzip', '.tar.gz'),
+    (0, b'\xfd7zXZ\x00', 'archive', 'application/x-xz', '.tar.xz'),
+    (257, b'ustar', 'archive', 'application/x-tar', '.tar'),
+]
+
+# 文本编码的 BOM
+_BOMS = [
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+]
+
+file_type_cache = PersistentFileCache('file_type')
+
+
+def _sniff_riff(head):
+    """RIFF 容器：WAV / AVI / WEBP"""
+    form = head[8:12]
+    if form == b'WAVE':
+        return 'audio', 'audio/wav', '.wav'
+    if form == b'AVI ':
+        return 'video', 'video/x-msvideo', '.avi'
+    if form == b'WEBP':
+        return 'image', 'image/webp', '.webp'
+    return None
+
+
+def _sniff_iso_media(head):
+    """ISO BMFF 容器（MP4/MOV/M4A），第4字节起为 ftyp 盒子"""
+    brand = head[8:12]
+    if brand == b'qt  ':
+        return 'video', 'video/quicktime', '.mov'
+    if brand in (b'M4A ', b'M4B '):
+        return 'audio', 'audio/mp4', '.m4a'
+    return 'video', 'video/mp4', '.mp4'
+
+
+def _zip_member_names(head):
+    """按顺序解析文件头中完整的 ZIP 本地文件头，返回成员名列表（遇到数据描述符或读到头部末尾时停止）"""
+    names = []
+    offset = 0
+    while head[offset:offset + 4] == b'PK\x03\x04' and offset + 30 <= len(head):
+        flags = int.from_bytes(head[offset + 6:offset + 8], 'little')
+        compressed = int.from_bytes(head[offset + 18:offset + 22], 'little')
+        name_len = int.from_bytes(head[offset + 26:offset + 28], 'little')
+        extra_len = int.from_bytes(head[offset + 28:offset + 30], 'little')
+        name_end = offset + 30 + name_len
+        if name_end > len(head):
+            break
+        names.append(head[offset + 30:name_end].decode('utf-8', errors='replace'))
+        if flags & 0x08:
+            # 大小记录在数据之后的数据描述符中，无法跳到下一个成员
+            break
+        offset = name_end + extra_len + compressed
+    return names
+
+
+# Office Open XML 文档的主体目录：(成员名前缀, 类别, MIME 类型, 扩展名)
+_OOXML_PARTS = [
+    ('word/', 'office', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx'),
+    ('xl/', 'office', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'),
+    ('ppt/', 'office', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx'),
+]
+
+
+def _sniff_zip(head):
+    """
+    ZIP 容器：包含 [Content_Types].xml 且有成员名以 word/、xl/、ppt/ 开头时为 Office 文档，否则为普通压缩包
+    只看本地文件头中的成员名，不会因为文件内容里碰巧出现这些字节而误判
+    """
+    names = _zip_member_names(head)
+    if '[Content_Types].xml' in names:
+        for prefix, kind, mimetype, ext in _OOXML_PARTS:
+            if any(name.startswith(prefix) for name in names):
+                return kind, mimetype, ext
+    return 'archive', 'application/zip', '.zip'
+
+
+def detect_text_encoding(data):
+    """
+    检测文本编码：BOM > UTF-8 > GBK（中文 Windows 下保存的文件常为 GBK）
+    无法识别为文本时返回 None
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    if b'\x00' in data:
+        return None
+    for encoding in ('utf-8', 'gbk', 'gb18030'):
+        try:
+            data.decode(encoding)
+            return encoding
+        except UnicodeDecodeError as e:
+            # 读取的文件头可能在多字节字符中间被截断
+            if e.start >= len(data) - 3 and len(data) >= SNIFF_SIZE:
+                try:
+                    data[:e.start].decode(encoding)
+                    return encoding
+                except UnicodeDecodeError:
+                    pass
+    return None
+
+
+def sniff_bytes(head):
+    """根据文件头字节判断类型，返回 {'kind', 'mimetype', 'ext', 'encoding'}"""
+    result = None
+    for offset, magic, kind, mimetype, ext in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            result = (kind, mimetype, ext)
+            break
+    if result is None:
+        if head[:4] == b'RIFF':
+            result = _sniff_riff(head)
+        elif head[4:8] == b'ftyp':
+            result = _sniff_iso_media(head)
+        elif head[:4] == b'PK\x03\x04':
+            result = _sniff_zip(head)
+        elif head[:2] == b'BM' and int.from_bytes(head[14:18], 'little') in (12, 40, 52, 56, 64, 108, 124):
+            # 只有两字节魔数的格式再校验头部字段，避免把以 "BM" 开头的文本误判为图片
+            result = ('image', 'image/bmp', '.bmp')
+        elif head[:3] == b'ID3' and head[3:4] in (b'\x02', b'\x03', b'\x04'):
+            result = ('audio', 'audio/mpeg', '.mp3')
+        elif head[:3] == b'BZh' and head[4:10] == b'1AY&SY':
+            result = ('archive', 'application/x-bzip2', '.tar.bz2')
+        elif len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0 and head[1] & 0x06:
+            # MPEG 音频帧同步字（无 ID3 标签的 MP3）
+            result = ('audio', 'audio/mpeg', '.mp3')
+    if result is not None:
+        kind, mimetype, ext = result
+        return {'kind': kind, 'mimetype': mimetype, 'ext': ext, 'encoding': None}
+
+    encoding = detect_text_encoding(head)
+    if encoding is None:
+        return {'kind': 'binary', 'mimetype': 'application/octet-stream', 'ext': None, 'encoding': None}
+
+    # 文本类中再区分 SVG 与 draw.io 图表
+    text = head[:1024].decode(encoding, errors='ignore').lstrip().lower()
+    if '<svg' in text and (text.startswith('<?xml') or text.startswith('<svg') or text.startswith('<!doctype svg')):
+        return {'kind': 'image', 'mimetype': 'image/svg+xml', 'ext': '.svg', 'encoding': encoding}
+    if text.startswith('<mxfile'):
+        return {'kind': 'drawio', 'mimetype': 'application/xml', 'ext': '.drawio', 'encoding': encoding}
+    return {'kind': 'text', 'mimetype': 'text/plain', 'ext': None, 'encoding': encoding}
+
+
+@traced('file_types.detect')
+def detect_file_type(full_path, st=None):
+    """检测文件的真实类型与文本编码，结果按 inode/大小/mtime 持久缓存"""
+    def compute():
+        with open(full_path, 'rb') as f:
+            head = f.read(SNIFF_SIZE)
+        return sniff_bytes(head)
+    if st is None:
+        st = os.stat(full_path)
+    return file_type_cache.get_or_compute(full_path, compute, st)
+
+
+@traced('file_types.detect_many')
+def detect_file_types(stats):
+    """
+    批量检测目录中的文件类型，stats 为 {完整路径: os.stat_result}
+    已缓存的一次查询取出，只有新文件或修改过的文件才会读取文件头
+    """
+    # 管道、设备等特殊文件读取时可能阻塞，不做检测
+    stats = {path: st for path, st in stats.items() if stat.S_ISREG(st.st_mode)}
+    results = file_type_cache.get_many(stats)
+    for path, st in stats.items():
+        if path not in results:
+            try:
+                results[path] = detect_file_type(path, st)
+            except OSError:
+                continue
+    file_type_cache.flush()
+    return results
+
+
+@traced('fs.read_text')
+def read_text_file(full_path, st=None):
+    """按检测到的编码读取文本文件，无法识别的字符以替换符显示"""
+    info = detect_file_type(full_path, st)
+    encoding = info.get('encoding') or 'utf-8'
+    with open(full_path, 'r', encoding=encoding, errors='replace') as f:
+        return f.read()
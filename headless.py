@@ -0,0 +1,181 @@
+# headless.py
+"""
+无界面启动文件服务器：不导入 PyQt5，可在没有图形环境的服务器上直接运行
+
+    python headless.py [--config config.ini] [--mode production] [--port 5000] ...
+
+与 `python main.py run` 相同（GUI 启动的服务子进程也走这里）
+"""
+import os
+import sys
+import argparse
+import configparser
+import multiprocessing
+from flask import Flask
+import routes
+import access_log
+import metrics
+import profiler
+import tracing
+from app_env import get_resource_path, get_config_path, get_logs_dir, get_local_ips
+from server import load_server_settings, serve, effective_workers, SERVER_MODES, DEFAULT_SERVER_SETTINGS
+
+
+def create_app():
+    """应用工厂函数"""
+    # 显式指定 templates 和 static 目录（外部文件夹）
+    template_dir = get_resource_path('templates')
+    static_dir = get_resource_path('static')
+
+    app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
+    app.secret_key = 'your_super_secret_key_change_this_in_production'
+    app.config['CONFIG_FILE'] = get_config_path()
+    app.config['DEFAULT_ROOT_DIR'] = os.path.expanduser("~")
+    # 调试模式只在 [server] mode = development 时由 run_flask_app 开启
+
+    # 确保模板和静态目录存在（用于首次运行时创建）
+    os.makedirs(template_dir, exist_ok=True)
+    os.makedirs(static_dir, exist_ok=True)
+
+    # 访问日志在后台线程中批量写入
+    access_log.init_app(app, get_logs_dir())
+    # 请求统计，/metrics 输出
+    metrics.init_app(app)
+    # 按需性能分析（需在配置中打开）
+    profiler.init_app(app)
+    # 请求跟踪，静态资源和跟踪页面本身不记录
+    tracing.init_app(app, skip_endpoints=access_log.STATIC_ENDPOINTS | {'traces_page', 'traces_export'})
+    routes.init_app(app)
+    return app
+
+
+def load_or_create_config(app):
+    """加载或创建配置文件"""
+    config_file = app.config['CONFIG_FILE']
+    config = configparser.ConfigParser()
+    
+    if os.path.exists(config_file):
+        # 配置文件存在，加载配置
+        config.read(config_file, encoding='utf-8')
+        if 'settings' in config:
+            settings = config['settings']
+            root_dir = settings.get('root_dir', app.config['DEFAULT_ROOT_DIR'])
+            password = settings.get('password', 'ats123')
+            
+            # 保存配置到app中（即使路径不存在也保留用户设置）
+            app.config['ROOT_DIR'] = os.path.normpath(root_dir) if root_dir else app.config['DEFAULT_ROOT_DIR']
+            app.config['PASSWORD'] = password
+            
+            # 检查路径是否有效（仅警告，不修改配置）
+            if not os.path.isdir(app.config['ROOT_DIR']):
+                print(f"[警告] 配置的根目录 '{app.config['ROOT_DIR']}' 不存在或无效")
+                print(f"  请通过设置界面修改根目录，或手动创建该目录")
+            
+            print(f"[OK] 配置已加载: 根目录={app.config['ROOT_DIR']}, 密码长度={len(password)}")
+        else:
+            # 配置文件格式错误，使用默认值并保存
+            print("[警告] 配置文件格式错误，使用默认配置")
+            app.config['ROOT_DIR'] = app.config['DEFAULT_ROOT_DIR']
+            app.config['PASSWORD'] = 'ats123'
+            save_config(app)
+    else:
+        # 配置文件不存在，创建默认配置
+        print("配置文件不存在，创建默认配置")
+        app.config['ROOT_DIR'] = app.config['DEFAULT_ROOT_DIR']
+        app.config['PASSWORD'] = 'ats123'
+        save_config(app)
+
+
+def save_config(app):
+    """保存当前配置到文件"""
+    config_file = app.config['CONFIG_FILE']
+    config = configparser.ConfigParser()
+    # 保留 [server] 等其他配置节
+    if os.path.exists(config_file):
+        config.read(config_file, encoding='utf-8')
+    config['settings'] = {
+        'root_dir': app.config['ROOT_DIR'],
+        'password': app.config['PASSWORD']
+    }
+    if 'server' not in config:
+        # 首次保存时写入默认的服务设置，便于用户修改
+        config['server'] = {key: str(value) for key, value in DEFAULT_SERVER_SETTINGS.items()}
+    with open(config_file, 'w', encoding='utf-8') as f:
+        config.write(f)
+    print(f"配置已保存到: {config_file}")
+
+
+def run_flask_app(info_file_path=None, overrides=None, config_file=None):
+    """运行 Flask 应用，overrides 为命令行中指定的 [server] 设置，config_file 为 --config 指定的配置文件"""
+    application = create_app()
+    if config_file:
+        application.config['CONFIG_FILE'] = os.path.abspath(config_file)
+    load_or_create_config(application)
+    settings = load_server_settings(application.config['CONFIG_FILE'], overrides)
+    application.config['ACCESS_LOG_STATIC_SAMPLE'] = settings['access_log_static_sample']
+    application.config['METRICS_TOKEN'] = settings['metrics_token']
+    application.config['PROFILING_ENABLED'] = bool(settings['profiling'])
+    application.config['TRACE_BUFFER_SIZE'] = settings['trace_buffer']
+    application.config['SERVER_WORKERS'] = effective_workers(settings)
+    if settings['trace_buffer'] > 0:
+        tracing.trace_buffer.resize(settings['trace_buffer'])
+    
+    # === 显示加载的配置信息 ===
+    print("=" * 60)
+    print("[服务器配置信息]")
+    print(f"配置文件路径: {application.config.get('CONFIG_FILE')}")
+    print(f"根目录: {application.config.get('ROOT_DIR')}")
+    print(f"登录密码: {application.config.get('PASSWORD')}")
+    print(f"密码长度: {len(application.config.get('PASSWORD', ''))}")
+    print(f"服务模式: {settings['mode']}")
+    print("=" * 60)
+    if application.config['SERVER_WORKERS'] > 1:
+        print("[警告] 多进程模式下，后台任务、重复文件扫描、采样/内存分析和慢请求追踪只保存在各自的进程中，"
+              "相应接口将返回 409；请使用 workers = 1 来使用这些功能")
+    # === 配置信息结束 ===
+    
+    host = settings['host']
+    port = settings['port']
+    local_ips = get_local_ips()
+    print(f" * Running on all addresses ({host})")
+    for ip in local_ips:
+        if ip != '0.0.0.0':
+            print(f" * Running on http://{ip}:{port}")
+    sys.stdout.flush()
+    if settings['mode'] == 'production':
+        if application.config['SERVER_WORKERS'] > 1:
+            # 各工作进程的统计通过文件汇总
+            metrics.metrics.enable_process_group(os.getpid())
+        serve(application, settings)
+        return
+    # 开发模式：当从GUI启动时（有info_file_path参数），将debug设为False以避免冲突
+    debug = False if info_file_path else True
+    application.run(host=host, port=port, debug=debug)
+
+
+def parse_run_args(argv, prog='main.py run'):
+    """解析 `main.py run` 之后（或 headless.py 的）参数"""
+    parser = argparse.ArgumentParser(prog=prog, description='启动文件服务器（无界面）')
+    parser.add_argument('info_file', nargs='?', help='GUI 启动时传入的临时文件路径')
+    parser.add_argument('--config', help='配置文件路径，默认为程序目录下的 config.ini')
+    parser.add_argument('--mode', choices=SERVER_MODES, help='服务模式')
+    parser.add_argument('--host', help='监听地址')
+    parser.add_argument('--port', type=int, help='监听端口')
+    parser.add_argument('--threads', type=int, help='每个进程的工作线程数')
+    parser.add_argument('--workers', type=int, help='进程数（大于 1 时使用多进程，仅 Linux/macOS）')
+    parser.add_argument('--backlog', type=int, help='连接等待队列长度')
+    parser.add_argument('--keep-alive-timeout', type=int, dest='keep_alive_timeout', help='长连接空闲超时（秒）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None, prog='headless.py'):
+    args = parse_run_args(sys.argv[1:] if argv is None else argv, prog)
+    overrides = {key: getattr(args, key) for key in
+                 ('mode', 'host', 'port', 'threads', 'workers', 'backlog', 'keep_alive_timeout')}
+    run_flask_app(args.info_file, overrides, args.config)
+
+
+if __name__ == '__main__':
+    # 打包为 exe 后，文件摘要使用的进程池需要此调用才能启动子进程
+    multiprocessing.freeze_support()
+    main()
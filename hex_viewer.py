@@ -0,0 +1,150 @@
+# hex_viewer.py
+import mmap
+import os
+import re
+from html import escape
+
+from preview_utils import page_link
+from tracing import traced
+
+
+# 每行字节数与每页字节数
+HEX_BYTES_PER_LINE = 16
+HEX_PAGE_SIZE = 4096
+# 搜索时每次扫描的窗口大小，以及单次请求最多扫描的字节数（超过后提示继续搜索）
+SEARCH_CHUNK_SIZE = 16 * 1024 * 1024
+SEARCH_MAX_SCAN = 1024 * 1024 * 1024
+
+# 不可打印字符在 ASCII 栏显示为点
+_ASCII_TABLE = bytes(b if 0x20 <= b < 0x7f else ord('.') for b in range(256))
+
+
+def _open_map(f):
+    """只读映射整个文件，由操作系统按需分页，只有访问到的窗口才会被读入"""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_window(full_path, offset, length):
+    """通过 mmap 读取 [offset, offset+length) 窗口"""
+    size = os.path.getsize(full_path)
+    if size == 0 or offset >= size:
+        return b''
+    with open(full_path, 'rb') as f, _open_map(f) as mm:
+        return mm[offset:min(offset + length, size)]
+
+
+def parse_offset(value):
+    """解析偏移量，支持十进制与 0x 开头的十六进制"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, int):
+        return max(value, 0)
+    value = str(value).strip().lower()
+    try:
+        return max(int(value, 16) if value.startswith('0x') else int(value), 0)
+    except ValueError:
+        return 0
+
+
+def parse_pattern(text):
+    """
+    解析搜索内容：
+    - 由十六进制字节组成（如 'DE AD BE EF'）时按字节搜索
+    - 用引号包裹或包含其他字符时按 UTF-8 文本搜索
+    """
+    text = (text or '').strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '"\'':
+        return text[1:-1].encode('utf-8')
+    compact = re.sub(r'\s+', '', text)
+    if compact and len(compact) % 2 == 0 and re.fullmatch(r'[0-9a-fA-F]+', compact):
+        return bytes.fromhex(compact)
+    return text.encode('utf-8')
+
+
+def search_bytes(full_path, pattern, start=0, max_scan=SEARCH_MAX_SCAN):
+    """
+    从 start 开始分块查找字节序列，相邻窗口重叠 len(pattern)-1 字节以免漏掉跨块匹配
+    返回 (匹配偏移或 None, 本次扫描结束位置)
+    """
+    size = os.path.getsize(full_path)
+    if not pattern or size == 0 or start >= size:
+        return None, size
+    overlap = len(pattern) - 1
+    limit = min(size, start + max_scan)
+    with open(full_path, 'rb') as f, _open_map(f) as mm:
+        pos = start
+        while pos < limit:
+            end = min(pos + SEARCH_CHUNK_SIZE, limit) + overlap
+            found = mm.find(pattern, pos, end)
+            if found != -1:
+                return found, found
+            pos += SEARCH_CHUNK_SIZE
+    return None, limit
+
+
+def format_hex_lines(data, base_offset):
+    """将字节格式化为 '偏移  十六进制  ASCII' 文本行"""
+    lines = []
+    for i in range(0, len(data), HEX_BYTES_PER_LINE):
+        chunk = data[i:i + HEX_BYTES_PER_LINE]
+        hex_part = chunk.hex(' ')
+        ascii_part = chunk.translate(_ASCII_TABLE).decode('ascii')
+        lines.append(f'{base_offset + i:010x}  {hex_part:<{HEX_BYTES_PER_LINE * 3 - 1}}  {ascii_part}')
+    return lines
+
+
+@traced('preview.hex')
+def render_hex_preview(full_path, params=None):
+    """渲染十六进制预览页，params 可包含 hex_offset（跳转）与 hex_search（搜索）"""
+    params = params or {}
+    size = os.path.getsize(full_path)
+    if size == 0:
+        return '<div class="office-preview-info">空文件</div>'
+
+    offset = min(parse_offset(params.get('hex_offset')), size - 1)
+    message = ''
+    search_text = params.get('hex_search') or ''
+    if search_text:
+        pattern = parse_pattern(search_text)
+        found, scanned_to = search_bytes(full_path, pattern, offset)
+        if found is not None:
+            offset = found
+            message = f'找到匹配: 0x{found:x}'
+        elif scanned_to < size:
+            message = f'扫描到 0x{scanned_to:x} 仍未找到，' + page_link(
+                '继续搜索', {'hex_offset': scanned_to, 'hex_search': search_text})
+        else:
+            message = '未找到匹配内容'
+
+    # 按行对齐，保证同一位置总是出现在相同的页中
+    page_start = offset - offset % HEX_BYTES_PER_LINE
+    data = read_window(full_path, page_start, HEX_PAGE_SIZE)
+    lines = format_hex_lines(data, page_start)
+
+    nav = []
+    if page_start > 0:
+        nav.append(page_link('首页', {'hex_offset': 0}))
+        nav.append(page_link('上一页', {'hex_offset': max(page_start - HEX_PAGE_SIZE, 0)}))
+    if page_start + HEX_PAGE_SIZE < size:
+        nav.append(page_link('下一页', {'hex_offset': page_start + HEX_PAGE_SIZE}))
+        last_page = (size - 1) // HEX_PAGE_SIZE * HEX_PAGE_SIZE
+        nav.append(page_link('末页', {'hex_offset': last_page}))
+    # 下一次搜索从当前匹配之后开始
+    next_search_from = offset + 1 if search_text else page_start
+    form = (
+        '<form class="preview-param-form d-flex flex-wrap gap-2 my-2">'
+        f'<input class="form-control form-control-sm" style="max-width: 180px" name="hex_offset" placeholder="偏移(如 0x1F00)" value="0x{page_start:x}">'
+        '<button class="btn btn-sm btn-primary" type="submit">跳转</button>'
+        '</form>'
+        '<form class="preview-param-form d-flex flex-wrap gap-2 my-2">'
+        f'<input type="hidden" name="hex_offset" value="{next_search_from}">'
+        f'<input class="form-control form-control-sm" style="max-width: 260px" name="hex_search" placeholder="搜索: DE AD BE EF 或 &quot;文本&quot;" value="{escape(search_text, quote=True)}">'
+        '<button class="btn btn-sm btn-primary" type="submit">查找下一个</button>'
+        '</form>'
+    )
+    info = (f'<div class="text-muted small my-1">文件大小: {size} 字节，显示 '
+            f'0x{page_start:x} - 0x{page_start + len(data):x}</div>')
+    message_html = f'<div class="alert alert-info py-1 my-1">{message}</div>' if message else ''
+    return (f'{form}{info}{message_html}'
+            f'<pre class="hex-preview"><code>{escape(chr(10).join(lines))}</code></pre>'
+            f'<div class="d-flex gap-2 my-2">{"".join(nav)}</div>')
@@ -0,0 +1,310 @@
+# media_metadata.py
+import os
+import queue
+import struct
+import threading
+
+from file_cache import PersistentFileCache
+from mp4_faststart import read_top_level_boxes
+from tracing import traced
+
+
+# 需要提取元数据的文件类型
+MEDIA_METADATA_EXTENSIONS = ['.mp4', '.m4v', '.m4a', '.mov', '.wav', '.flac', '.mp3',
+                             '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+# moov 超过该大小时只解析前面部分
+MAX_MOOV_READ = 16 * 1024 * 1024
+# 查找 MP3 首帧时最多扫描的字节数
+MP3_SYNC_SCAN = 64 * 1024
+
+# MPEG 音频 Layer III 比特率表（kbps），按 [MPEG-1, MPEG-2/2.5] 索引
+_MP3_BITRATES = [
+    [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+]
+# 采样率表，按版本位 (3=MPEG-1, 2=MPEG-2, 0=MPEG-2.5) 索引
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+# 常见视频/音频编码的四字符码
+_CODEC_NAMES = {
+    'avc1': 'H.264', 'avc3': 'H.264', 'hvc1': 'H.265', 'hev1': 'H.265', 'av01': 'AV1',
+    'vp09': 'VP9', 'mp4v': 'MPEG-4', 'mp4a': 'AAC', 'ac-3': 'AC-3', 'ec-3': 'E-AC-3',
+    'alac': 'ALAC', 'opus': 'Opus', 'Opus': 'Opus', 'apcn': 'ProRes', 'apch': 'ProRes'
+}
+
+media_metadata_cache = PersistentFileCache('media_metadata')
+
+
+def _iter_boxes(data, start, end):
+    """遍历 data[start:end] 中的盒子，产出 (类型, 内容起点, 内容终点)"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header_size = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def _find_box(data, start, end, path):
+    """按路径查找第一个子盒子，如 [b'mdia', b'hdlr']，返回 (内容起点, 内容终点) 或 None"""
+    for box_type, body_start, body_end in _iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return body_start, body_end
+            return _find_box(data, body_start, body_end, path[1:])
+    return None
+
+
+def parse_mp4(full_path):
+    """解析 MP4/MOV：从 mvhd 取时长，从 tkhd 取分辨率，从 stsd 取编码"""
+    boxes = read_top_level_boxes(full_path)
+    moov = next((b for b in boxes or [] if b[0] == b'moov'), None)
+    if moov is None:
+        return None
+    with open(full_path, 'rb') as f:
+        f.seek(moov[1])
+        data = f.read(min(moov[2], MAX_MOOV_READ))
+
+    result = {}
+    moov_body = next(_iter_boxes(data, 0, len(data)), None)
+    if moov_body is None:
+        return None
+    _, start, end = moov_body
+
+    mvhd = _find_box(data, start, end, [b'mvhd'])
+    if mvhd:
+        pos = mvhd[0]
+        if data[pos] == 1:
+            timescale, duration = struct.unpack('>IQ', data[pos + 20:pos + 32])
+        else:
+            timescale, duration = struct.unpack('>II', data[pos + 12:pos + 20])
+        if timescale:
+            result['duration'] = duration / timescale
+
+    codecs = []
+    for box_type, trak_start, trak_end in _iter_boxes(data, start, end):
+        if box_type != b'trak':
+            continue
+        hdlr = _find_box(data, trak_start, trak_end, [b'mdia', b'hdlr'])
+        handler = data[hdlr[0] + 8:hdlr[0] + 12] if hdlr else b''
+        stsd = _find_box(data, trak_start, trak_end, [b'mdia', b'minf', b'stbl', b'stsd'])
+        if stsd and stsd[1] - stsd[0] >= 16:
+            codec = data[stsd[0] + 12:stsd[0] + 16].decode('latin-1')
+            codecs.append(_CODEC_NAMES.get(codec, codec.strip()))
+        if handler == b'vide' and 'width' not in result:
+            tkhd = _find_box(data, trak_start, trak_end, [b'tkhd'])
+            if tkhd:
+                base = tkhd[0] + (36 if data[tkhd[0]] == 1 else 24)
+                width, height = struct.unpack('>II', data[base + 52:base + 60])
+                result['width'] = width >> 16
+                result['height'] = height >> 16
+    if codecs:
+        result['codec'] = ' / '.join(dict.fromkeys(codecs))
+    return result
+
+
+def parse_wav(full_path):
+    """解析 WAV：读取 fmt 块，按 data 块长度计算时长（只跳读块头）"""
+    result = {}
+    file_size = os.path.getsize(full_path)
+    with open(full_path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+        byte_rate = 0
+        pos = 12
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            if chunk_id == b'fmt ':
+                fmt = f.read(16)
+                audio_format, channels, sample_rate, byte_rate, _, bits = struct.unpack('<HHIIHH', fmt)
+                result.update({'codec': 'PCM' if audio_format in (1, 0xFFFE) else f'WAV(0x{audio_format:x})',
+                               'sample_rate': sample_rate, 'channels': channels, 'bits': bits})
+            elif chunk_id == b'data':
+                # 录音中断的文件 data 长度可能不准确，以实际文件长度为上限
+                data_size = min(chunk_size, file_size - pos - 8)
+                if byte_rate:
+                    result['duration'] = data_size / byte_rate
+                break
+            pos += 8 + chunk_size + (chunk_size & 1)
+    return result
+
+
+def parse_flac(full_path):
+    """解析 FLAC：STREAMINFO 块中包含采样率、声道数与总采样数"""
+    with open(full_path, 'rb') as f:
+        header = f.read(4 + 4 + 34)
+    if header[:4] != b'fLaC' or header[4] & 0x7F != 0:
+        return None
+    info = header[8:42]
+    packed = int.from_bytes(info[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    result = {'codec': 'FLAC', 'sample_rate': sample_rate, 'channels': channels, 'bits': bits}
+    if sample_rate and total_samples:
+        result['duration'] = total_samples / sample_rate
+    return result
+
+
+def parse_mp3(full_path):
+    """解析 MP3：跳过 ID3v2 标签，读取首帧头；有 Xing/VBRI 头时按帧数计算，否则按恒定比特率估算"""
+    file_size = os.path.getsize(full_path)
+    with open(full_path, 'rb') as f:
+        head = f.read(10)
+        audio_start = 0
+        if head[:3] == b'ID3' and len(head) == 10:
+            tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+            audio_start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+        f.seek(audio_start)
+        data = f.read(MP3_SYNC_SCAN)
+
+    for i in range(len(data) - 4):
+        b1, b2, b3 = data[i + 1], data[i + 2], data[i + 3]
+        if data[i] != 0xFF or b1 & 0xE0 != 0xE0:
+            continue
+        version = (b1 >> 3) & 0x3
+        layer = (b1 >> 1) & 0x3
+        bitrate_index = b2 >> 4
+        sample_index = (b2 >> 2) & 0x3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_index == 3:
+            continue
+        bitrate = _MP3_BITRATES[0 if version == 3 else 1][bitrate_index]
+        sample_rate = _MP3_SAMPLE_RATES[version][sample_index]
+        mono = (b3 >> 6) == 3
+        samples_per_frame = 1152 if version == 3 else 576
+        result = {'codec': 'MP3', 'sample_rate': sample_rate, 'channels': 1 if mono else 2,
+                  'bitrate': bitrate}
+
+        # VBR 文件的首帧是 Xing/Info 或 VBRI 头，记录了总帧数
+        side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+        xing = i + 4 + side_info
+        frames = None
+        if data[xing:xing + 4] in (b'Xing', b'Info'):
+            flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+        elif data[i + 36:i + 40] == b'VBRI':
+            frames = struct.unpack('>I', data[i + 50:i + 54])[0]
+        if frames:
+            result['duration'] = frames * samples_per_frame / sample_rate
+        else:
+            result['duration'] = (file_size - audio_start - i) * 8 / (bitrate * 1000)
+        return result
+    return None
+
+
+def parse_image(full_path):
+    """Pillow 打开图片时只解析文件头，不解码像素"""
+    from PIL import Image
+
+    with Image.open(full_path) as im:
+        width, height = im.size
+        return {'width': width, 'height': height, 'codec': im.format}
+
+
+_PARSERS = {
+    '.mp4': parse_mp4, '.m4v': parse_mp4, '.m4a': parse_mp4, '.mov': parse_mp4,
+    '.wav': parse_wav, '.flac': parse_flac, '.mp3': parse_mp3,
+}
+
+
+def extract_metadata(full_path, ext):
+    """按类型提取元数据，无法解析时返回空字典（同样会被缓存，避免反复尝试）"""
+    parser = _PARSERS.get(ext, parse_image)
+    try:
+        return parser(full_path) or {}
+    except Exception as e:
+        print(f"[警告] 解析媒体信息失败 {full_path}: {e}")
+        return {}
+
+
+def format_duration(seconds):
+    """格式化时长为 m:ss 或 h:mm:ss"""
+    if seconds is None:
+        return ''
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{secs:02d}'
+    return f'{minutes}:{secs:02d}'
+
+
+def format_metadata(meta):
+    """生成列表中显示的时长与分辨率"""
+    if not meta:
+        return {'duration': '', 'resolution': ''}
+    resolution = f"{meta['width']}×{meta['height']}" if meta.get('width') else ''
+    return {'duration': format_duration(meta.get('duration')), 'resolution': resolution}
+
+
+class MetadataWorker:
+    """
+    后台元数据提取线程：
+    - 目录列表只查询缓存，未命中的文件放入队列，由后台线程逐个解析
+    - 同一文件在队列中只保留一份
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='media-metadata', daemon=True)
+            self._thread.start()
+
+    def submit(self, full_path, ext):
+        with self._lock:
+            if full_path in self._pending:
+                return
+            self._pending.add(full_path)
+            self._ensure_started()
+        self._queue.put((full_path, ext))
+
+    def _run(self):
+        while True:
+            full_path, ext = self._queue.get()
+            try:
+                st = os.stat(full_path)
+                media_metadata_cache.get_or_compute(full_path, lambda: extract_metadata(full_path, ext), st)
+                if self._queue.empty():
+                    media_metadata_cache.flush()
+            except OSError:
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard(full_path)
+
+    def is_pending(self, full_path):
+        with self._lock:
+            return full_path in self._pending
+
+
+metadata_worker = MetadataWorker()
+
+
+@traced('cache.media_metadata')
+def get_cached_metadata(stats, exts):
+    """
+    查询一批文件的元数据，stats 为 {完整路径: os.stat_result}，exts 为 {完整路径: 扩展名}
+    已缓存的直接返回，未缓存的交给后台线程，本次返回中不包含
+    """
+    results = media_metadata_cache.get_many(stats)
+    for path in stats:
+        if path not in results:
+            metadata_worker.submit(path, exts[path])
+    return results
@@ -0,0 +1,150 @@
+# memory_profile.py
+import itertools
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from file_cache import all_caches
+
+
+# 内存中保留的快照数，超出后丢弃最早的
+MAX_SNAPSHOTS = 10
+MAX_FRAMES = 25
+KEY_TYPES = ('lineno', 'filename', 'traceback')
+# 快照中不统计 tracemalloc 自身和导入机制的分配
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def _format_traceback(traceback, key_type):
+    """按 lineno/filename 分组时只有一帧；traceback 分组时为从外到内的全部帧"""
+    if key_type == 'filename':
+        return [{'location': frame.filename, 'line': ''} for frame in traceback]
+    return [{'location': f'{frame.filename}:{frame.lineno}',
+             'line': linecache.getline(frame.filename, frame.lineno).strip()} for frame in traceback]
+
+
+class MemoryProfiler:
+    """
+    tracemalloc 的开关与快照管理（当前进程）：
+    start/stop 控制跟踪，snapshot 保存一份快照，top 列出分配最多的位置，diff 比较两份快照
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._ids = itertools.count(1)
+
+    def start(self, frames=1):
+        frames = min(max(int(frames), 1), MAX_FRAMES)
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        return True
+
+    def stop(self):
+        """停止跟踪并释放 tracemalloc 自身占用的内存；已保存的快照保留"""
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        return True
+
+    def take_snapshot(self):
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        stats = snapshot.statistics('filename')
+        info = {
+            'id': next(self._ids),
+            'taken': time.time(),
+            'frames': snapshot.traceback_limit,
+            'size': sum(stat.size for stat in stats),
+            'count': sum(stat.count for stat in stats),
+        }
+        with self._lock:
+            self._snapshots[info['id']] = (snapshot, info)
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                del self._snapshots[min(self._snapshots)]
+        return info
+
+    def get(self, snapshot_id):
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        return entry[0] if entry else None
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            snapshots = [info for _, info in self._snapshots.values()]
+        return {
+            'tracing': tracemalloc.is_tracing(),
+            'frames': tracemalloc.get_traceback_limit(),
+            'traced_current': current,
+            'traced_peak': peak,
+            'tracemalloc_overhead': tracemalloc.get_tracemalloc_memory(),
+            'snapshots': snapshots,
+        }
+
+    def top(self, snapshot_id, key_type='lineno', limit=30):
+        snapshot = self.get(snapshot_id)
+        if snapshot is None:
+            return None
+        return [{
+            'size': stat.size,
+            'count': stat.count,
+            'frames': _format_traceback(stat.traceback, key_type),
+        } for stat in snapshot.statistics(key_type)[:limit]]
+
+    def diff(self, old_id, new_id, key_type='lineno', limit=30):
+        """按增长量从大到小列出 new 相对 old 的变化"""
+        old, new = self.get(old_id), self.get(new_id)
+        if old is None or new is None:
+            return None
+        return [{
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'count': stat.count,
+            'frames': _format_traceback(stat.traceback, key_type),
+        } for stat in new.compare_to(old, key_type)[:limit]]
+
+
+memory_profiler = MemoryProfiler()
+
+
+def cache_memory_usage():
+    """进程内所有登记的缓存的条目数与估算内存占用，按占用从大到小排序"""
+    result = []
+    for cache in all_caches():
+        stats = cache.stats()
+        result.append({
+            'name': stats['name'],
+            'entries': stats['entries'],
+            'max_entries': stats['max_entries'],
+            'bytes': cache.memory_usage(),
+        })
+    result.sort(key=lambda item: item['bytes'], reverse=True)
+    return result
+
+
+def process_memory():
+    """当前进程的常驻内存（RSS）字节数，无法获取时返回 None"""
+    try:
+        with open(f'/proc/{os.getpid()}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # 取不到当前值时退而返回峰值：macOS 单位为字节，其他系统为 KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,307 @@
+# metrics.py
+import atexit
+import bisect
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+
+from flask import g, request
+
+from file_cache import all_caches, get_cache_dir
+from streaming import install_response_close, on_response_close
+
+
+# 请求耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 多进程模式下每个工作进程写出自身统计的间隔（秒）
+SNAPSHOT_INTERVAL = 5.0
+# 超过这么久没有更新的快照属于已退出（被杀死、没能执行 atexit）的工作进程，汇总时忽略并删除
+STALE_SNAPSHOT_AGE = 3 * SNAPSHOT_INTERVAL
+# 没有匹配到路由的请求（404 等）使用的端点名
+UNMATCHED_ENDPOINT = 'none'
+
+
+class _Shard:
+    """单个线程的统计分片，只由所属线程写入，因此不需要加锁"""
+
+    __slots__ = ('thread', 'requests', 'latency', 'bytes', 'started', 'finished')
+
+    def __init__(self, thread):
+        self.thread = thread
+        # (端点, 方法, 状态码) -> 请求数
+        self.requests = {}
+        # 端点 -> [各桶计数..., 超出最后一个桶的计数, 耗时总和]
+        self.latency = {}
+        # 端点 -> 响应字节数
+        self.bytes = {}
+        # 端点 -> 开始/结束的请求数，差值即正在处理的请求数
+        self.started = {}
+        self.finished = {}
+
+    def merge_into(self, target):
+        for attr in ('requests', 'bytes', 'started', 'finished'):
+            dest = getattr(target, attr)
+            for key, value in getattr(self, attr).copy().items():
+                dest[key] = dest.get(key, 0) + value
+        for endpoint, values in self.latency.copy().items():
+            _add_histogram(target.latency, endpoint, values)
+
+
+def _add_histogram(histograms, key, values):
+    current = histograms.get(key)
+    if current is None:
+        histograms[key] = list(values)
+    else:
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+class MetricsRegistry:
+    """
+    进程内的请求统计：
+    每个线程写自己的分片（线程局部变量），记录时不加锁；读取时合并所有分片
+    线程退出后其分片并入 retired，避免开发服务器每个请求一个线程时分片无限增长
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+        self._group_dir = None
+        self._snapshot_thread = None
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                alive = []
+                for old in self._shards:
+                    if old.thread.is_alive():
+                        alive.append(old)
+                    else:
+                        old.merge_into(self._retired)
+                alive.append(shard)
+                self._shards = alive
+            self._local.shard = shard
+            if self._group_dir is not None and self._snapshot_thread is None:
+                self._start_snapshot_thread()
+        return shard
+
+    def request_started(self, endpoint):
+        started = self._shard().started
+        started[endpoint] = started.get(endpoint, 0) + 1
+
+    def request_finished(self, endpoint):
+        finished = self._shard().finished
+        finished[endpoint] = finished.get(endpoint, 0) + 1
+
+    def observe_response(self, endpoint, method, status, seconds, size):
+        shard = self._shard()
+        key = (endpoint, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        histogram = shard.latency.get(endpoint)
+        if histogram is None:
+            histogram = shard.latency[endpoint] = [0] * (len(LATENCY_BUCKETS) + 2)
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+        if size:
+            shard.bytes[endpoint] = shard.bytes.get(endpoint, 0) + size
+
+    def snapshot(self):
+        """合并本进程所有分片，返回可 JSON 序列化的统计"""
+        total = _Shard(None)
+        with self._lock:
+            shards = [self._retired] + self._shards
+            for shard in shards:
+                shard.merge_into(total)
+        caches = {}
+        for cache in all_caches():
+            stats = cache.stats()
+            caches[stats['name']] = [stats['hits'], stats['misses'], stats['entries']]
+        return {
+            'requests': [list(key) + [count] for key, count in total.requests.items()],
+            'latency': total.latency,
+            'bytes': total.bytes,
+            'in_flight': {endpoint: count - total.finished.get(endpoint, 0)
+                          for endpoint, count in total.started.items()},
+            'caches': caches,
+        }
+
+    # ---------- 多进程汇总 ----------
+
+    def enable_process_group(self, group_pid):
+        """
+        多进程模式：在 fork 工作进程之前调用，各工作进程定期把自身统计写到 cache/metrics/<主进程 pid>/，
+        /metrics 由任一工作进程响应时汇总同组全部进程的文件
+        """
+        base_dir = os.path.join(get_cache_dir(), 'metrics')
+        # 清理以前运行留下的目录
+        for path in glob.glob(os.path.join(base_dir, '*')):
+            if os.path.basename(path) != str(group_pid):
+                shutil.rmtree(path, ignore_errors=True)
+        self._group_dir = os.path.join(base_dir, str(group_pid))
+        os.makedirs(self._group_dir, exist_ok=True)
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self._group_dir, f'{pid}.json')
+
+    def _start_snapshot_thread(self):
+        with self._lock:
+            if self._snapshot_thread is not None:
+                return
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name='metrics-snapshot', daemon=True)
+            self._snapshot_thread.start()
+        atexit.register(self._remove_snapshot)
+
+    def _snapshot_loop(self):
+        while True:
+            self.write_snapshot()
+            time.sleep(SNAPSHOT_INTERVAL)
+
+    def write_snapshot(self):
+        path = self._snapshot_path(os.getpid())
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[警告] 写入统计快照失败: {e}")
+
+    def _remove_snapshot(self):
+        try:
+            os.remove(self._snapshot_path(os.getpid()))
+        except OSError:
+            pass
+
+    def collect(self):
+        """返回 (进程数, 汇总统计)；单进程模式只有本进程"""
+        snapshots = [self.snapshot()]
+        if self._group_dir is not None:
+            own = self._snapshot_path(os.getpid())
+            for path in glob.glob(os.path.join(self._group_dir, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_SNAPSHOT_AGE:
+                        os.remove(path)
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        merged = {'requests': {}, 'latency': {}, 'bytes': {}, 'in_flight': {}, 'caches': {}}
+        for snapshot in snapshots:
+            for *key, count in snapshot['requests']:
+                key = tuple(key)
+                merged['requests'][key] = merged['requests'].get(key, 0) + count
+            for endpoint, values in snapshot['latency'].items():
+                _add_histogram(merged['latency'], endpoint, values)
+            for field in ('bytes', 'in_flight'):
+                for endpoint, value in snapshot[field].items():
+                    merged[field][endpoint] = merged[field].get(endpoint, 0) + value
+            for name, values in snapshot['caches'].items():
+                _add_histogram(merged['caches'], name, values)
+        return len(snapshots), merged
+
+
+metrics = MetricsRegistry()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """以 Prometheus 文本格式输出汇总后的统计"""
+    processes, data = metrics.collect()
+    lines = []
+
+    def metric(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    metric('yobboy_worker_processes', 'gauge', 'Number of worker processes included in these metrics')
+    lines.append(f'yobboy_worker_processes {processes}')
+
+    metric('yobboy_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+    for (endpoint, method, status), count in sorted(data['requests'].items()):
+        lines.append(f'yobboy_http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                     f'status="{status}"}} {count}')
+
+    metric('yobboy_http_request_duration_seconds', 'histogram',
+           'Time from request start until the response body has been sent '
+           '(until hand-off for large files sent asynchronously)')
+    for endpoint, values in sorted(data['latency'].items()):
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, values):
+            cumulative += count
+            lines.append(f'yobboy_http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+        cumulative += values[len(LATENCY_BUCKETS)]
+        lines.append(f'yobboy_http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {cumulative}')
+        lines.append(f'yobboy_http_request_duration_seconds_sum{{endpoint="{label}"}} {values[-1]:.6f}')
+        lines.append(f'yobboy_http_request_duration_seconds_count{{endpoint="{label}"}} {cumulative}')
+
+    metric('yobboy_http_requests_in_flight', 'gauge', 'Requests whose response body has not been fully sent yet')
+    for endpoint, count in sorted(data['in_flight'].items()):
+        lines.append(f'yobboy_http_requests_in_flight{{endpoint="{_label(endpoint)}"}} {count}')
+
+    metric('yobboy_http_response_bytes_total', 'counter', 'Response body bytes sent by endpoint (Content-Length for async hand-off)')
+    for endpoint, size in sorted(data['bytes'].items()):
+        lines.append(f'yobboy_http_response_bytes_total{{endpoint="{_label(endpoint)}"}} {size}')
+
+    caches = sorted(data['caches'].items())
+    metric('yobboy_cache_hits_total', 'counter', 'In-memory file cache hits')
+    lines.extend(f'yobboy_cache_hits_total{{cache="{_label(name)}"}} {hits}' for name, (hits, _, _) in caches)
+    metric('yobboy_cache_misses_total', 'counter', 'In-memory file cache misses')
+    lines.extend(f'yobboy_cache_misses_total{{cache="{_label(name)}"}} {misses}' for name, (_, misses, _) in caches)
+    metric('yobboy_cache_hit_ratio', 'gauge', 'Cache hit ratio since start')
+    for name, (hits, misses, _) in caches:
+        ratio = hits / (hits + misses) if hits + misses else 0.0
+        lines.append(f'yobboy_cache_hit_ratio{{cache="{_label(name)}"}} {ratio:.4f}')
+    metric('yobboy_cache_entries', 'gauge', 'Entries currently held in memory')
+    lines.extend(f'yobboy_cache_entries{{cache="{_label(name)}"}} {entries}' for name, (_, _, entries) in caches)
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """
+    注册请求钩子：开始时计入正在处理；响应体发送完（或交给事件循环异步发送）时
+    记录状态码、耗时和实际发送的字节数，并计为完成
+    """
+    install_response_close(app)
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        g.metrics_started = time.perf_counter()
+        metrics.request_started(g.metrics_endpoint)
+
+    @app.after_request
+    def record_metrics(response):
+        endpoint = g.get('metrics_endpoint')
+        if endpoint is None:
+            return response
+        method, status, started = request.method, response.status_code, g.metrics_started
+
+        def finish(sent, async_sent):
+            metrics.observe_response(endpoint, method, status, time.perf_counter() - started, sent)
+            metrics.request_finished(endpoint)
+
+        # teardown_request 在响应体发送之前就会执行，流式响应要等响应体关闭时才算完成
+        on_response_close(finish)
+        g.metrics_pending_close = True
+        return response
+
+    @app.teardown_request
+    def finish_metrics(exc):
+        # 没有走到 after_request（异常直接抛出）的请求在这里计为完成
+        endpoint = g.get('metrics_endpoint')
+        if endpoint is not None and not g.get('metrics_pending_close'):
+            metrics.request_finished(endpoint)
@@ -0,0 +1,214 @@
+# mp4_faststart.py
+import os
+import struct
+
+from file_cache import FileCache
+from streaming import iter_file_range
+
+
+# 支持重排的 ISO BMFF 文件扩展名
+FASTSTART_EXTENSIONS = ['.mp4', '.m4v', '.m4a', '.mov']
+# moov 超过该大小时不做重排（正常视频的 moov 只有几百 KB 到几 MB）
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+# 需要递归进入才能找到 stco/co64 的容器盒子
+_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+faststart_cache = FileCache('mp4_faststart', max_entries=32)
+
+
+def _read_box_header(data, pos, end):
+    """解析盒子头，返回 (类型, 头部长度, 盒子总长度)，数据不完整时返回 None"""
+    if pos + 8 > end:
+        return None
+    size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+    header_size = 8
+    if size == 1:
+        if pos + 16 > end:
+            return None
+        size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+        header_size = 16
+    elif size == 0:
+        size = end - pos
+    if size < header_size or pos + size > end:
+        return None
+    return box_type, header_size, size
+
+
+def read_top_level_boxes(full_path):
+    """
+    扫描文件顶层盒子，只读取每个盒子的头部，返回 [(类型, 偏移, 长度)]
+    文件结构损坏时返回 None
+    """
+    boxes = []
+    file_size = os.path.getsize(full_path)
+    with open(full_path, 'rb') as f:
+        pos = 0
+        while pos < file_size:
+            f.seek(pos)
+            header = f.read(16)
+            if len(header) < 8:
+                return None
+            size, box_type = struct.unpack('>I4s', header[:8])
+            header_size = 8
+            if size == 1:
+                if len(header) < 16:
+                    return None
+                size = struct.unpack('>Q', header[8:16])[0]
+                header_size = 16
+            elif size == 0:
+                # 长度为 0 表示延伸到文件末尾
+                size = file_size - pos
+            if size < header_size or pos + size > file_size:
+                return None
+            boxes.append((box_type, pos, size))
+            pos += size
+    return boxes
+
+
+def _box_header_bytes(box_type, payload_size):
+    """生成盒子头，超过 32 位时使用 64 位长度"""
+    size = payload_size + 8
+    if size > 0xFFFFFFFF:
+        return struct.pack('>I4sQ', 1, box_type, payload_size + 16)
+    return struct.pack('>I4s', size, box_type)
+
+
+def _patch_moov(data, start, end, shift_offset, use_co64):
+    """
+    递归重建 moov 内的盒子，调整 stco/co64 中的块偏移
+    shift_offset(old) 返回新偏移，偏移无法映射（如指向原 moov 内部）时抛出 ValueError；
+    use_co64 为 True 时把 stco 升级为 co64（偏移超过 4GB 时需要）
+    """
+    out = []
+    pos = start
+    while pos < end:
+        parsed = _read_box_header(data, pos, end)
+        if parsed is None:
+            raise ValueError('moov 结构损坏')
+        box_type, header_size, size = parsed
+        body_start = pos + header_size
+        body_end = pos + size
+        if box_type in _CONTAINER_BOXES:
+            payload = _patch_moov(data, body_start, body_end, shift_offset, use_co64)
+            out.append(_box_header_bytes(box_type, len(payload)) + payload)
+        elif box_type in (b'stco', b'co64'):
+            version_flags, count = struct.unpack('>4sI', data[body_start:body_start + 8])
+            width = 4 if box_type == b'stco' else 8
+            fmt = '>%d%s' % (count, 'I' if width == 4 else 'Q')
+            offsets = struct.unpack(fmt, data[body_start + 8:body_start + 8 + count * width])
+            new_offsets = [shift_offset(o) for o in offsets]
+            if box_type == b'stco' and not use_co64:
+                if new_offsets and max(new_offsets) > 0xFFFFFFFF:
+                    raise OverflowError('块偏移超过 32 位')
+                payload = version_flags + struct.pack('>I%dI' % count, count, *new_offsets)
+                out.append(_box_header_bytes(b'stco', len(payload)) + payload)
+            else:
+                payload = version_flags + struct.pack('>I%dQ' % count, count, *new_offsets)
+                out.append(_box_header_bytes(b'co64', len(payload)) + payload)
+        else:
+            out.append(data[pos:body_end])
+        pos = body_end
+    return b''.join(out)
+
+
+def build_faststart_layout(full_path):
+    """
+    计算 faststart 虚拟布局：moov 移到第一个 mdat 之前，块偏移随之平移
+    返回 {'size': 总长度, 'segments': [(虚拟起点, 长度, 原文件偏移或 None, 内存数据)]}
+    已经是 faststart、没有 moov 或结构不支持时返回 False（同样会被缓存）
+    """
+    boxes = read_top_level_boxes(full_path)
+    if not boxes:
+        return False
+    moov = next((b for b in boxes if b[0] == b'moov'), None)
+    first_mdat = next((b for b in boxes if b[0] == b'mdat'), None)
+    if moov is None or first_mdat is None or moov[1] < first_mdat[1]:
+        return False
+    _, moov_offset, moov_size = moov
+    if moov_size > MAX_MOOV_SIZE:
+        return False
+
+    with open(full_path, 'rb') as f:
+        f.seek(moov_offset)
+        moov_data = f.read(moov_size)
+    parsed = _read_box_header(moov_data, 0, len(moov_data))
+    if parsed is None:
+        return False
+    _, header_size, _ = parsed
+    if moov_data[header_size + 4:header_size + 8] == b'cmov':
+        # 压缩的 moov 无法直接改写偏移
+        return False
+
+    insert_at = first_mdat[1]
+    moov_end = moov_offset + moov_size
+
+    def build(use_co64):
+        # 先按原大小估算，新 moov 大小确定后再重算一次偏移
+        new_size = moov_size
+        for _ in range(3):
+            def shift_offset(old, delta=new_size):
+                # 插入点到原 moov 之间的数据整体后移新 moov 的长度；
+                # 原 moov 之后的数据移动新旧 moov 的长度差（升级为 co64 时不为 0）；插入点之前不变
+                if insert_at <= old < moov_offset:
+                    return old + delta
+                if old >= moov_end:
+                    return old + delta - moov_size
+                if old >= moov_offset:
+                    raise ValueError('块偏移指向 moov 内部')
+                return old
+            payload = _patch_moov(moov_data, header_size, len(moov_data), shift_offset, use_co64)
+            new_moov = _box_header_bytes(b'moov', len(payload)) + payload
+            if len(new_moov) == new_size:
+                return new_moov
+            new_size = len(new_moov)
+        raise ValueError('moov 大小无法收敛')
+
+    try:
+        try:
+            new_moov = build(False)
+        except OverflowError:
+            new_moov = build(True)
+    except (ValueError, struct.error):
+        return False
+
+    # 虚拟文件: [插入点之前的数据][新 moov][插入点到原 moov 之间的数据][原 moov 之后的数据]
+    file_size = os.path.getsize(full_path)
+    pieces = [
+        (0, insert_at, None),
+        (None, len(new_moov), new_moov),
+        (insert_at, moov_offset - insert_at, None),
+        (moov_end, file_size - moov_end, None),
+    ]
+    segments = []
+    virtual_pos = 0
+    for source_offset, length, data in pieces:
+        if length > 0:
+            segments.append((virtual_pos, length, source_offset, data))
+            virtual_pos += length
+    return {'size': virtual_pos, 'segments': segments}
+
+
+def get_faststart_layout(full_path):
+    """获取（并按 inode/大小/mtime 缓存）faststart 布局，不需要重排时返回 None"""
+    try:
+        layout = faststart_cache.get_or_compute(full_path, lambda: build_faststart_layout(full_path))
+    except OSError:
+        return None
+    return layout or None
+
+
+def make_range_reader(full_path, layout):
+    """生成 send_virtual_file 使用的 read_range，把虚拟区间映射到 moov 数据或原文件区间"""
+    def read_range(start, length):
+        end = start + length
+        for seg_start, seg_length, source_offset, data in layout['segments']:
+            seg_end = seg_start + seg_length
+            if seg_end <= start or seg_start >= end:
+                continue
+            lo = max(start, seg_start) - seg_start
+            hi = min(end, seg_end) - seg_start
+            if data is not None:
+                yield data[lo:hi]
+            else:
+                yield from iter_file_range(full_path, source_offset + lo, hi - lo)
+    return read_range
@@ -0,0 +1,218 @@
+# notebook_preview.py
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from html import escape
+
+from file_cache import FileCache, file_signature, get_cache_dir
+from tracing import traced
+
+
+NOTEBOOK_EXTENSIONS = ['.ipynb']
+# 单个文本输出在预览中最多显示的字符数
+MAX_TEXT_OUTPUT = 20000
+# 图片输出按优先级选择，外置为独立文件按需加载
+_IMAGE_MIMETYPES = [('image/png', '.png'), ('image/jpeg', '.jpg'), ('image/gif', '.gif'), ('image/svg+xml', '.svg')]
+# 终端颜色控制符（异常回溯中常见）
+_ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+
+notebook_render_cache = FileCache('notebook_render', max_entries=32)
+# 渲染中的临时输出目录名前缀
+_TMP_PREFIX = '.rendering-'
+
+
+def _join_source(value):
+    """notebook 中的文本字段可能是字符串或字符串列表"""
+    if isinstance(value, list):
+        return ''.join(value)
+    return value or ''
+
+
+def _output_dir(full_path):
+    """每个 notebook 一个输出目录：render.json 加上每个文件版本一个子目录的外置输出"""
+    key = hashlib.sha1(full_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_cache_dir(), 'notebook_outputs', key)
+
+
+class _OutputWriter:
+    """把输出写成 directory 中的独立文件，记录 {编号: (MIME 类型, 相对于输出目录的文件名)}"""
+
+    def __init__(self, directory, base_url, name_prefix=''):
+        self.directory = directory
+        self.base_url = base_url
+        self.name_prefix = name_prefix
+        self.outputs = {}
+
+    def add(self, data, mimetype, ext):
+        output_id = str(len(self.outputs))
+        filename = output_id + ext
+        with open(os.path.join(self.directory, filename), 'wb') as f:
+            f.write(data)
+        self.outputs[output_id] = (mimetype, self.name_prefix + filename)
+        return f'{self.base_url}?id={output_id}'
+
+
+def _render_text_output(text):
+    text = _ANSI_ESCAPE.sub('', text)
+    note = ''
+    if len(text) > MAX_TEXT_OUTPUT:
+        note = f'<div class="text-muted small">输出过长，仅显示前 {MAX_TEXT_OUTPUT} 个字符</div>'
+        text = text[:MAX_TEXT_OUTPUT]
+    return f'<pre class="notebook-output-text">{escape(text)}</pre>{note}'
+
+
+def _render_output(output, writer):
+    output_type = output.get('output_type')
+    if output_type == 'stream':
+        return _render_text_output(_join_source(output.get('text')))
+    if output_type == 'error':
+        return _render_text_output('\n'.join(output.get('traceback') or [])
+                                   or f"{output.get('ename')}: {output.get('evalue')}")
+    data = output.get('data') or {}
+    for mimetype, ext in _IMAGE_MIMETYPES:
+        if mimetype in data:
+            value = _join_source(data[mimetype])
+            raw = value.encode('utf-8') if mimetype == 'image/svg+xml' else base64.b64decode(value)
+            url = writer.add(raw, mimetype, ext)
+            return f'<img class="notebook-output-image" loading="lazy" src="{url}" alt="output">'
+    if 'text/html' in data:
+        # HTML 输出（表格、交互图表等）放进沙箱 iframe 延迟加载，不在预览页中执行脚本
+        url = writer.add(_join_source(data['text/html']).encode('utf-8'), 'text/html', '.html')
+        return f'<iframe class="notebook-output-html" sandbox loading="lazy" src="{url}"></iframe>'
+    if 'text/markdown' in data:
+        return _render_text_output(_join_source(data['text/markdown']))
+    if 'text/plain' in data:
+        return _render_text_output(_join_source(data['text/plain']))
+    return ''
+
+
+def _render_cells(notebook, markdown_parser, writer, formatter):
+    from pygments import highlight
+    from pygments.lexers import get_lexer_by_name, TextLexer
+    from pygments.util import ClassNotFound
+
+    metadata = notebook.get('metadata') or {}
+    language = ((metadata.get('language_info') or {}).get('name')
+                or (metadata.get('kernelspec') or {}).get('language') or 'python')
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        lexer = TextLexer()
+
+    parts = []
+    for cell in notebook.get('cells') or []:
+        cell_type = cell.get('cell_type')
+        source = _join_source(cell.get('source'))
+        if cell_type == 'markdown':
+            # 单元格附件（attachment:xxx.png）同样外置
+            for name, bundle in (cell.get('attachments') or {}).items():
+                for mimetype, ext in _IMAGE_MIMETYPES:
+                    if mimetype in bundle:
+                        value = _join_source(bundle[mimetype])
+                        raw = value.encode('utf-8') if mimetype == 'image/svg+xml' else base64.b64decode(value)
+                        source = source.replace(f'attachment:{name}', writer.add(raw, mimetype, ext))
+                        break
+            parts.append(f'<div class="notebook-cell notebook-markdown markdown-body">{markdown_parser.render(source)}</div>')
+        elif cell_type == 'code':
+            count = cell.get('execution_count')
+            prompt = f'In [{count if count is not None else " "}]:'
+            outputs = ''.join(_render_output(output, writer) for output in cell.get('outputs') or [])
+            parts.append(
+                '<div class="notebook-cell notebook-code">'
+                f'<div class="notebook-prompt">{prompt}</div>'
+                f'{highlight(source, lexer, formatter)}'
+                f'<div class="notebook-outputs">{outputs}</div>'
+                '</div>')
+        else:
+            parts.append(f'<div class="notebook-cell notebook-raw"><pre>{escape(source)}</pre></div>')
+    return ''.join(parts)
+
+
+def _build_render(full_path, markdown_parser, base_url):
+    """
+    解析 notebook 并写出外置输出，返回渲染结果（同时写入磁盘，重启后可复用）
+    输出先写到临时目录，完成后改名为该文件版本的子目录，render.json 也是写完后替换；
+    其他线程或进程同时渲染、读取同一个 notebook 时不会看到写了一半或被删除的目录
+    """
+    directory = _output_dir(full_path)
+    os.makedirs(directory, exist_ok=True)
+    signature = list(file_signature(full_path))
+    version = hashlib.sha1(json.dumps(signature).encode('utf-8')).hexdigest()[:16]
+
+    with open(full_path, 'r', encoding='utf-8') as f:
+        notebook = json.load(f)
+    # Pygments 较重，第一次渲染 notebook 时才导入
+    from pygments.formatters import HtmlFormatter
+
+    formatter = HtmlFormatter(cssclass='highlight')
+    tmp_dir = tempfile.mkdtemp(prefix=_TMP_PREFIX, dir=directory)
+    try:
+        writer = _OutputWriter(tmp_dir, base_url, version + '/')
+        html_content = (f'<style>{formatter.get_style_defs(".notebook-preview .highlight")}</style>'
+                        f'<div class="notebook-preview">{_render_cells(notebook, markdown_parser, writer, formatter)}</div>')
+        try:
+            os.rename(tmp_dir, os.path.join(directory, version))
+        except OSError:
+            # 同一版本已由其他线程或进程渲染完成，内容相同
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    render = {
+        'signature': signature,
+        'html': html_content,
+        'outputs': writer.outputs
+    }
+    manifest = os.path.join(directory, 'render.json')
+    tmp_manifest = f'{manifest}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(render, f, ensure_ascii=False)
+    os.replace(tmp_manifest, manifest)
+
+    # 删除旧版本的输出（正在发送的文件已经打开，不受影响）
+    for name in os.listdir(directory):
+        if name not in (version, 'render.json') and not name.startswith(_TMP_PREFIX) and not name.endswith('.tmp'):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    return render
+
+
+@traced('preview.notebook')
+def get_notebook_render(full_path, markdown_parser, base_url):
+    """
+    获取 notebook 渲染结果，按 inode/大小/mtime 缓存：
+    先查内存，再查磁盘上的 render.json，都失效时才重新解析
+    """
+    def compute():
+        manifest = os.path.join(_output_dir(full_path), 'render.json')
+        try:
+            with open(manifest, 'r', encoding='utf-8') as f:
+                render = json.load(f)
+            if tuple(render['signature']) == file_signature(full_path):
+                return render
+        except (OSError, ValueError, KeyError):
+            pass
+        return _build_render(full_path, markdown_parser, base_url)
+    return notebook_render_cache.get_or_compute(full_path, compute)
+
+
+def get_notebook_output(full_path, markdown_parser, base_url, output_id):
+    """返回外置输出的 (文件路径, MIME 类型)，不存在时返回 (None, None)"""
+    render = get_notebook_render(full_path, markdown_parser, base_url)
+    entry = render['outputs'].get(output_id)
+    if entry is None:
+        return None, None
+    mimetype, filename = entry
+    return os.path.join(_output_dir(full_path), filename), mimetype
@@ -0,0 +1,498 @@
+# office_preview.py
+import re
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from html import escape
+
+from file_cache import FileCache
+from preview_utils import page_link
+from tracing import traced
+
+
+# 每页显示的表格行数 / 文档段落数
+SHEET_PAGE_ROWS = 100
+DOCUMENT_PAGE_PARAGRAPHS = 300
+# 提取全文用于搜索索引时的字符上限，防止超大工作簿撑爆内存
+MAX_INDEX_TEXT_CHARS = 2 * 1024 * 1024
+# 提取全文时每攒够这么多行解析一次共享字符串，只保留这些行用到的条目
+SHARED_STRING_BATCH_ROWS = 10000
+# 扫描工作表 XML 时每次读取的字节数；<row> 开始标签的长度上限（用于处理跨块的标签）
+XML_CHUNK_SIZE = 64 * 1024
+MAX_ROW_TAG_BYTES = 4096
+
+_ROOT_TAG = re.compile(rb'<(?![?!])([\w.:-]+)[^>]*>')
+_ROW_TAG = re.compile(rb'<(?:[\w.-]+:)?row(?=[\s/>])([^>]*)>')
+_ROW_REF = re.compile(rb'''\sr=["'](\d+)["']''')
+_SHEET_DATA_END = re.compile(rb'</(?:[\w.-]+:)?sheetData\s*>')
+
+office_cache = FileCache('office_preview', max_entries=256)
+
+
+def _local_name(tag):
+    """去掉 XML 命名空间，兼容 Transitional 与 Strict 两种 OOXML"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _iter_elements(zf, member, names):
+    """
+    以 iterparse 流式读取压缩包中的 XML，只在指定元素结束时产出
+    调用方处理完毕后清空该元素并从父节点移除，保证超大文件的内存占用有界
+    """
+    with zf.open(member) as stream:
+        yield from _iter_source_elements(stream, names)
+
+
+def _iter_source_elements(source, names):
+    """_iter_elements 的解析部分，source 为任意带 read() 的字节流"""
+    stack = []
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if _local_name(elem.tag) in names:
+            yield elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def _collect_text(elem, text_tag='t'):
+    """拼接元素下所有文本节点"""
+    parts = []
+    for node in elem.iter():
+        name = _local_name(node.tag)
+        if name == text_tag and node.text:
+            parts.append(node.text)
+        elif name == 'tab':
+            parts.append('\t')
+        elif name in ('br', 'cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def _read_relationships(zf, rels_member):
+    """读取 .rels 文件，返回 {rId: 目标路径}"""
+    base_dir = posixpath.dirname(posixpath.dirname(rels_member))
+    targets = {}
+    if rels_member not in zf.namelist():
+        return targets
+    for rel in _iter_elements(zf, rels_member, ('Relationship',)):
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            target = target.lstrip('/')
+        else:
+            target = posixpath.normpath(posixpath.join(base_dir, target))
+        targets[rel.get('Id')] = target
+    return targets
+
+
+def _relationship_id(elem):
+    """读取元素上的 r:id 属性（命名空间随版本不同，需与无前缀的 id 属性区分）"""
+    for attr, value in elem.attrib.items():
+        if attr.startswith('{') and _local_name(attr) == 'id':
+            return value
+    return None
+
+
+# =============================
+# Word 文档
+# =============================
+
+def extract_docx_paragraphs(full_path):
+    """提取 .docx 的全部段落文本"""
+    def compute():
+        paragraphs = []
+        with zipfile.ZipFile(full_path) as zf:
+            for p in _iter_elements(zf, 'word/document.xml', ('p',)):
+                paragraphs.append(_collect_text(p))
+        return paragraphs
+    return office_cache.get_or_compute(full_path, compute, key='docx')
+
+
+# =============================
+# Excel 工作簿
+# =============================
+
+def _column_index(cell_ref):
+    """将单元格引用中的列字母转换为从0开始的列号，如 'C5' -> 2"""
+    index = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - ord('A') + 1)
+    return index - 1
+
+
+class _SharedIndex(int):
+    """单元格中尚未解析的共享字符串序号，整页/整批读完后再统一换成文本"""
+
+
+def _xlsx_shared_strings(zf, indexes):
+    """
+    流式读取共享字符串表，只保留 indexes 中的条目，读到其中最大的序号即停止
+    返回 {序号: 文本}，超大工作簿也不会把整张表读入内存
+    """
+    if not indexes or 'xl/sharedStrings.xml' not in zf.namelist():
+        return {}
+    last = max(indexes)
+    strings = {}
+    for index, si in enumerate(_iter_elements(zf, 'xl/sharedStrings.xml', ('si',))):
+        if index in indexes:
+            strings[index] = _collect_text(si)
+        if index >= last:
+            break
+    return strings
+
+
+def _resolve_shared_strings(zf, rows):
+    """把 [(行号, [单元格值...])] 中的共享字符串序号替换为文本"""
+    indexes = {value for _, values in rows for value in values if isinstance(value, _SharedIndex)}
+    strings = _xlsx_shared_strings(zf, indexes)
+    return [(row_index, [strings.get(value, '') if isinstance(value, _SharedIndex) else value
+                         for value in values])
+            for row_index, values in rows]
+
+
+def list_xlsx_sheets(full_path):
+    """返回工作表列表 [{'name':..., 'member':..., 'dimension':...}]"""
+    def compute():
+        with zipfile.ZipFile(full_path) as zf:
+            targets = _read_relationships(zf, 'xl/_rels/workbook.xml.rels')
+            sheets = []
+            for sheet in _iter_elements(zf, 'xl/workbook.xml', ('sheet',)):
+                member = targets.get(_relationship_id(sheet))
+                if member and member in zf.namelist():
+                    sheets.append({'name': sheet.get('name', ''), 'member': member})
+            for sheet in sheets:
+                sheet['dimension'] = _xlsx_dimension(zf, sheet['member'])
+        return sheets
+    return office_cache.get_or_compute(full_path, compute, key='xlsx_sheets')
+
+
+def _xlsx_dimension(zf, member):
+    """读取工作表的 <dimension ref="A1:D100"/>，只解析到 sheetData 之前"""
+    with zf.open(member) as stream:
+        for _, elem in ET.iterparse(stream, events=('start',)):
+            name = _local_name(elem.tag)
+            if name == 'dimension':
+                return elem.get('ref', '')
+            if name == 'sheetData':
+                break
+    return ''
+
+
+def _cell_value(cell):
+    """单元格的显示值；共享字符串返回 _SharedIndex，由 _resolve_shared_strings 统一解析"""
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return _collect_text(cell)
+    value = None
+    for child in cell:
+        if _local_name(child.tag) == 'v':
+            value = child.text
+            break
+    if value is None:
+        return ''
+    if cell_type == 's':
+        try:
+            return _SharedIndex(value)
+        except ValueError:
+            return ''
+    if cell_type == 'b':
+        return 'TRUE' if value == '1' else 'FALSE'
+    return value
+
+
+def _xlsx_row_checkpoints(full_path, member, page_rows):
+    """
+    记录工作表每一页第一个 <row> 在解压后 XML 中的字节偏移，翻到第 N 页时直接从该处开始解析
+    只做文本扫描不构建元素，结果随文件缓存；返回 (根元素开始标签, 根元素名, [(偏移, 行号), ...])
+    没有 <row> 的页（稀疏工作表）沿用其后第一行的位置
+    """
+    def compute():
+        root = None
+        checkpoints = []
+        row_index = -1
+        with zipfile.ZipFile(full_path) as zf, zf.open(member) as stream:
+            base = 0
+            data = b''
+            while True:
+                chunk = stream.read(XML_CHUNK_SIZE)
+                data += chunk
+                if root is None:
+                    root = _ROOT_TAG.search(data)
+                consumed = 0
+                for match in _ROW_TAG.finditer(data):
+                    ref = _ROW_REF.search(match.group(1))
+                    row_index = int(ref.group(1)) - 1 if ref else row_index + 1
+                    while len(checkpoints) <= row_index // page_rows:
+                        checkpoints.append((base + match.start(), row_index))
+                    consumed = match.end()
+                if not chunk:
+                    break
+                # 末尾可能是被截断的 <row> 标签，留到下一块一起匹配
+                keep_from = max(consumed, len(data) - MAX_ROW_TAG_BYTES)
+                base += keep_from
+                data = data[keep_from:]
+        if root is None:
+            return b'', b'', []
+        return root.group(0), root.group(1), checkpoints
+    return office_cache.get_or_compute(full_path, compute, key=('xlsx_rows', member, page_rows))
+
+
+class _ChunkReader:
+    """把字节块生成器包装成 iterparse 可用的 read()"""
+
+    def __init__(self, chunks):
+        self._chunks = (chunk for chunk in chunks if chunk)
+
+    def read(self, size=-1):
+        return next(self._chunks, b'')
+
+
+def _iter_sheet_fragment(stream, offset, root_tag, root_name):
+    """从 offset 处的 <row> 读到 </sheetData> 为止，前后补上根元素标签，组成可独立解析的 XML"""
+    yield root_tag
+    stream.seek(offset)
+    carry = b''
+    while True:
+        chunk = stream.read(XML_CHUNK_SIZE)
+        data = carry + chunk
+        end = _SHEET_DATA_END.search(data)
+        if end is not None:
+            yield data[:end.start()]
+            break
+        if not chunk:
+            yield data
+            break
+        # 保留末尾一小段，防止结束标签跨块
+        yield data[:-64]
+        carry = data[-64:]
+    yield b'</' + root_name + b'>'
+
+
+def _iter_sheet_rows(zf, member, first_row=0, last_row=None, checkpoint=None):
+    """
+    流式产出 (行号, [单元格值...])，行号从0开始；超过 last_row 后立即停止解析
+    checkpoint 为 (根元素开始标签, 根元素名, 偏移, 行号) 时从该行开始解析，跳过之前的行
+    共享字符串以 _SharedIndex 返回，需再经 _resolve_shared_strings 解析
+    """
+    stream = zf.open(member)
+    if checkpoint is None:
+        source, row_index = stream, -1
+    else:
+        root_tag, root_name, offset, row_index = checkpoint
+        source = _ChunkReader(_iter_sheet_fragment(stream, offset, root_tag, root_name))
+        # 检查点所在行没有 r 属性时按顺序递增，所以从它的前一行算起
+        row_index -= 1
+    with stream:
+        for row in _iter_source_elements(source, ('row',)):
+            ref = row.get('r')
+            row_index = int(ref) - 1 if ref and ref.isdigit() else row_index + 1
+            if last_row is not None and row_index > last_row:
+                break
+            if row_index < first_row:
+                continue
+            values = []
+            for cell in row:
+                if _local_name(cell.tag) != 'c':
+                    continue
+                ref = cell.get('r')
+                col = _column_index(ref) if ref else len(values)
+                while len(values) < col:
+                    values.append('')
+                values.append(_cell_value(cell))
+            yield row_index, values
+
+
+def _iter_resolved_rows(zf, member):
+    """按批读取整张工作表，每批只解析这批行用到的共享字符串"""
+    batch = []
+    for row in _iter_sheet_rows(zf, member):
+        batch.append(row)
+        if len(batch) >= SHARED_STRING_BATCH_ROWS:
+            yield from _resolve_shared_strings(zf, batch)
+            batch = []
+    if batch:
+        yield from _resolve_shared_strings(zf, batch)
+
+
+def extract_xlsx_page(full_path, sheet_index=0, page=0, page_rows=SHEET_PAGE_ROWS):
+    """提取指定工作表的一页单元格，返回 (行列表, 是否还有下一页)"""
+    def compute():
+        sheets = list_xlsx_sheets(full_path)
+        if not 0 <= sheet_index < len(sheets):
+            return [], False
+        first_row = page * page_rows
+        last_row = first_row + page_rows  # 多读一行用于判断是否有下一页
+        member = sheets[sheet_index]['member']
+        checkpoint = None
+        if page > 0:
+            root_tag, root_name, checkpoints = _xlsx_row_checkpoints(full_path, member, page_rows)
+            if page >= len(checkpoints):
+                return [], False
+            checkpoint = (root_tag, root_name) + tuple(checkpoints[page])
+        with zipfile.ZipFile(full_path) as zf:
+            rows = list(_iter_sheet_rows(zf, member, first_row, last_row, checkpoint))
+            rows = _resolve_shared_strings(zf, rows)
+        has_more = bool(rows) and rows[-1][0] >= last_row
+        return [r for r in rows if r[0] < last_row], has_more
+    return office_cache.get_or_compute(full_path, compute, key=('xlsx', sheet_index, page, page_rows))
+
+
+# =============================
+# PowerPoint 演示文稿
+# =============================
+
+def extract_pptx_slides(full_path):
+    """提取每页幻灯片的标题与正文，返回 [{'title':..., 'paragraphs': [...]}]"""
+    def compute():
+        slides = []
+        with zipfile.ZipFile(full_path) as zf:
+            targets = _read_relationships(zf, 'ppt/_rels/presentation.xml.rels')
+            members = []
+            for sld in _iter_elements(zf, 'ppt/presentation.xml', ('sldId',)):
+                member = targets.get(_relationship_id(sld))
+                if member and member in zf.namelist():
+                    members.append(member)
+            for member in members:
+                title = ''
+                paragraphs = []
+                for shape in _iter_elements(zf, member, ('sp',)):
+                    is_title = any(_local_name(node.tag) == 'ph' and node.get('type') in ('title', 'ctrTitle')
+                                   for node in shape.iter())
+                    texts = [_collect_text(p) for p in shape.iter() if _local_name(p.tag) == 'p']
+                    texts = [t for t in texts if t.strip()]
+                    if is_title and not title:
+                        title = ' '.join(texts)
+                    else:
+                        paragraphs.extend(texts)
+                slides.append({'title': title, 'paragraphs': paragraphs})
+        return slides
+    return office_cache.get_or_compute(full_path, compute, key='pptx')
+
+
+# =============================
+# 搜索索引与 HTML 渲染
+# =============================
+
+def get_office_text(full_path):
+    """提取 Office 文件的纯文本，供搜索索引使用"""
+    ext = posixpath.splitext(full_path.lower())[1]
+
+    def compute():
+        if ext == '.docx':
+            text = '\n'.join(extract_docx_paragraphs(full_path))
+        elif ext == '.pptx':
+            text = '\n'.join('\n'.join([s['title']] + s['paragraphs']) for s in extract_pptx_slides(full_path))
+        elif ext == '.xlsx':
+            parts = []
+            size = 0
+            with zipfile.ZipFile(full_path) as zf:
+                for sheet in list_xlsx_sheets(full_path):
+                    for _, values in _iter_resolved_rows(zf, sheet['member']):
+                        line = '\t'.join(values)
+                        parts.append(line)
+                        size += len(line)
+                        if size > MAX_INDEX_TEXT_CHARS:
+                            break
+                    if size > MAX_INDEX_TEXT_CHARS:
+                        break
+            text = '\n'.join(parts)
+        else:
+            text = ''
+        return text[:MAX_INDEX_TEXT_CHARS]
+    return office_cache.get_or_compute(full_path, compute, key='text')
+
+
+@traced('preview.office')
+def render_office_preview(full_path, ext, params=None):
+    """渲染 Office 文件预览 HTML，params 可包含 sheet、page"""
+    params = params or {}
+    try:
+        page = max(int(params.get('page', 0)), 0)
+        sheet_index = max(int(params.get('sheet', 0)), 0)
+    except (TypeError, ValueError):
+        page, sheet_index = 0, 0
+
+    try:
+        if ext == '.docx':
+            return _render_docx(full_path, page)
+        elif ext == '.xlsx':
+            return _render_xlsx(full_path, sheet_index, page)
+        elif ext == '.pptx':
+            return _render_pptx(full_path)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        return f'<div class="office-preview-info">无法解析此 Office 文件: {escape(str(e))}</div>'
+    return '<div class="office-preview-info">不支持预览此类型的 Office 文件</div>'
+
+
+def _render_docx(full_path, page):
+    paragraphs = extract_docx_paragraphs(full_path)
+    start = page * DOCUMENT_PAGE_PARAGRAPHS
+    chunk = paragraphs[start:start + DOCUMENT_PAGE_PARAGRAPHS]
+    body = ''.join(f'<p>{escape(p)}</p>' if p.strip() else '<br>' for p in chunk)
+    nav = []
+    if page > 0:
+        nav.append(page_link('上一页', {'page': page - 1}))
+    if start + DOCUMENT_PAGE_PARAGRAPHS < len(paragraphs):
+        nav.append(page_link('下一页', {'page': page + 1}))
+    nav_html = f'<div class="d-flex gap-2 my-2">{"".join(nav)}</div>' if nav else ''
+    return f'<article class="markdown-body office-document">{body}</article>{nav_html}'
+
+
+def _render_xlsx(full_path, sheet_index, page):
+    sheets = list_xlsx_sheets(full_path)
+    if not sheets:
+        return '<div class="office-preview-info">工作簿中没有工作表</div>'
+    sheet_index = min(sheet_index, len(sheets) - 1)
+    rows, has_more = extract_xlsx_page(full_path, sheet_index, page)
+
+    tabs = ''.join(
+        f'<span class="btn btn-sm btn-primary">{escape(s["name"])}</span>' if i == sheet_index
+        else page_link(escape(s['name']), {'sheet': i, 'page': 0})
+        for i, s in enumerate(sheets)
+    )
+    width = max((len(values) for _, values in rows), default=0)
+    header = ''.join(f'<th>{escape(_column_name(i))}</th>' for i in range(width))
+    body = ''.join(
+        f'<tr><th>{row_index + 1}</th>' + ''.join(f'<td>{escape(v)}</td>' for v in values)
+        + '<td></td>' * (width - len(values)) + '</tr>'
+        for row_index, values in rows
+    )
+    nav = []
+    if page > 0:
+        nav.append(page_link('上一页', {'sheet': sheet_index, 'page': page - 1}))
+    if has_more:
+        nav.append(page_link('下一页', {'sheet': sheet_index, 'page': page + 1}))
+    dimension = sheets[sheet_index].get('dimension')
+    info = f'<span class="text-muted ms-2">范围: {escape(dimension)}，第 {page + 1} 页</span>' if dimension else \
+        f'<span class="text-muted ms-2">第 {page + 1} 页</span>'
+    return (f'<div class="d-flex flex-wrap gap-2 mb-2">{tabs}</div>'
+            f'<div class="table-responsive"><table class="table table-sm table-bordered office-sheet">'
+            f'<thead><tr><th></th>{header}</tr></thead><tbody>{body}</tbody></table></div>'
+            f'<div class="d-flex gap-2 my-2 align-items-center">{"".join(nav)}{info}</div>')
+
+
+def _column_name(index):
+    """列号转列字母，如 0 -> 'A'，27 -> 'AB'"""
+    name = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(ord('A') + rem) + name
+    return name
+
+
+def _render_pptx(full_path):
+    slides = extract_pptx_slides(full_path)
+    if not slides:
+        return '<div class="office-preview-info">演示文稿中没有幻灯片</div>'
+    parts = []
+    for number, slide in enumerate(slides, 1):
+        title = escape(slide['title']) or f'幻灯片 {number}'
+        items = ''.join(f'<li>{escape(p)}</li>' for p in slide['paragraphs'])
+        parts.append(f'<section class="office-slide"><h4>{number}. {title}</h4><ul>{items}</ul></section><hr>')
+    return f'<article class="markdown-body">{"".join(parts)}</article>'
@@ -0,0 +1,279 @@
+# photo_timeline.py
+import os
+import sqlite3
+import threading
+import time
+from calendar import timegm
+from datetime import datetime
+
+from file_cache import get_cache_dir
+
+
+# 参与时间线的图片类型（EXIF 主要存在于 JPEG/TIFF/WebP 中，其余按修改时间归档）
+PHOTO_EXTENSIONS = ['.jpg', '.jpeg', '.tif', '.tiff', '.webp', '.png']
+# 两次全量扫描的最小间隔（秒），扫描只重新解析新增或修改过的文件
+RESCAN_INTERVAL = 300
+# 每处理多少个文件提交一次
+COMMIT_BATCH = 200
+# 时间线支持的分组方式（对应数据表中的列名）
+GROUP_COLUMNS = {'day': 'day', 'month': 'month'}
+
+# EXIF 标签
+_TAG_DATETIME = 306
+_TAG_MAKE = 271
+_TAG_MODEL = 272
+_TAG_EXIF_IFD = 0x8769
+_TAG_GPS_IFD = 0x8825
+_TAG_DATETIME_ORIGINAL = 36867
+_TAG_DATETIME_DIGITIZED = 36868
+
+
+def _parse_exif_datetime(value):
+    """解析 EXIF 时间 'YYYY:MM:DD HH:MM:SS'，无效值（如全 0）返回 None"""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('ascii', errors='ignore')
+    try:
+        return datetime.strptime(value.strip('\x00 ')[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def _dms_to_degrees(dms, ref):
+    """度分秒转换为十进制度数，南纬/西经为负"""
+    try:
+        degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if isinstance(ref, bytes):
+        ref = ref.decode('ascii', errors='ignore')
+    return -degrees if ref in ('S', 'W') else degrees
+
+
+def _clean_text(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='ignore')
+    return (value or '').strip('\x00 ').strip()
+
+
+def extract_photo_info(full_path, st):
+    """
+    读取图片的拍摄时间、相机与 GPS 信息
+    Pillow 打开文件时只解析头部（JPEG 的 EXIF 位于 APP1 段），不解码像素
+    没有 EXIF 拍摄时间时退回文件修改时间
+    """
+    from PIL import Image
+
+    info = {'width': None, 'height': None, 'camera': '', 'lat': None, 'lon': None}
+    taken = None
+    try:
+        with Image.open(full_path) as im:
+            info['width'], info['height'] = im.size
+            exif = im.getexif()
+        exif_ifd = exif.get_ifd(_TAG_EXIF_IFD)
+        taken = (_parse_exif_datetime(exif_ifd.get(_TAG_DATETIME_ORIGINAL))
+                 or _parse_exif_datetime(exif_ifd.get(_TAG_DATETIME_DIGITIZED))
+                 or _parse_exif_datetime(exif.get(_TAG_DATETIME)))
+        make = _clean_text(exif.get(_TAG_MAKE))
+        model = _clean_text(exif.get(_TAG_MODEL))
+        # 很多相机的型号里已经包含厂商名
+        info['camera'] = model if model.lower().startswith(make.lower()) else f'{make} {model}'.strip()
+        gps = exif.get_ifd(_TAG_GPS_IFD)
+        if 2 in gps and 4 in gps:
+            info['lat'] = _dms_to_degrees(gps[2], gps.get(1))
+            info['lon'] = _dms_to_degrees(gps[4], gps.get(3))
+    except Exception as e:
+        print(f"[警告] 读取图片EXIF失败 {full_path}: {e}")
+
+    info['time_source'] = 'exif' if taken else 'mtime'
+    if taken is None:
+        taken = datetime.fromtimestamp(st.st_mtime)
+    # 拍摄时间是相机本地时间，按"墙上时间"排序，不做时区换算
+    info['taken_at'] = taken.strftime('%Y-%m-%d %H:%M:%S')
+    info['taken_ts'] = timegm(taken.timetuple())
+    info['day'] = taken.strftime('%Y-%m-%d')
+    info['month'] = taken.strftime('%Y-%m')
+    return info
+
+
+class PhotoIndex:
+    """
+    照片索引（SQLite），按 (根目录, 相对路径) 保存拍摄时间等信息
+    按日/按月分组和分页查询都走索引，不需要再打开图片
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._init_lock:
+                if self.db_path is None:
+                    self.db_path = os.path.join(get_cache_dir(), 'photo_index.sqlite3')
+                conn = sqlite3.connect(self.db_path, timeout=10)
+                conn.row_factory = sqlite3.Row
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS photos (
+                        root TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        ino INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        taken_at TEXT NOT NULL,
+                        taken_ts INTEGER NOT NULL,
+                        day TEXT NOT NULL,
+                        month TEXT NOT NULL,
+                        time_source TEXT NOT NULL,
+                        camera TEXT,
+                        lat REAL,
+                        lon REAL,
+                        width INTEGER,
+                        height INTEGER,
+                        seen INTEGER NOT NULL,
+                        PRIMARY KEY (root, path)
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_photos_day ON photos (root, day, taken_ts, path);
+                    CREATE INDEX IF NOT EXISTS idx_photos_month ON photos (root, month, taken_ts, path);
+                """)
+            self._local.conn = conn
+        return conn
+
+    def signatures(self, root):
+        """返回 {相对路径: (inode, 大小, mtime)}，用于判断文件是否需要重新解析"""
+        rows = self._connection().execute(
+            'SELECT path, ino, size, mtime_ns FROM photos WHERE root = ?', (root,))
+        return {row['path']: (row['ino'], row['size'], row['mtime_ns']) for row in rows}
+
+    def write_batch(self, root, upserts, touched, generation):
+        """写入新解析的照片，并把未变化的照片标记为本轮已见"""
+        conn = self._connection()
+        with conn:
+            if upserts:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO photos VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(root, path, st.st_ino, st.st_size, st.st_mtime_ns, info['taken_at'], info['taken_ts'],
+                      info['day'], info['month'], info['time_source'], info['camera'], info['lat'], info['lon'],
+                      info['width'], info['height'], generation) for path, st, info in upserts])
+            if touched:
+                conn.executemany('UPDATE photos SET seen = ? WHERE root = ? AND path = ?',
+                                 [(generation, root, path) for path in touched])
+
+    def remove_unseen(self, root, generation):
+        """删除本轮扫描中没有出现的照片（已被删除或移动）"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM photos WHERE root = ? AND seen < ?', (root, generation))
+
+    def buckets(self, root, group, limit=50, cursor=None):
+        """按日/月分组，从新到旧分页，cursor 为上一页最后一个分组"""
+        column = GROUP_COLUMNS[group]
+        sql = f'SELECT {column} AS bucket, COUNT(*) AS count FROM photos WHERE root = ?'
+        params = [root]
+        if cursor:
+            sql += f' AND {column} < ?'
+            params.append(cursor)
+        sql += f' GROUP BY {column} ORDER BY {column} DESC LIMIT ?'
+        params.append(limit)
+        rows = [dict(row) for row in self._connection().execute(sql, params)]
+        next_cursor = rows[-1]['bucket'] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def photos(self, root, group, bucket, limit=100, cursor=None):
+        """
+        查询某个分组内的照片，按拍摄时间从新到旧
+        使用键集分页：cursor 为上一页最后一张照片的 '时间戳|路径'，翻到多深都只扫描一页
+        """
+        column = GROUP_COLUMNS[group]
+        sql = (f'SELECT path, taken_at, taken_ts, time_source, camera, lat, lon, width, height '
+               f'FROM photos WHERE root = ? AND {column} = ?')
+        params = [root, bucket]
+        if cursor:
+            ts, _, path = cursor.partition('|')
+            try:
+                ts = int(ts)
+            except ValueError:
+                ts = None
+            if ts is not None:
+                sql += ' AND (taken_ts < ? OR (taken_ts = ? AND path > ?))'
+                params.extend([ts, ts, path])
+        sql += ' ORDER BY taken_ts DESC, path ASC LIMIT ?'
+        params.append(limit)
+        rows = [dict(row) for row in self._connection().execute(sql, params)]
+        next_cursor = f"{rows[-1]['taken_ts']}|{rows[-1]['path']}" if len(rows) == limit else None
+        return rows, next_cursor
+
+
+class PhotoIndexer:
+    """后台扫描线程：遍历根目录，只解析新增或修改过的图片"""
+
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_scan = {}
+        self.status = {'running': False, 'root': None, 'scanned': 0, 'parsed': 0, 'finished_at': None}
+
+    def ensure_fresh(self, root_dir):
+        """距离上次扫描超过 RESCAN_INTERVAL 时在后台重新扫描"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if time.time() - self._last_scan.get(root_dir, 0) < RESCAN_INTERVAL:
+                return
+            self._last_scan[root_dir] = time.time()
+            self.status = {'running': True, 'root': root_dir, 'scanned': 0, 'parsed': 0, 'finished_at': None}
+            self._thread = threading.Thread(target=self._scan, args=(root_dir,), name='photo-indexer', daemon=True)
+            self._thread.start()
+
+    def _iter_photos(self, root_dir):
+        """非递归遍历目录树，产出 (相对路径, 完整路径, stat)"""
+        stack = [root_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif os.path.splitext(entry.name.lower())[1] in PHOTO_EXTENSIONS and entry.is_file():
+                                rel_path = os.path.relpath(entry.path, root_dir).replace(os.sep, '/')
+                                yield rel_path, entry.path, entry.stat()
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _scan(self, root_dir):
+        generation = int(time.time() * 1000)
+        try:
+            known = self.index.signatures(root_dir)
+            upserts, touched = [], []
+            for rel_path, full_path, st in self._iter_photos(root_dir):
+                self.status['scanned'] += 1
+                if known.get(rel_path) == (st.st_ino, st.st_size, st.st_mtime_ns):
+                    touched.append(rel_path)
+                else:
+                    upserts.append((rel_path, st, extract_photo_info(full_path, st)))
+                    self.status['parsed'] += 1
+                if len(upserts) + len(touched) >= COMMIT_BATCH:
+                    self.index.write_batch(root_dir, upserts, touched, generation)
+                    upserts, touched = [], []
+            self.index.write_batch(root_dir, upserts, touched, generation)
+            self.index.remove_unseen(root_dir, generation)
+        except Exception as e:
+            print(f"[警告] 照片索引扫描失败: {e}")
+        finally:
+            self.status['running'] = False
+            self.status['finished_at'] = time.time()
+
+
+photo_index = PhotoIndex()
+photo_indexer = PhotoIndexer(photo_index)
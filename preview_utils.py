@@ -0,0 +1,9 @@
+# preview_utils.py
+import json
+from html import escape
+
+
+def page_link(label, params):
+    """生成预览区内的翻页链接，前端点击后带上 params 重新请求 /get_preview_content"""
+    data = escape(json.dumps(params), quote=True)
+    return f'<a href="#" class="btn btn-sm btn-outline-primary preview-page-link" data-preview-params="{data}">{label}</a>'
@@ -0,0 +1,224 @@
+# profiler.py
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import current_app, g, jsonify, request, session
+
+from file_cache import get_cache_dir
+from streaming import install_response_close, on_response_close
+
+
+# 采样间隔与时长的默认值和上限（秒）
+DEFAULT_SAMPLE_INTERVAL = 0.01
+DEFAULT_SAMPLE_SECONDS = 10
+MAX_SAMPLE_SECONDS = 300
+# 保留的分析结果文件数，超出后删除最旧的
+MAX_PROFILES = 50
+# 触发单个请求 cProfile 的查询参数和请求头
+PROFILE_QUERY_ARG = '_profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_EXTENSIONS = ('.folded', '.prof')
+
+
+def get_profiles_dir():
+    profiles_dir = os.path.join(get_cache_dir(), 'profiles')
+    os.makedirs(profiles_dir, exist_ok=True)
+    return profiles_dir
+
+
+def profiling_allowed():
+    """性能分析只对已登录用户开放，并且需要在配置中打开 [server] profiling = 1"""
+    return 'logged_in' in session and bool(current_app.config.get('PROFILING_ENABLED'))
+
+
+def profiling_required(view):
+    """性能分析接口的装饰器：未登录返回 401，未启用性能分析返回 403"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        if not profiling_allowed():
+            return jsonify({'error': '未启用性能分析，请在配置文件 [server] 中设置 profiling = 1'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _new_profile_name(kind, suffix):
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:8]}{suffix}"
+
+
+def _prune_profiles(profiles_dir):
+    names = sorted(n for n in os.listdir(profiles_dir) if n.endswith(PROFILE_EXTENSIONS))
+    for name in names[:-MAX_PROFILES]:
+        try:
+            os.remove(os.path.join(profiles_dir, name))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    profiles_dir = get_profiles_dir()
+    result = []
+    for name in sorted(os.listdir(profiles_dir), reverse=True):
+        if not name.endswith(PROFILE_EXTENSIONS):
+            continue
+        st = os.stat(os.path.join(profiles_dir, name))
+        result.append({
+            'name': name,
+            'kind': 'sampler' if name.endswith('.folded') else 'request',
+            'size': st.st_size,
+            'created': st.st_mtime,
+        })
+    return result
+
+
+def profile_path(name):
+    """返回分析结果文件的完整路径，名称不合法或文件不存在时返回 None"""
+    if os.path.basename(name) != name or not name.endswith(PROFILE_EXTENSIONS):
+        return None
+    path = os.path.join(get_profiles_dir(), name)
+    return path if os.path.isfile(path) else None
+
+
+def format_cprofile(path, sort='cumulative', limit=60):
+    """把 .prof 文件转成 pstats 文本报告"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    return label.replace(';', ':')
+
+
+class StackSampler:
+    """
+    后台栈采样器：按固定间隔读取所有线程的调用栈（sys._current_frames），
+    按 “线程名;外层函数;...;内层函数 次数” 的折叠格式保存，可直接交给 flamegraph.pl / speedscope
+    被分析的线程不需要任何插桩，开销只在采样线程本身
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = None
+
+    def start(self, seconds=DEFAULT_SAMPLE_SECONDS, interval=DEFAULT_SAMPLE_INTERVAL):
+        """开始采样，已有采样在运行时返回 None"""
+        with self._lock:
+            if self.current is not None and self.current['status'] == 'running':
+                return None
+            run = {
+                'name': _new_profile_name('sampler', '.folded'),
+                'status': 'running',
+                'seconds': seconds,
+                'interval': interval,
+                'started': time.time(),
+                'samples': 0,
+                '_stop': threading.Event(),
+            }
+            self.current = run
+        threading.Thread(target=self._run, args=(run,), name='stack-sampler', daemon=True).start()
+        return run
+
+    def stop(self):
+        with self._lock:
+            if self.current is not None:
+                self.current['_stop'].set()
+
+    def status(self):
+        with self._lock:
+            if self.current is None:
+                return None
+            return {k: v for k, v in self.current.items() if not k.startswith('_')}
+
+    def _run(self, run):
+        own_id = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + run['seconds']
+        try:
+            while time.monotonic() < deadline and not run['_stop'].is_set():
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)).replace(';', ':'))
+                    stacks[';'.join(reversed(labels))] += 1
+                run['samples'] += 1
+                run['_stop'].wait(run['interval'])
+            profiles_dir = get_profiles_dir()
+            with open(os.path.join(profiles_dir, run['name']), 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            _prune_profiles(profiles_dir)
+            run['status'] = 'done'
+        except Exception as e:
+            run['status'] = 'failed'
+            run['error'] = str(e)
+            print(f"[警告] 栈采样失败: {e}")
+
+
+stack_sampler = StackSampler()
+
+
+def _save_request_profile(profile, name):
+    profile.disable()
+    profiles_dir = get_profiles_dir()
+    try:
+        profile.dump_stats(os.path.join(profiles_dir, name))
+        _prune_profiles(profiles_dir)
+    except OSError as e:
+        print(f"[警告] 保存请求性能分析失败: {e}")
+
+
+def init_app(app):
+    """注册请求钩子：带 ?_profile=1 或 X-Profile: 1 的请求用 cProfile 记录，响应头 X-Profile-Id 返回结果文件名"""
+    install_response_close(app)
+
+    def requested():
+        return request.args.get(PROFILE_QUERY_ARG) == '1' or request.headers.get(PROFILE_HEADER) == '1'
+
+    @app.before_request
+    def start_request_profile():
+        if not requested() or not profiling_allowed():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 同一时刻只能有一个 cProfile 在运行（Python 3.12+）
+            return
+        g.request_profile = profile
+        g.request_profile_name = _new_profile_name('request', '.prof')
+
+    @app.after_request
+    def add_profile_header(response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        name = g.request_profile_name
+        response.headers['X-Profile-Id'] = name
+        # teardown_request 在响应体发送之前就会执行，要等响应体发送完才停止，才能包含生成流式响应体的耗时
+        on_response_close(lambda sent, async_sent: _save_request_profile(profile, name))
+        return response
+
+    @app.teardown_request
+    def finish_request_profile(exc):
+        # 没有走到 after_request（异常直接抛出）时在这里停止
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            _save_request_profile(profile, g.request_profile_name)
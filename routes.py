@@ -1,24 +1,63 @@
 # routes.py
 import os
 import sys
+import stat
+import hmac
 import re
 import configparser
+import threading
+import functools
 # 确保在文件顶部添加必要的导入
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_from_directory, send_file, make_response, abort, current_app
-import markdown
-from markdown_it import MarkdownIt
-from mdit_py_plugins import tasklists, deflist, footnote
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_from_directory, send_file, make_response, abort, current_app, Response, stream_with_context
 from urllib.parse import quote # 导入 quote 用于编码文件名
+from html import escape
 import posixpath # 用于处理 URL 路径
+from office_preview import render_office_preview, get_office_text
+from archive_browser import (split_archive_path, list_archive_dir, open_member, read_member_head, is_archive_name,
+                             ARCHIVE_EXTENSIONS)
+from streaming import send_virtual_file
+from hex_viewer import render_hex_preview
+from file_types import detect_file_type, detect_file_types, read_text_file
+from mp4_faststart import FASTSTART_EXTENSIONS, get_faststart_layout, make_range_reader
+from media_metadata import MEDIA_METADATA_EXTENSIONS, get_cached_metadata, format_metadata, media_metadata_cache
+from photo_timeline import GROUP_COLUMNS, photo_index, photo_indexer
+from notebook_preview import NOTEBOOK_EXTENSIONS, get_notebook_render, get_notebook_output
+from sqlite_browser import render_sqlite_preview
+from text_diff import render_diff_page, iter_diff_text, diff_form
+from file_jobs import job_manager, validate_job, is_within_root
+from file_digest import (digest_service, digest_headers, strong_etag, FAST_ALGORITHM, LISTING_HASH_MAX,
+                         LISTING_HASH_BUDGET, INLINE_HASH_MAX)
+from duplicate_finder import duplicate_finder
+from block_delta import get_signature, file_version, parse_block_ranges, delta_length, iter_blocks, RECORD_SIZE
+from metrics import render_prometheus
+from profiler import (stack_sampler, profiling_required, list_profiles, profile_path, format_cprofile,
+                      DEFAULT_SAMPLE_SECONDS, DEFAULT_SAMPLE_INTERVAL, MAX_SAMPLE_SECONDS)
+from tracing import traced, span, trace_buffer, to_chrome_trace, to_otlp
+from memory_profile import memory_profiler, cache_memory_usage, process_memory, KEY_TYPES
 
 # 检查用户是否已登录的函数
 def is_logged_in():
     """检查用户是否已登录"""
     return 'logged_in' in session
 
+def single_process_only(view):
+    """
+    状态只保存在当前进程内存中的接口（后台任务、重复文件扫描、采样与内存分析、慢请求追踪）：
+    多进程模式下前后两次请求可能落到不同的进程，查询/取消会找不到对象，因此直接返回 409
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config.get('SERVER_WORKERS', 1) > 1:
+            return jsonify({'error': '该功能在多进程模式（workers > 1）下不可用，请使用单进程运行服务器'}), 409
+        return view(*args, **kwargs)
+    return wrapper
+
 # 创建markdown-it实例，支持多种扩展
 def create_markdown_parser():
     """创建配置好的markdown-it解析器"""
+    from markdown_it import MarkdownIt
+    from mdit_py_plugins import tasklists, deflist, footnote
+
     md = MarkdownIt("default", {"breaks": True, "html": True})
     
     # 启用内建规则以支持表格与删除线
@@ -31,10 +70,20 @@ def create_markdown_parser():
     
     return md
 
-# 全局markdown解析器实例
-markdown_parser = create_markdown_parser()
+# 全局markdown解析器实例，第一次预览 Markdown 时才导入 markdown-it 并创建
+_markdown_parser = None
+_markdown_parser_lock = threading.Lock()
+
+def get_markdown_parser():
+    global _markdown_parser
+    if _markdown_parser is None:
+        with _markdown_parser_lock:
+            if _markdown_parser is None:
+                _markdown_parser = create_markdown_parser()
+    return _markdown_parser
 
 # 处理图片路径的函数
+@traced('markdown.image_paths')
 def process_image_paths(content, current_file_path):
     """处理Markdown内容中的图片路径"""
     # 定义正则表达式匹配Markdown图片语法
@@ -71,6 +120,7 @@ def process_image_paths(content, current_file_path):
     return img_pattern.sub(replace_img_path, content)
 
 # 渲染Markdown内容
+@traced('markdown.render')
 def render_markdown_content(content, filepath):
     """使用markdown-it-py渲染Markdown内容"""
     try:
@@ -78,7 +128,7 @@ def render_markdown_content(content, filepath):
         processed_content = process_image_paths(content, filepath)
         
         # 使用markdown-it-py渲染
-        html_content = markdown_parser.render(processed_content)
+        html_content = get_markdown_parser().render(processed_content)
         
         return html_content
     except Exception as e:
@@ -91,6 +141,177 @@ MARKDOWN_EXTENSIONS = ['.md', '.markdown']
 PDF_EXTENSIONS = ['.pdf']
 VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.wmv']
 DRAWIO_EXTENSIONS = ['.drawio', '.diagram', '.dio', '.xml']  # 添加.xml作为draw.io格式
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.flac', '.ogg', '.wma', '.m4a']
+
+# 嗅探出的文件类别对应的扩展名列表，用于纠正扩展名与内容不符的文件
+KIND_EXTENSIONS = {
+    'image': IMAGE_EXTENSIONS,
+    'pdf': PDF_EXTENSIONS,
+    'video': VIDEO_EXTENSIONS,
+    'audio': AUDIO_EXTENSIONS,
+    'office': OFFICE_EXTENSIONS
+}
+
+# 压缩包成员文本预览的最大读取字节数
+ARCHIVE_TEXT_PREVIEW_BYTES = 512 * 1024
+
+def resolve_extension(ext, type_info):
+    """
+    根据文件头嗅探结果修正扩展名：
+    没有扩展名或扩展名不是程序认识的类型（如没有扩展名的 PDF、.bak 结尾的图片）时，
+    若内容类别与扩展名不符则使用嗅探出的标准扩展名；认识的扩展名总是按扩展名处理
+    """
+    if not type_info or ext in KNOWN_EXTENSIONS:
+        return ext
+    kind_exts = KIND_EXTENSIONS.get(type_info.get('kind'))
+    if kind_exts is not None and ext not in kind_exts and type_info.get('ext'):
+        return type_info['ext']
+    return ext
+
+@traced('listing.classify')
+def classify_entries(entries, path, type_infos, media_stats, media_infos, digests):
+    """
+    把目录扫描结果分成目录和文件两个列表，文件附带预览类别、媒体信息和摘要
+    entries 为 (entry, is_dir, stat) 列表，其余参数为批量查询各缓存得到的结果
+    """
+    directories = []
+    files = []
+    for entry, is_dir, st in entries:
+        item = entry.name
+        item_rel_path = posixpath.join(path, item)
+
+        if is_dir:
+            directories.append({
+                'name': item,
+                'path': item_rel_path,
+                'is_dir': True
+            })
+        else:
+            _, ext = os.path.splitext(item.lower())
+            type_info = type_infos.get(entry.path)
+            ext = resolve_extension(ext, type_info)
+            files.append({
+                'name': item,
+                'path': item_rel_path,
+                'is_dir': False,
+                'kind': type_info['kind'] if type_info else None,
+                'is_markdown': ext in MARKDOWN_EXTENSIONS,
+                'is_image': ext in IMAGE_EXTENSIONS,
+                'is_pdf': ext in PDF_EXTENSIONS,
+                'is_office': ext in OFFICE_EXTENSIONS,
+                'is_video': ext in VIDEO_EXTENSIONS,
+                'is_archive': is_archive_name(item),
+                'is_media': entry.path in media_stats,
+                'meta_pending': entry.path in media_stats and entry.path not in media_infos,
+                'sha256': (digests.get(entry.path) or {}).get('sha256'),
+                **format_metadata(media_infos.get(entry.path))
+            })
+
+    return directories, files
+
+# 代码预览的语言名称（从扩展名映射），用于前端语法高亮
+CODE_LANGUAGE_MAP = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.html': 'html',
+    '.css': 'css',
+    '.scss': 'scss',
+    '.php': 'php',
+    '.java': 'java',
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.cs': 'csharp',
+    '.go': 'go',
+    '.rb': 'ruby',
+    '.sh': 'bash',
+    '.bat': 'batch',
+    '.sql': 'sql',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.jsx': 'javascript',
+    '.json': 'json',
+    '.xml': 'xml',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.md': 'markdown',
+    '.markdown': 'markdown',
+    '.txt': 'text',
+    '.csv': 'csv',
+    '.log': 'text'
+}
+
+# 程序认识的扩展名：使用这些扩展名的文件按扩展名处理，不被文件头嗅探结果覆盖
+KNOWN_EXTENSIONS = frozenset(
+    OFFICE_EXTENSIONS + IMAGE_EXTENSIONS + MARKDOWN_EXTENSIONS + PDF_EXTENSIONS + VIDEO_EXTENSIONS
+    + DRAWIO_EXTENSIONS + AUDIO_EXTENSIONS + NOTEBOOK_EXTENSIONS + MEDIA_METADATA_EXTENSIONS
+    + list(CODE_LANGUAGE_MAP) + [os.path.splitext('x' + ext)[1] for ext in ARCHIVE_EXTENSIONS]
+)
+
+@traced('preview.code')
+def render_code_preview(code_content, ext):
+    """代码文件预览：HTML 转义后放入带语言标记的 pre"""
+    language = CODE_LANGUAGE_MAP.get(ext, 'text')
+    escaped_content = code_content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return f'<pre class="code-preview language-{language}"><code>{escaped_content}</code></pre>'
+
+def send_archive_member(archive_path, member, mimetype=None, as_attachment=False):
+    """发送压缩包中的单个成员"""
+    try:
+        entry, read_range, seekable = open_member(archive_path, member)
+    except Exception as e:
+        return make_response(f"读取压缩包失败: {e}", 500)
+    if entry is None:
+        abort(404)
+    st = os.stat(archive_path)
+    etag = f"{st.st_ino}-{st.st_mtime_ns}-{quote(member)}"
+    return send_virtual_file(read_range, entry['size'], mimetype=mimetype,
+                             download_name=posixpath.basename(member), as_attachment=as_attachment,
+                             etag=etag, last_modified=st.st_mtime, accept_ranges=seekable)
+
+def preview_archive_member(archive_path, member, filepath):
+    """生成压缩包成员的预览内容（媒体文件走 /preview，文本读取开头部分）"""
+    filename = posixpath.basename(member)
+    _, ext = os.path.splitext(filename.lower())
+    download_url = url_for('download_file', filepath=filepath)
+    preview_url = url_for('preview_file', filepath=filepath)
+    
+    if ext in IMAGE_EXTENSIONS:
+        file_type = 'image'
+        content_html = f'<div class="image-container"><img src="{preview_url}" alt="{escape(filename)}"></div>'
+    elif ext in PDF_EXTENSIONS:
+        file_type = 'pdf'
+        content_html = f'<div class="pdf-container"><embed src="{preview_url}" type="application/pdf"></div>'
+    elif ext in VIDEO_EXTENSIONS:
+        file_type = 'video'
+        content_html = f'<div class="video-container"><video controls src="{preview_url}"></video></div>'
+    else:
+        file_type = 'text'
+        try:
+            data = read_member_head(archive_path, member, ARCHIVE_TEXT_PREVIEW_BYTES)
+        except Exception as e:
+            return jsonify({'error': f'读取压缩包失败: {e}'}), 500
+        if data is None:
+            return jsonify({'error': '文件不存在'}), 404
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # 截断位置可能落在多字节字符中间
+            if e.start >= len(data) - 3 and len(data) == ARCHIVE_TEXT_PREVIEW_BYTES:
+                text = data[:e.start].decode('utf-8')
+            else:
+                text = None
+        if text is None:
+            content_html = '<div class="office-preview-info">二进制文件，请下载后查看</div>'
+        else:
+            content_html = f'<pre class="code-preview language-text"><code>{escape(text)}</code></pre>'
+    
+    return jsonify({
+        'filename': filename,
+        'file_type': file_type,
+        'content_html': content_html,
+        'download_url': download_url,
+        'preview_url': preview_url
+    })
 
 # 修复init_app函数内部的Draw.io路由
 
@@ -138,42 +359,82 @@ def init_app(app):
         except Exception:
             abort(404)
         
-        # 检查路径是否存在且是目录
-        if not os.path.exists(current_path) or not os.path.isdir(current_path):
-            abort(404)
-        
-        # 获取目录内容
-        try:
-            items = os.listdir(current_path)
-        except Exception:
-            items = []
-        
         # 分类文件和目录
         directories = []
         files = []
         
-        for item in items:
-            item_path = os.path.join(current_path, item)
-            item_rel_path = posixpath.join(path, item)
-            
-            if os.path.isdir(item_path):
+        # 检查路径是否存在且是目录；不是目录时尝试作为压缩包内的虚拟目录浏览
+        if not os.path.exists(current_path) or not os.path.isdir(current_path):
+            archive_path, inner_dir = split_archive_path(root_dir, path)
+            if not archive_path:
+                abort(404)
+            try:
+                listing = list_archive_dir(archive_path, inner_dir)
+            except Exception:
+                listing = None
+            if listing is None:
+                abort(404)
+            dir_names, file_entries = listing
+            for item in dir_names:
                 directories.append({
                     'name': item,
-                    'path': item_rel_path,
+                    'path': posixpath.join(path, item),
                     'is_dir': True
                 })
-            else:
+            for item, entry in file_entries:
                 _, ext = os.path.splitext(item.lower())
                 files.append({
                     'name': item,
-                    'path': item_rel_path,
+                    'path': posixpath.join(path, item),
                     'is_dir': False,
+                    'size': entry.get('size', 0),
                     'is_markdown': ext in MARKDOWN_EXTENSIONS,
                     'is_image': ext in IMAGE_EXTENSIONS,
                     'is_pdf': ext in PDF_EXTENSIONS,
                     'is_office': ext in OFFICE_EXTENSIONS,
-                    'is_video': ext in VIDEO_EXTENSIONS
+                    'is_video': ext in VIDEO_EXTENSIONS,
+                    'is_archive': False
                 })
+        else:
+            # 获取目录内容，scandir 一次拿到类型与 stat，避免逐个 isdir
+            entries = []
+            with span('fs.scandir', path=path):
+                try:
+                    with os.scandir(current_path) as it:
+                        for entry in it:
+                            try:
+                                is_dir = entry.is_dir()
+                                entries.append((entry, is_dir, None if is_dir else entry.stat()))
+                            except OSError:
+                                continue
+                except Exception:
+                    entries = []
+            
+            # 批量检测文件真实类型（结果持久缓存，只有新增或修改过的文件才读取文件头）
+            type_infos = detect_file_types({entry.path: st for entry, is_dir, st in entries if not is_dir})
+            
+            # 媒体文件的时长与分辨率：只查缓存，未解析的由后台线程处理，页面稍后轮询
+            media_stats, media_exts = {}, {}
+            for entry, is_dir, st in entries:
+                if not is_dir:
+                    _, ext = os.path.splitext(entry.name.lower())
+                    ext = resolve_extension(ext, type_infos.get(entry.path))
+                    if ext in MEDIA_METADATA_EXTENSIONS:
+                        media_stats[entry.path] = st
+                        media_exts[entry.path] = ext
+            media_infos = get_cached_metadata(media_stats, media_exts) if media_stats else {}
+            
+            # 文件摘要：只查缓存，较小的文件在后台进程池中补算（每次浏览最多 LISTING_HASH_BUDGET 字节），下次浏览时显示
+            file_stats = {entry.path: st for entry, is_dir, st in entries if not is_dir}
+            digests = digest_service.get_cached_many(file_stats)
+            budget = LISTING_HASH_BUDGET
+            for full_path, st in file_stats.items():
+                if (full_path not in digests and st.st_size <= min(LISTING_HASH_MAX, budget)
+                        and stat.S_ISREG(st.st_mode)):
+                    digest_service.submit(full_path, st)
+                    budget -= st.st_size
+            
+            directories, files = classify_entries(entries, path, type_infos, media_stats, media_infos, digests)
         
         # 排序：目录在前，按名称排序
         directories.sort(key=lambda x: x['name'].lower())
@@ -228,18 +489,20 @@ def init_app(app):
 
         filename = os.path.basename(full_path)
         _, ext = os.path.splitext(filename.lower())
+        ext = resolve_extension(ext, detect_file_type(full_path))
         file_type = 'unknown'
         content = ''
 
         if ext in OFFICE_EXTENSIONS:
             file_type = 'office'
+            # 提取Office文档的文本内容（只显示第一页）
+            content = render_office_preview(full_path, ext)
         elif ext in IMAGE_EXTENSIONS:
             file_type = 'image'
         elif ext in MARKDOWN_EXTENSIONS:
             file_type = 'markdown'
             try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    file_content = f.read()
+                file_content = read_text_file(full_path)
                 
                 # 使用新的markdown-it-py渲染
                 content = render_markdown_content(file_content, filepath)
@@ -297,8 +560,7 @@ def init_app(app):
             if ext in MARKDOWN_EXTENSIONS:
                 file_type = 'markdown'
                 try:
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        file_content = f.read()
+                    file_content = read_text_file(full_path)
                     
                     # 使用新的markdown-it-py渲染
                     content = render_markdown_content(file_content, filepath)
@@ -307,8 +569,7 @@ def init_app(app):
             else:
                 file_type = 'text'
                 try:
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        content = f.read().replace('\n', '<br>')
+                    content = read_text_file(full_path).replace('\n', '<br>')
                 except Exception as e:
                     content = f"<p>读取文件时出错: {e}</p>"
 
@@ -338,6 +599,10 @@ def init_app(app):
             abort(404)
         
         if not os.path.exists(full_path) or os.path.isdir(full_path):
+            # 压缩包内的成员：边解压边发送，不落盘
+            archive_path, member = split_archive_path(root_dir, filepath)
+            if archive_path and member:
+                return send_archive_member(archive_path, member, as_attachment=True)
             # 尝试直接在当前目录查找
             alt_path = os.path.join(os.getcwd(), filepath)
             if os.path.exists(alt_path) and not os.path.isdir(alt_path):
@@ -349,8 +614,25 @@ def init_app(app):
         directory = os.path.dirname(full_path)
         filename = os.path.basename(full_path)
         
+        # 内容摘要：已缓存或文件较小时附加 Repr-Digest/Digest 头，并用摘要作为强 ETag
+        digest = None
+        try:
+            st = os.stat(full_path)
+            digest = digest_service.get_cached(full_path, st)
+            if digest is None:
+                if st.st_size <= INLINE_HASH_MAX:
+                    digest = digest_service.get(full_path, st)
+                else:
+                    digest_service.submit(full_path, st)
+        except Exception as e:
+            print(f"[警告] 获取文件摘要失败: {e}")
+        
         # 使用send_from_directory发送文件
-        return send_from_directory(directory, filename, as_attachment=True)
+        if digest is None:
+            return send_from_directory(directory, filename, as_attachment=True)
+        response = send_from_directory(directory, filename, as_attachment=True, etag=strong_etag(digest))
+        response.headers.update(digest_headers(digest))
+        return response
     
     @app.route('/preview/<path:filepath>')
     def preview_file(filepath):
@@ -369,20 +651,25 @@ def init_app(app):
         except Exception:
             abort(404)
         
+        archive_path, member = None, None
         if not os.path.exists(full_path) or os.path.isdir(full_path):
-            # 尝试直接在当前目录查找
-            alt_path = os.path.join(os.getcwd(), filepath)
-            if os.path.exists(alt_path) and not os.path.isdir(alt_path):
-                full_path = alt_path
-            else:
-                abort(404)
+            archive_path, member = split_archive_path(root_dir, filepath)
+            if not (archive_path and member):
+                # 尝试直接在当前目录查找
+                alt_path = os.path.join(os.getcwd(), filepath)
+                if os.path.exists(alt_path) and not os.path.isdir(alt_path):
+                    full_path = alt_path
+                else:
+                    abort(404)
         
         # 获取文件所在目录和文件名
         directory = os.path.dirname(full_path)
         filename = os.path.basename(full_path)
         
-        # 根据文件扩展名设置正确的MIME类型
+        # 根据文件扩展名设置正确的MIME类型，扩展名与内容不符时以文件头为准
         _, ext = os.path.splitext(filename.lower())
+        type_info = None if archive_path else detect_file_type(full_path)
+        ext = resolve_extension(ext, type_info)
         mimetype = None
         
         if ext in IMAGE_EXTENSIONS:
@@ -409,7 +696,7 @@ def init_app(app):
                 mimetype = 'video/quicktime'
             else:
                 mimetype = 'video/mp4'
-        elif ext in ['.mp3', '.wav', '.flac', '.ogg', '.wma', '.m4a']:
+        elif ext in AUDIO_EXTENSIONS:
             if ext == '.mp3':
                 mimetype = 'audio/mpeg'
             elif ext == '.wav':
@@ -419,8 +706,28 @@ def init_app(app):
             else:
                 mimetype = 'audio/mpeg'
         
+        # 压缩包成员：存储方式的成员支持 Range，便于视频拖动
+        if archive_path:
+            return send_archive_member(archive_path, member, mimetype=mimetype, as_attachment=False)
+        
+        # moov 在文件末尾的 MP4 按 faststart 布局发送，浏览器拿到开头即可播放和拖动
+        if ext in FASTSTART_EXTENSIONS:
+            layout = get_faststart_layout(full_path)
+            if layout:
+                st = os.stat(full_path)
+                return send_virtual_file(make_range_reader(full_path, layout), layout['size'], mimetype=mimetype,
+                                         download_name=filename, etag=f"{st.st_ino}-{st.st_mtime_ns}-faststart",
+                                         last_modified=st.st_mtime)
+        
         # 不设置as_attachment，这样浏览器会尝试预览而不是下载
-        return send_from_directory(directory, filename, as_attachment=False, mimetype=mimetype)
+        response = send_from_directory(directory, filename, as_attachment=False, mimetype=mimetype)
+        
+        # 非 UTF-8 文本（如 GBK）需要声明实际字符集，否则浏览器显示乱码
+        if (mimetype is None and type_info and type_info['kind'] == 'text'
+                and type_info['encoding'] not in (None, 'utf-8', 'utf-8-sig')
+                and response.mimetype.startswith('text/')):
+            response.content_type = f"{response.mimetype}; charset={type_info['encoding']}"
+        return response
     
     @app.route('/set_root', methods=['GET', 'POST'])
     def set_root():
@@ -437,6 +744,10 @@ def init_app(app):
                 # 保存到配置文件，使用与main.py相同的配置文件路径
                 # 确保保留原有的密码，不使用默认值覆盖
                 config = configparser.ConfigParser()
+                # 保留 [server] 等其他配置节
+                config_file = current_app.config.get('CONFIG_FILE', 'config.ini')
+                if os.path.exists(config_file):
+                    config.read(config_file, encoding='utf-8')
                 current_password = current_app.config.get('PASSWORD')
                 if not current_password:
                     current_password = 'ats123'
@@ -445,8 +756,6 @@ def init_app(app):
                     'root_dir': new_root,
                     'password': current_password
                 }
-                # 获取配置文件路径
-                config_file = current_app.config.get('CONFIG_FILE', 'config.ini')
                 with open(config_file, 'w', encoding='utf-8') as f:
                     config.write(f)
                 return redirect(url_for('file_browser'))
@@ -466,7 +775,7 @@ def init_app(app):
         data = request.get_json()
         filepath = data.get('filepath')
         
-        if not filepath:
+        if not filepath or not isinstance(filepath, str):
             return jsonify({'error': '文件路径不能为空'}), 400
         
         root_dir = current_app.config.get('ROOT_DIR')
@@ -475,19 +784,26 @@ def init_app(app):
             root_dir = os.getcwd()
         
         # 安全检查：防止路径遍历
-        try:
-            full_path = os.path.join(root_dir, filepath)
-            full_path = os.path.normpath(full_path)
-            if not full_path.startswith(os.path.normpath(root_dir)):
-                return jsonify({'error': '访问被拒绝'}), 403
-        except Exception:
-            return jsonify({'error': '路径解析错误'}), 400
-        
-        if not os.path.exists(full_path) or os.path.isdir(full_path):
+        # span 只包含路径解析，压缩包成员的预览在 span 结束后再处理
+        archive_path = member = None
+        with span('fs.resolve', path=filepath):
+            full_path = os.path.normpath(os.path.join(root_dir, filepath))
+            allowed = is_within_root(full_path, root_dir)
+            is_file = allowed and os.path.exists(full_path) and not os.path.isdir(full_path)
+            if allowed and not is_file:
+                archive_path, member = split_archive_path(root_dir, filepath)
+        if not allowed:
+            return jsonify({'error': '访问被拒绝'}), 403
+        if not is_file:
+            if archive_path and member:
+                return preview_archive_member(archive_path, member, filepath)
             return jsonify({'error': '文件不存在'}), 404
         
         filename = os.path.basename(full_path)
         _, ext = os.path.splitext(filename.lower())
+        # 以文件头嗅探结果为准，扩展名错误或缺失的文件也能正确预览
+        type_info = detect_file_type(full_path)
+        ext = resolve_extension(ext, type_info)
         file_type = 'unknown'
         content_html = ''
         download_url = url_for('download_file', filepath=filepath)
@@ -498,11 +814,31 @@ def init_app(app):
                           '.cs', '.go', '.rb', '.sh', '.bat', '.sql', '.ts', '.tsx', '.jsx', 
                           '.json', '.xml', '.yaml', '.yml', '.md', '.markdown', '.txt', '.csv', '.log']
         
-        if ext in MARKDOWN_EXTENSIONS:
+        if data.get('diff_with'):
+            # 与另一个文本文件比较，按页显示差异
+            file_type = 'diff'
+            other_path = os.path.normpath(os.path.join(root_dir, data['diff_with']))
+            if not is_within_root(other_path, root_dir) or not os.path.isfile(other_path):
+                content_html = '<div class="office-preview-info">要比较的文件不存在</div>'
+            else:
+                download_url = url_for('diff_files', a=filepath, b=data['diff_with'],
+                                       mode=data.get('diff_mode', 'unified'))
+                try:
+                    content_html = render_diff_page(full_path, other_path, data['diff_with'], download_url, data)
+                except Exception as e:
+                    content_html = f'<div class="office-preview-info">比较文件时出错: {escape(str(e))}</div>'
+        elif 'hex_offset' in data or 'hex_search' in data:
+            # 十六进制视图的翻页、跳转和搜索请求
+            file_type = 'hex'
+            content_html = render_hex_preview(full_path, data)
+        elif type_info['kind'] == 'sqlite':
+            # SQLite 数据库以只读方式打开，按表键集分页浏览
+            file_type = 'sqlite'
+            content_html = render_sqlite_preview(full_path, data)
+        elif ext in MARKDOWN_EXTENSIONS:
             file_type = 'markdown'
             try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    markdown_content = f.read()
+                markdown_content = read_text_file(full_path)
                 
                 # 使用新的markdown-it-py渲染
                 content_html = render_markdown_content(markdown_content, filepath)
@@ -521,6 +857,29 @@ def init_app(app):
         elif ext in VIDEO_EXTENSIONS:
             file_type = 'video'
             content_html = f'<div class="video-container"><video controls src="{preview_url}"></video></div>'
+        elif ext in NOTEBOOK_EXTENSIONS:
+            file_type = 'notebook'
+            # 渲染结果按 mtime 缓存，图片与 HTML 输出外置为单独请求，预览页只包含轻量的框架
+            try:
+                render = get_notebook_render(full_path, get_markdown_parser(),
+                                             url_for('notebook_output', filepath=filepath))
+                content_html = render['html']
+            except Exception as e:
+                content_html = f'<p>无法预览此Notebook: {escape(str(e))}</p>'
+        elif ext in AUDIO_EXTENSIONS:
+            file_type = 'audio'
+            # 波形由 /waveform 单独加载，音频本身按需缓冲
+            waveform_url = url_for('waveform', filepath=filepath)
+            content_html = f'''
+            <div class="audio-container">
+                <canvas class="waveform-canvas" data-waveform-url="{waveform_url}" height="120"></canvas>
+                <audio controls preload="metadata" src="{preview_url}" style="width: 100%;"></audio>
+            </div>
+            '''
+        elif ext in OFFICE_EXTENSIONS:
+            file_type = 'office'
+            # 直接解析OOXML压缩包，支持按工作表和页码翻页
+            content_html = render_office_preview(full_path, ext, data)
         elif ext in DRAWIO_EXTENSIONS:
             file_type = 'drawio'
             # 提供draw.io文件的预览功能，编辑按钮在header中
@@ -532,50 +891,21 @@ def init_app(app):
         elif ext in CODE_EXTENSIONS:
             file_type = 'code'
             try:
-                with open(full_path, 'r', encoding='utf-8') as f:
+                with open(full_path, 'r', encoding=type_info['encoding'] or 'utf-8', errors='replace') as f:
                     code_content = f.read()
-                    # 获取语言名称（从扩展名映射）
-                    language_map = {
-                        '.py': 'python',
-                        '.js': 'javascript',
-                        '.html': 'html',
-                        '.css': 'css',
-                        '.scss': 'scss',
-                        '.php': 'php',
-                        '.java': 'java',
-                        '.c': 'c',
-                        '.cpp': 'cpp',
-                        '.cs': 'csharp',
-                        '.go': 'go',
-                        '.rb': 'ruby',
-                        '.sh': 'bash',
-                        '.bat': 'batch',
-                        '.sql': 'sql',
-                        '.ts': 'typescript',
-                        '.tsx': 'typescript',
-                        '.jsx': 'javascript',
-                        '.json': 'json',
-                        '.xml': 'xml',
-                        '.yaml': 'yaml',
-                        '.yml': 'yaml',
-                        '.md': 'markdown',
-                        '.markdown': 'markdown',
-                        '.txt': 'text',
-                        '.csv': 'csv',
-                        '.log': 'text'
-                    }
-                    language = language_map.get(ext, 'text')
-                    # 使用HTML转义并添加语法高亮标记
-                    escaped_content = code_content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    content_html = f'<pre class="code-preview language-{language}"><code>{escaped_content}</code></pre>'
+                    content_html = diff_form() + render_code_preview(code_content, ext)
             except Exception as e:
                 content_html = f'<p>无法预览此文件: {e}</p>'
         else:
             file_type = 'text'
             try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    text_content = f.read()
-                    content_html = f'<pre>{text_content}</pre>'
+                if type_info['kind'] not in ('text', 'drawio'):
+                    # 二进制文件使用十六进制视图，只读取当前页
+                    file_type = 'hex'
+                    content_html = render_hex_preview(full_path, data)
+                else:
+                    text_content = read_text_file(full_path)
+                    content_html = diff_form() + f'<pre>{text_content}</pre>'
             except Exception as e:
                 content_html = f'<p>无法预览此文件: {e}</p>'
         
@@ -587,6 +917,601 @@ def init_app(app):
             'preview_url': preview_url
         })
     
+    @app.route('/media_metadata', methods=['POST'])
+    def media_metadata():
+        """查询后台解析完成的媒体信息，供文件列表补全时长与分辨率"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        data = request.get_json(silent=True) or {}
+        results = {}
+        for filepath in data.get('paths', [])[:1000]:
+            full_path = os.path.normpath(os.path.join(root_dir, filepath))
+            if not is_within_root(full_path, root_dir):
+                continue
+            meta = media_metadata_cache.get(full_path)
+            if meta is not None:
+                results[filepath] = format_metadata(meta)
+        return jsonify({'metadata': results})
+    
+    @app.route('/notebook_output/<path:filepath>')
+    def notebook_output(filepath):
+        """发送 notebook 中外置的单个输出（图片或 HTML）"""
+        if 'logged_in' not in session:
+            return redirect(url_for('login'))
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        # 安全检查：防止路径遍历
+        full_path = os.path.normpath(os.path.join(root_dir, filepath))
+        if not is_within_root(full_path, root_dir) or not os.path.isfile(full_path):
+            abort(404)
+        
+        output_path, mimetype = get_notebook_output(full_path, get_markdown_parser(),
+                                                    url_for('notebook_output', filepath=filepath),
+                                                    request.args.get('id', ''))
+        if output_path is None or not os.path.isfile(output_path):
+            abort(404)
+        response = send_file(output_path, mimetype=mimetype, conditional=True)
+        if mimetype == 'text/html':
+            # 与 iframe 的 sandbox 属性配合，禁止输出中的脚本访问本站
+            response.headers['Content-Security-Policy'] = 'sandbox'
+        return response
+    
+    @app.route('/waveform/<path:filepath>')
+    def waveform(filepath):
+        """返回音频文件的波形峰值（按文件缓存），level 为峰值个数"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        # 安全检查：防止路径遍历
+        full_path = os.path.normpath(os.path.join(root_dir, filepath))
+        if not is_within_root(full_path, root_dir) or not os.path.isfile(full_path):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        # 波形计算依赖 NumPy，第一次请求时才导入
+        from waveform import get_waveform
+        try:
+            result = get_waveform(full_path, request.args.get('level', type=int))
+        except Exception as e:
+            return jsonify({'error': f'计算波形失败: {e}'}), 500
+        if result is None:
+            return jsonify({'error': '无法解码此音频'}), 415
+        return jsonify(result)
+    
+    @app.route('/diff')
+    def diff_files():
+        """流式输出两个文本文件的完整差异，a、b 为相对路径，mode 为 unified 或 side"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        a_rel, b_rel = request.args.get('a', ''), request.args.get('b', '')
+        paths = []
+        for rel in (a_rel, b_rel):
+            # 安全检查：防止路径遍历
+            full_path = os.path.normpath(os.path.join(root_dir, rel))
+            if not rel or not is_within_root(full_path, root_dir) or not os.path.isfile(full_path):
+                return jsonify({'error': '文件不存在'}), 404
+            paths.append(full_path)
+        
+        mode = request.args.get('mode', 'unified')
+        width = request.args.get('width', 80, type=int)
+        # 差异结果（只有行号区间）先计算好，正文按块边读边输出，不会把两个文件整体读入内存
+        response = Response(stream_with_context(iter_diff_text(paths[0], paths[1], a_rel, b_rel, mode, width)),
+                            mimetype='text/plain; charset=utf-8')
+        download_name = f'{os.path.basename(a_rel)}_vs_{os.path.basename(b_rel)}.diff'
+        response.headers['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(download_name)}"
+        return response
+    
+    @app.route('/jobs', methods=['GET', 'POST'])
+    @single_process_only
+    def file_jobs():
+        """
+        GET 列出后台文件任务及进度；POST 提交复制/移动/删除任务：
+        {"op": "copy"|"move"|"delete", "paths": [相对路径...], "dest": 目标文件夹相对路径}
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        if request.method == 'GET':
+            return jsonify({'jobs': job_manager.list_jobs()})
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        data = request.get_json(silent=True) or {}
+        op = data.get('op')
+        labels = [p for p in data.get('paths', []) if isinstance(p, str)]
+        sources = []
+        for rel in labels:
+            # 安全检查：防止路径遍历
+            full_path = os.path.normpath(os.path.join(root_dir, rel))
+            if not is_within_root(full_path, root_dir):
+                return jsonify({'error': '访问被拒绝'}), 403
+            sources.append(full_path)
+        dest_dir = None
+        if op != 'delete':
+            dest_dir = os.path.normpath(os.path.join(root_dir, data.get('dest') or ''))
+            if not is_within_root(dest_dir, root_dir):
+                return jsonify({'error': '访问被拒绝'}), 403
+        
+        error = validate_job(op, sources, dest_dir, root_dir)
+        if error:
+            return jsonify({'error': error}), 400
+        job = job_manager.submit(op, sources, dest_dir, labels)
+        return jsonify({'job': job.to_dict()}), 202
+    
+    @app.route('/jobs/<job_id>')
+    @single_process_only
+    def file_job_status(job_id):
+        """查询单个任务的进度与吞吐量"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify({'job': job.to_dict()})
+    
+    @app.route('/jobs/<job_id>/cancel', methods=['POST'])
+    @single_process_only
+    def cancel_file_job(job_id):
+        """取消排队中或正在执行的任务"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        if not job_manager.cancel(job_id):
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify({'success': True})
+    
+    @app.route('/checksums/', defaults={'dirpath': ''})
+    @app.route('/checksums/<path:dirpath>')
+    def checksum_manifest(dirpath):
+        """
+        生成目录的校验清单（sha256sum 格式，可直接用 sha256sum -c 校验）
+        algo=sha256（默认）或 fast（XXH64/CRC32），recursive=1 时包含子目录
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        # 安全检查：防止路径遍历
+        dir_path = os.path.normpath(os.path.join(root_dir, dirpath))
+        if not is_within_root(dir_path, root_dir) or not os.path.isdir(dir_path):
+            return jsonify({'error': '目录不存在'}), 404
+        
+        field = 'fast' if request.args.get('algo') == 'fast' else 'sha256'
+        stats = {}
+        if request.args.get('recursive') == '1':
+            for parent, _, names in os.walk(dir_path):
+                for name in names:
+                    full_path = os.path.join(parent, name)
+                    try:
+                        st = os.stat(full_path)
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(st.st_mode):
+                        stats[full_path] = st
+        else:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            stats[entry.path] = entry.stat()
+                    except OSError:
+                        continue
+        
+        def generate():
+            # 已缓存的摘要立即输出，其余在进程池中并行计算，算完一个输出一行
+            for full_path, digest in digest_service.iter_digests(stats):
+                if field == 'fast' and digest.get('fast_algorithm') != FAST_ALGORITHM:
+                    continue
+                rel = os.path.relpath(full_path, dir_path).replace(os.sep, '/')
+                yield f'{digest[field]}  {rel}\n'
+        
+        algorithm = FAST_ALGORITHM if field == 'fast' else 'sha256'
+        response = Response(stream_with_context(generate()), mimetype='text/plain; charset=utf-8')
+        download_name = f'{os.path.basename(dir_path) or "root"}.{algorithm}'
+        response.headers['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(download_name)}"
+        return response
+    
+    @app.route('/timeline')
+    def timeline():
+        """照片时间线页面，按拍摄日期浏览整个根目录中的图片"""
+        if 'logged_in' not in session:
+            return redirect(url_for('login'))
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir or not os.path.isdir(root_dir):
+            return redirect(url_for('set_root'))
+        
+        photo_indexer.ensure_fresh(os.path.normpath(root_dir))
+        return render_template('photo_timeline.html')
+    
+    @app.route('/photo_timeline')
+    def photo_timeline():
+        """
+        照片时间线查询接口（只查索引，不打开图片）：
+        - 不带 bucket：返回按日/月分组的列表及数量
+        - 带 bucket：返回该分组内的照片，cursor 为上一页返回的 next_cursor
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir or not os.path.isdir(root_dir):
+            return jsonify({'error': '未设置根目录'}), 400
+        root_dir = os.path.normpath(root_dir)
+        
+        group = request.args.get('group', 'day')
+        if group not in GROUP_COLUMNS:
+            return jsonify({'error': '分组方式只能是 day 或 month'}), 400
+        try:
+            limit = max(1, min(int(request.args.get('limit', 100)), 500))
+        except ValueError:
+            limit = 100
+        bucket = request.args.get('bucket')
+        cursor = request.args.get('cursor') or None
+        
+        photo_indexer.ensure_fresh(root_dir)
+        if bucket:
+            rows, next_cursor = photo_index.photos(root_dir, group, bucket, limit, cursor)
+            for row in rows:
+                row['preview_url'] = url_for('preview_file', filepath=row['path'])
+            result = {'photos': rows}
+        else:
+            rows, next_cursor = photo_index.buckets(root_dir, group, limit, cursor)
+            result = {'buckets': rows}
+        result['next_cursor'] = next_cursor
+        result['indexing'] = dict(photo_indexer.status)
+        if current_app.config.get('SERVER_WORKERS', 1) > 1:
+            # 索引数据库各进程共享，但扫描进度只属于处理本次请求的进程
+            result['indexing']['worker_pid'] = os.getpid()
+        return jsonify(result)
+    
+    @app.route('/block_signature/<path:filepath>')
+    def block_signature(filepath):
+        """
+        返回文件的分块签名（rsync/zsync 方式的增量下载第一步）：
+        响应体为每块 4 字节弱校验和 + 8 字节强校验和，块大小、块数、文件版本在响应头中
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        # 安全检查：防止路径遍历
+        full_path = os.path.normpath(os.path.join(root_dir, filepath))
+        if not is_within_root(full_path, root_dir) or not os.path.isfile(full_path):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        try:
+            st = os.stat(full_path)
+            sig_path, block_size, blocks = get_signature(full_path, st)
+        except Exception as e:
+            return jsonify({'error': f'计算分块签名失败: {e}'}), 500
+        
+        response = send_file(sig_path, mimetype='application/octet-stream', etag=file_version(st))
+        response.headers['X-Block-Size'] = str(block_size)
+        response.headers['X-Block-Count'] = str(blocks)
+        response.headers['X-Record-Size'] = str(RECORD_SIZE)
+        response.headers['X-File-Size'] = str(st.st_size)
+        response.headers['X-File-Version'] = file_version(st)
+        # 摘要已缓存时一并返回，客户端重建后可校验
+        digest = digest_service.get_cached(full_path, st)
+        if digest is not None:
+            response.headers.update(digest_headers(digest))
+        return response
+    
+    @app.route('/block_delta/<path:filepath>', methods=['POST'])
+    def block_delta(filepath):
+        """
+        增量下载第二步：只返回客户端缺少的块
+        请求体 {"version": 签名响应中的 X-File-Version, "ranges": [[起始块, 结束块), ...]}
+        响应体为这些块按顺序拼接的原始数据
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        # 安全检查：防止路径遍历
+        full_path = os.path.normpath(os.path.join(root_dir, filepath))
+        if not is_within_root(full_path, root_dir) or not os.path.isfile(full_path):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        st = os.stat(full_path)
+        if data.get('version') != file_version(st):
+            return jsonify({'error': '文件已被修改，请重新获取分块签名'}), 412
+        try:
+            sig_path, block_size, blocks = get_signature(full_path, st)
+        except Exception as e:
+            return jsonify({'error': f'计算分块签名失败: {e}'}), 500
+        ranges = parse_block_ranges(data.get('ranges'), blocks)
+        if ranges is None:
+            return jsonify({'error': '块区间无效'}), 400
+        
+        return send_virtual_file(lambda start, length: iter_blocks(full_path, ranges, block_size, st.st_size),
+                                 delta_length(ranges, block_size, st.st_size), accept_ranges=False)
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """
+        Prometheus 文本格式的请求数、耗时直方图、正在处理的请求、响应字节数和缓存命中率
+        已登录，或请求头带有 Authorization: Bearer <metrics_token>（[server] 中配置）时可访问
+        """
+        token = current_app.config.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        if 'logged_in' not in session and not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+            return jsonify({'error': '请先登录'}), 401
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.route('/profiling/sample', methods=['GET', 'POST'])
+    @profiling_required
+    @single_process_only
+    def profiling_sample():
+        """
+        后台栈采样（当前进程）：
+        - POST {"seconds": 时长, "interval": 采样间隔} 开始采样，结果保存为折叠栈文件
+        - POST {"action": "stop"} 提前结束；GET 返回最近一次采样的状态
+        """
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            if data.get('action') == 'stop':
+                stack_sampler.stop()
+                return jsonify({'sample': stack_sampler.status()})
+            try:
+                seconds = float(data.get('seconds', DEFAULT_SAMPLE_SECONDS))
+                interval = float(data.get('interval', DEFAULT_SAMPLE_INTERVAL))
+            except (TypeError, ValueError):
+                return jsonify({'error': '参数无效'}), 400
+            seconds = min(max(seconds, 1), MAX_SAMPLE_SECONDS)
+            interval = min(max(interval, 0.001), 1.0)
+            if stack_sampler.start(seconds, interval) is None:
+                return jsonify({'error': '已有采样正在进行', 'sample': stack_sampler.status()}), 409
+        return jsonify({'sample': stack_sampler.status()})
+
+    @app.route('/profiling/profiles')
+    @profiling_required
+    def profiling_profiles():
+        """列出保存的分析结果：栈采样（.folded）和单个请求的 cProfile（.prof，请求带 ?_profile=1 或 X-Profile: 1）"""
+        return jsonify({'profiles': list_profiles()})
+
+    @app.route('/profiling/profiles/<name>')
+    @profiling_required
+    def profiling_profile(name):
+        """下载分析结果；.prof 文件加 ?format=text 时返回 pstats 文本报告（sort=cumulative/tottime/calls）"""
+        path = profile_path(name)
+        if path is None:
+            return jsonify({'error': '分析结果不存在'}), 404
+        if request.args.get('format') == 'text' and name.endswith('.prof'):
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in ('cumulative', 'tottime', 'calls'):
+                sort = 'cumulative'
+            return Response(format_cprofile(path, sort), mimetype='text/plain; charset=utf-8')
+        return send_file(path, as_attachment=True, download_name=name)
+
+    @app.route('/profiling/memory', methods=['GET', 'POST'])
+    @profiling_required
+    @single_process_only
+    def profiling_memory():
+        """
+        tracemalloc 内存跟踪（当前进程）：
+        - POST {"action": "start", "frames": 栈深度} 开始跟踪；{"action": "stop"} 停止；{"action": "snapshot"} 保存快照
+        - GET 返回跟踪状态、进程常驻内存和已保存的快照
+        """
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            action = data.get('action')
+            if action == 'start':
+                try:
+                    memory_profiler.start(data.get('frames', 1))
+                except (TypeError, ValueError):
+                    return jsonify({'error': '参数无效'}), 400
+            elif action == 'stop':
+                memory_profiler.stop()
+            elif action == 'snapshot':
+                info = memory_profiler.take_snapshot()
+                if info is None:
+                    return jsonify({'error': '请先开始内存跟踪'}), 409
+                return jsonify({'snapshot': info})
+            else:
+                return jsonify({'error': '未知操作'}), 400
+        return jsonify(dict(memory_profiler.status(), rss=process_memory()))
+
+    @app.route('/profiling/memory/top')
+    @profiling_required
+    @single_process_only
+    def profiling_memory_top():
+        """快照中分配最多的位置：?snapshot=编号&key=lineno/filename/traceback&limit=n"""
+        key_type = request.args.get('key', 'lineno')
+        if key_type not in KEY_TYPES:
+            return jsonify({'error': '不支持的分组方式'}), 400
+        top = memory_profiler.top(request.args.get('snapshot', type=int), key_type,
+                                  request.args.get('limit', 30, type=int))
+        if top is None:
+            return jsonify({'error': '快照不存在'}), 404
+        return jsonify({'top': top})
+
+    @app.route('/profiling/memory/diff')
+    @profiling_required
+    @single_process_only
+    def profiling_memory_diff():
+        """比较两份快照，按增长量排序：?old=编号&new=编号&key=lineno/filename/traceback&limit=n"""
+        key_type = request.args.get('key', 'lineno')
+        if key_type not in KEY_TYPES:
+            return jsonify({'error': '不支持的分组方式'}), 400
+        diff = memory_profiler.diff(request.args.get('old', type=int), request.args.get('new', type=int),
+                                    key_type, request.args.get('limit', 30, type=int))
+        if diff is None:
+            return jsonify({'error': '快照不存在'}), 404
+        return jsonify({'diff': diff})
+
+    @app.route('/profiling/memory/caches')
+    @profiling_required
+    def profiling_memory_caches():
+        """进程内各缓存的条目数与估算内存占用（不需要开启 tracemalloc）"""
+        caches = cache_memory_usage()
+        return jsonify({'caches': caches, 'total': sum(c['bytes'] for c in caches), 'rss': process_memory()})
+
+    @app.route('/traces')
+    @single_process_only
+    def traces_page():
+        """慢请求页面：最近请求（本进程）按耗时排序，显示每个请求的 span 分解"""
+        if 'logged_in' not in session:
+            return redirect(url_for('login'))
+        try:
+            min_ms = float(request.args.get('min_ms', 0))
+        except ValueError:
+            min_ms = 0.0
+        traces = [trace.to_dict() for trace in trace_buffer.list(min_ms=min_ms, limit=50)]
+        return render_template('traces.html', traces=traces, min_ms=min_ms)
+
+    @app.route('/traces/export')
+    @single_process_only
+    def traces_export():
+        """
+        导出请求跟踪：format=chrome（chrome://tracing / Perfetto）或 otlp（OpenTelemetry OTLP/JSON）
+        指定 id 时只导出该请求，否则导出缓冲区中的全部请求
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        trace_id = request.args.get('id')
+        if trace_id:
+            trace = trace_buffer.get(trace_id)
+            if trace is None:
+                return jsonify({'error': '跟踪记录不存在或已被覆盖'}), 404
+            traces = [trace]
+        else:
+            traces = trace_buffer.list()
+        export_format = request.args.get('format', 'chrome')
+        if export_format == 'otlp':
+            data = to_otlp(traces)
+        elif export_format == 'chrome':
+            data = to_chrome_trace(traces)
+        else:
+            return jsonify({'error': '不支持的导出格式'}), 400
+        response = jsonify(data)
+        response.headers['Content-Disposition'] = f'attachment; filename=traces-{export_format}.json'
+        return response
+
+    @app.route('/duplicates')
+    def duplicates():
+        """重复文件页面，path 为要扫描的目录（相对根目录）"""
+        if 'logged_in' not in session:
+            return redirect(url_for('login'))
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir or not os.path.isdir(root_dir):
+            return redirect(url_for('set_root'))
+        return render_template('duplicates.html', current_path=request.args.get('path', ''))
+    
+    @app.route('/duplicate_scan', methods=['GET', 'POST'])
+    @single_process_only
+    def duplicate_scan():
+        """
+        重复文件扫描接口：
+        - POST {"path": 目录, "min_size": 最小字节数} 启动后台扫描（同一目录正在扫描时返回当前进度）
+        - GET ?path=目录&limit=n 返回最近一次扫描的进度与按可回收空间排序的重复文件组
+        """
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir or not os.path.isdir(root_dir):
+            return jsonify({'error': '未设置根目录'}), 400
+        root_dir = os.path.normpath(root_dir)
+        
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+        else:
+            data = request.args
+        rel_path = data.get('path') or ''
+        # 安全检查：防止路径遍历
+        scan_dir = os.path.normpath(os.path.join(root_dir, rel_path))
+        if not is_within_root(scan_dir, root_dir) or not os.path.isdir(scan_dir):
+            return jsonify({'error': '目录不存在'}), 404
+        
+        if request.method == 'POST':
+            try:
+                min_size = max(int(data.get('min_size', 1)), 1)
+            except (TypeError, ValueError):
+                min_size = 1
+            scan = duplicate_finder.start(root_dir, rel_path, min_size)
+            return jsonify({'scan': scan.to_dict(limit=0)}), 202
+        
+        scan = duplicate_finder.get(root_dir, rel_path)
+        if scan is None:
+            return jsonify({'scan': None})
+        try:
+            limit = max(0, min(int(request.args.get('limit', 200)), 5000))
+        except ValueError:
+            limit = 200
+        return jsonify({'scan': scan.to_dict(limit=limit)})
+    
+    @app.route('/duplicate_scan/cancel', methods=['POST'])
+    @single_process_only
+    def cancel_duplicate_scan():
+        """取消正在进行的重复文件扫描"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        root_dir = current_app.config.get('ROOT_DIR') or os.getcwd()
+        data = request.get_json(silent=True) or {}
+        if not duplicate_finder.cancel(os.path.normpath(root_dir), data.get('path') or ''):
+            return jsonify({'error': '没有正在进行的扫描'}), 404
+        return jsonify({'success': True})
+    
+    @app.route('/get_office_text', methods=['POST'])
+    def get_office_text_content():
+        """获取Office文件的纯文本内容，供搜索索引使用"""
+        if 'logged_in' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        filepath = data.get('filepath') if isinstance(data, dict) else None
+        if not filepath or not isinstance(filepath, str):
+            return jsonify({'error': '文件路径不能为空'}), 400
+        
+        root_dir = current_app.config.get('ROOT_DIR')
+        if not root_dir:
+            root_dir = os.getcwd()
+        
+        # 安全检查：防止路径遍历
+        full_path = os.path.normpath(os.path.join(root_dir, filepath))
+        if not is_within_root(full_path, root_dir):
+            return jsonify({'error': '访问被拒绝'}), 403
+        
+        _, ext = os.path.splitext(full_path.lower())
+        if ext not in OFFICE_EXTENSIONS or not os.path.isfile(full_path):
+            return jsonify({'error': '文件不存在或不是Office文件'}), 404
+        
+        try:
+            text = get_office_text(full_path)
+        except Exception as e:
+            return jsonify({'error': f'提取文本失败: {e}'}), 500
+        return jsonify({'filepath': filepath, 'text': text})
+    
     # 用户认证相关路由
     @app.route('/login', methods=['GET', 'POST'])
     def login():
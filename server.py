@@ -0,0 +1,393 @@
+# server.py
+import atexit
+import configparser
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import InternalServerError
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from async_transfer import DEFAULT_MAX_TRANSFERS, DEFAULT_MIN_BYTES, TransferEngine, TransferFileWrapper, sendfile_source
+from streaming import ResponseBody
+
+
+# [server] 配置节的默认值
+DEFAULT_SERVER_SETTINGS = {
+    # production：有界线程池 + 可选多进程；development：Flask 开发服务器（调试模式）
+    'mode': 'production',
+    'host': '0.0.0.0',
+    'port': 5000,
+    # 每个进程的工作线程数，也是同时处理的连接数上限
+    'threads': 64,
+    # 进程数，大于 1 时预先 fork 多个进程共享监听套接字（仅 Linux/macOS）
+    'workers': 1,
+    # 内核中等待 accept 的连接队列长度
+    'backlog': 1024,
+    # 长连接在两个请求之间最多空闲的秒数
+    'keep_alive_timeout': 5,
+    # 单个长连接最多处理的请求数
+    'keep_alive_requests': 100,
+    # 请求处理中单次读写的超时秒数，避免卡住的客户端长期占用线程
+    'io_timeout': 60,
+    # 大于此字节数的文件响应体交给 asyncio 事件循环用 sendfile 发送，不再占用工作线程；0 表示关闭
+    'async_transfer_min_bytes': DEFAULT_MIN_BYTES,
+    # 事件循环同时发送的连接数上限
+    'async_transfer_max': DEFAULT_MAX_TRANSFERS,
+    # 静态资源（含 draw.io 编辑器文件）请求写入访问日志的比例，1.0 为全部记录；出错的请求总是记录
+    'access_log_static_sample': 1.0,
+    # 不登录访问 /metrics 时使用的令牌（Authorization: Bearer <令牌>），留空则只允许已登录的用户访问
+    'metrics_token': '',
+    # 1 表示对已登录用户开放性能分析（/profiling/...、请求带 ?_profile=1 时记录 cProfile）
+    'profiling': 0,
+    # 请求跟踪环形缓冲区保留的请求数（/traces 慢请求页面），0 表示关闭跟踪
+    'trace_buffer': 200,
+}
+SERVER_MODES = ('production', 'development')
+# 子进程意外退出后重新创建前的等待秒数
+RESPAWN_DELAY = 1.0
+
+
+def load_server_settings(config_file=None, overrides=None):
+    """读取配置文件的 [server] 节，overrides（命令行参数）中不为 None 的值优先"""
+    settings = dict(DEFAULT_SERVER_SETTINGS)
+    if config_file and os.path.exists(config_file):
+        config = configparser.ConfigParser()
+        config.read(config_file, encoding='utf-8')
+        if 'server' in config:
+            section = config['server']
+            for key, default in DEFAULT_SERVER_SETTINGS.items():
+                if key not in section:
+                    continue
+                try:
+                    settings[key] = type(default)(section[key])
+                except ValueError:
+                    print(f"[警告] 配置项 server.{key} 的值无效: {section[key]}，使用默认值 {default}")
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            settings[key] = value
+    if settings['mode'] not in SERVER_MODES:
+        print(f"[警告] 未知的服务模式 {settings['mode']}，使用 production")
+        settings['mode'] = 'production'
+    settings['threads'] = max(1, settings['threads'])
+    settings['workers'] = max(1, settings['workers'])
+    return settings
+
+
+class ProductionRequestHandler(WSGIRequestHandler):
+    """
+    支持长连接的请求处理：
+    - Werkzeug 的 run_wsgi 总是回复 Connection: close，并在响应后读空套接字（会吞掉下一个请求），
+      这里改为对没有请求体的 HTTP/1.1 请求保持连接
+      （有请求体时应用不一定读完，剩余数据会被当作下一个请求，因此仍然关闭）
+    - 等待下一个请求时使用较短的 keep_alive_timeout，处理请求时使用 io_timeout
+    - 单个连接处理的请求数达到上限，或线程池已满时关闭连接，避免空闲的长连接占满线程
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.timeout = self.server.io_timeout
+        self.requests_handled = 0
+        self.waiting_idle = False
+        super().setup()
+
+    def handle_one_request(self):
+        if self.requests_handled:
+            self.waiting_idle = True
+            self.connection.settimeout(self.server.keep_alive_timeout)
+        super().handle_one_request()
+        self.requests_handled += 1
+
+    def parse_request(self):
+        # 请求行已经读到，之后的读写使用处理请求的超时
+        self.waiting_idle = False
+        self.connection.settimeout(self.server.io_timeout)
+        return super().parse_request()
+
+    def keep_alive_allowed(self, has_body):
+        if self.close_connection or has_body or self.request_version != 'HTTP/1.1':
+            return False
+        return self.requests_handled + 1 < self.server.keep_alive_requests and not self.server.saturated()
+
+    def make_environ(self):
+        environ = super().make_environ()
+        if self.server.transfer_engine is not None:
+            environ['wsgi.file_wrapper'] = TransferFileWrapper
+        return environ
+
+    def hand_off(self, application_iter, status, response_headers, write):
+        """
+        响应体是足够大的真实文件时，发送响应头后把连接交给事件循环发送响应体，返回 True
+        慢速客户端（如远程播放视频）因此不会长期占用工作线程
+        """
+        engine = self.server.transfer_engine
+        if engine is None or self.environ['REQUEST_METHOD'] != 'GET' or not status.startswith(('200', '206')):
+            return False
+        source = sendfile_source(application_iter)
+        length = next((value for key, value in response_headers if key.lower() == 'content-length'), None)
+        if source is None or length is None or int(length) < self.server.async_transfer_min_bytes:
+            return False
+        if not engine.try_reserve():
+            return False
+        # 连接交给事件循环后由它负责关闭，不再处理这个连接上的后续请求
+        self.close_connection = True
+        try:
+            write(b'')
+        except Exception:
+            engine.release()
+            raise
+        file, offset = source
+        engine.submit(self.connection, file, offset, int(length))
+        if isinstance(application_iter, ResponseBody):
+            application_iter.handed_off(int(length))
+        return True
+
+    def run_wsgi(self):
+        if self.headers.get('Expect', '').lower().strip() == '100-continue':
+            self.wfile.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        self.environ = environ = self.make_environ()
+        has_body = self.headers.get('Content-Length', '0') != '0' or 'Transfer-Encoding' in self.headers
+        headers_set = []
+        headers_sent = []
+        chunked = False
+
+        def write(data):
+            nonlocal chunked
+            if not headers_sent:
+                headers_sent[:] = headers_set
+                status, response_headers = headers_set
+                code, _, msg = status.partition(' ')
+                code = int(code)
+                self.send_response(code, msg)
+                header_keys = set()
+                for key, value in response_headers:
+                    key_lower = key.lower()
+                    if key_lower in ('connection', 'transfer-encoding'):
+                        continue
+                    self.send_header(key, value)
+                    header_keys.add(key_lower)
+                if not ('content-length' in header_keys or environ['REQUEST_METHOD'] == 'HEAD'
+                        or 100 <= code < 200 or code in (204, 304)):
+                    chunked = True
+                    self.send_header('Transfer-Encoding', 'chunked')
+                keep_alive = self.keep_alive_allowed(has_body)
+                self.send_header('Connection', 'keep-alive' if keep_alive else 'close')
+                self.end_headers()
+            if data:
+                if chunked:
+                    self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+                else:
+                    self.wfile.write(data)
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info:
+                try:
+                    if headers_sent:
+                        raise exc_info[1].with_traceback(exc_info[2])
+                finally:
+                    exc_info = None
+            headers_set[:] = [status, response_headers]
+            return write
+
+        def execute(app):
+            application_iter = app(environ, start_response)
+            try:
+                if headers_set and self.hand_off(application_iter, *headers_set, write):
+                    return
+                for data in application_iter:
+                    write(data)
+                if not headers_sent:
+                    write(b'')
+                if chunked:
+                    self.wfile.write(b'0\r\n\r\n')
+            finally:
+                if hasattr(application_iter, 'close'):
+                    application_iter.close()
+
+        try:
+            execute(self.server.app)
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e, environ)
+        except Exception:
+            if self.server.passthrough_errors:
+                raise
+            # 响应发送到一半出错时实际长度与 Content-Length 不符，不能再复用这个连接
+            self.close_connection = True
+            self.server.log('error', 'Error on request:\n%s', traceback.format_exc())
+            if not headers_sent:
+                try:
+                    execute(InternalServerError())
+                except Exception:
+                    pass
+
+    def log_error(self, format, *args):
+        # 长连接空闲超时是正常情况，不记录
+        if not self.waiting_idle:
+            super().log_error(format, *args)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    使用有界线程池的 WSGI 服务器：
+    所有线程都忙时暂停 accept，新连接在内核的 backlog 队列中等待，而不是无限制地创建线程
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=64, backlog=1024, keep_alive_timeout=5,
+                 keep_alive_requests=100, io_timeout=60, async_transfer_min_bytes=DEFAULT_MIN_BYTES,
+                 async_transfer_max=DEFAULT_MAX_TRANSFERS):
+        # server_activate() 中 listen() 使用此值
+        self.request_queue_size = backlog
+        self.threads = threads
+        self.keep_alive_timeout = keep_alive_timeout
+        self.keep_alive_requests = keep_alive_requests
+        self.io_timeout = io_timeout
+        self.async_transfer_min_bytes = async_transfer_min_bytes
+        self.transfer_engine = None
+        if async_transfer_min_bytes > 0:
+            self.transfer_engine = TransferEngine(async_transfer_max, io_timeout)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._executor = None
+        super().__init__(host, port, app, handler=ProductionRequestHandler)
+
+    def saturated(self):
+        with self._active_lock:
+            return self._active >= self.threads
+
+    def _get_executor(self):
+        # 线程池在首次处理请求时创建，多进程模式下每个子进程各自拥有
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='http-worker')
+        return self._executor
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        with self._active_lock:
+            self._active += 1
+        try:
+            self._get_executor().submit(self._process_request_thread, request, client_address)
+        except RuntimeError:
+            self._release_slot()
+            self.shutdown_request(request)
+
+    def _release_slot(self):
+        with self._active_lock:
+            self._active -= 1
+        self._slots.release()
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._release_slot()
+
+    def server_close(self):
+        super().server_close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self.transfer_engine is not None:
+            self.transfer_engine.stop()
+
+
+def _serve_workers(server, workers):
+    """
+    预先 fork 多个工作进程，共享父进程中已经 listen 的套接字，由内核在各进程间分配连接
+    父进程只负责在子进程退出时重新创建，收到 SIGTERM/SIGINT 时结束全部子进程
+    """
+    # 监听套接字设为非阻塞：多个进程同时被唤醒时，没抢到连接的进程 accept 立即返回
+    server.socket.setblocking(False)
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            # Ctrl+C 会发给整个进程组，由父进程统一处理；子进程收到 SIGTERM 后停止接受连接并退出
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM,
+                          lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+            try:
+                server.serve_forever()
+            finally:
+                # 跳过父进程的清理流程，但仍然执行 atexit（提交缓存等）
+                atexit._run_exitfuncs()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(0)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    print(f" * 已启动 {workers} 个工作进程: {', '.join(str(pid) for pid in children)}")
+    sys.stdout.flush()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"[警告] 工作进程 {pid} 退出（状态 {status}），{RESPAWN_DELAY} 秒后重新创建")
+            time.sleep(RESPAWN_DELAY)
+            spawn(index)
+    server.server_close()
+
+
+def effective_workers(settings):
+    """实际使用的进程数：开发模式和不支持 fork 的系统上总是 1"""
+    if settings['mode'] != 'production' or not hasattr(os, 'fork'):
+        return 1
+    return settings['workers']
+
+
+def serve(app, settings):
+    """按 production 设置启动服务器，阻塞直到退出"""
+    server = PooledWSGIServer(settings['host'], settings['port'], app,
+                              threads=settings['threads'],
+                              backlog=settings['backlog'],
+                              keep_alive_timeout=settings['keep_alive_timeout'],
+                              keep_alive_requests=settings['keep_alive_requests'],
+                              io_timeout=settings['io_timeout'],
+                              async_transfer_min_bytes=settings['async_transfer_min_bytes'],
+                              async_transfer_max=settings['async_transfer_max'])
+    workers = effective_workers(settings)
+    if workers < settings['workers']:
+        print("[警告] 当前系统不支持多进程模式，使用单进程")
+    print(f" * 生产模式: {workers} 个进程 × {settings['threads']} 个线程, backlog={settings['backlog']}, "
+          f"keep-alive={settings['keep_alive_timeout']}s")
+    sys.stdout.flush()
+    if workers > 1:
+        _serve_workers(server, workers)
+        return
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,211 @@
+# sqlite_browser.py
+import json
+import sqlite3
+import time
+from html import escape
+from urllib.parse import quote
+
+from preview_utils import page_link
+from tracing import traced
+
+
+# 每页显示的行数
+SQLITE_PAGE_ROWS = 100
+# 单个查询的最长执行时间（秒），超时后中断，避免大表占住工作线程
+QUERY_TIME_LIMIT = 2.0
+# 统计行数时每张表的时间上限，超时的表显示为"未知"
+COUNT_TIME_LIMIT = 0.5
+# 统计全部表行数的总时间上限，用完后其余的表不再统计
+COUNT_TOTAL_LIMIT = 1.0
+# 进度回调的调用间隔（虚拟机指令数）
+PROGRESS_INTERVAL = 10000
+# 单元格最多显示的字符数
+MAX_CELL_CHARS = 200
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def open_readonly(full_path):
+    """
+    以只读 + immutable 方式打开数据库：
+    不加锁、不创建 -wal/-shm 文件，也不会修改共享目录中的任何东西
+    """
+    uri = f'file:{quote(full_path)}?mode=ro&immutable=1'
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+def _run_limited(conn, sql, params=(), time_limit=QUERY_TIME_LIMIT):
+    """执行查询，超过时间上限时通过进度回调中断"""
+    deadline = time.monotonic() + time_limit
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_INTERVAL)
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'interrupted' in str(e):
+            raise QueryTimeout(f'查询超过 {time_limit} 秒，已中断')
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def list_tables(conn):
+    """列出表与视图，并在时间上限内统计行数（超时或总时间用完的表行数为 None）"""
+    rows = _run_limited(conn, "SELECT name, type FROM sqlite_master "
+                              "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY type, name")
+    deadline = time.monotonic() + COUNT_TOTAL_LIMIT
+    tables = []
+    for name, table_type in rows:
+        count = None
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            try:
+                count = _run_limited(conn, f'SELECT COUNT(*) FROM {_quote_identifier(name)}',
+                                     time_limit=min(COUNT_TIME_LIMIT, remaining))[0][0]
+            except (QueryTimeout, sqlite3.Error):
+                pass
+        tables.append({'name': name, 'type': table_type, 'count': count})
+    return tables
+
+
+def get_page_key(conn, table):
+    """
+    确定键集分页使用的列：普通表用 rowid，WITHOUT ROWID 表用主键列，视图返回 None（只显示首页）
+    返回可直接拼入 SQL 的键表达式列表
+    """
+    table_type = _run_limited(conn, 'SELECT type, sql FROM sqlite_master WHERE name = ?', (table,))
+    if not table_type or table_type[0][0] != 'table':
+        return None
+    create_sql = (table_type[0][1] or '').upper()
+    if 'WITHOUT ROWID' not in create_sql:
+        return ['rowid']
+    info = _run_limited(conn, f'PRAGMA table_info({_quote_identifier(table)})')
+    pk_columns = [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5] > 0]
+    return [_quote_identifier(c) for c in pk_columns] or None
+
+
+def fetch_page(conn, table, after=None, before=None, limit=SQLITE_PAGE_ROWS):
+    """
+    键集分页读取：WHERE (键) > (上一页最后一行的键) ORDER BY 键 LIMIT n
+    与 OFFSET 不同，翻到多深都只扫描一页的数据
+    返回 (列名, 行, 每行的键, 是否有上一页, 是否有下一页)
+    """
+    key = get_page_key(conn, table)
+    quoted = _quote_identifier(table)
+    if key is None:
+        cursor = conn.execute(f'SELECT * FROM {quoted} LIMIT 0')
+        columns = [d[0] for d in cursor.description]
+        rows = _run_limited(conn, f'SELECT * FROM {quoted} LIMIT ?', (limit + 1,))
+        return columns, rows[:limit], [None] * min(len(rows), limit), False, len(rows) > limit
+
+    key_expr = ', '.join(key)
+    key_tuple = f'({key_expr})' if len(key) > 1 else key_expr
+    placeholders = ', '.join('?' * len(key))
+    value_tuple = f'({placeholders})' if len(key) > 1 else placeholders
+    select = f'SELECT {key_expr}, * FROM {quoted}'
+
+    if before is not None:
+        desc_order = ', '.join(f'{k} DESC' for k in key)
+        sql = f'{select} WHERE {key_tuple} < {value_tuple} ORDER BY {desc_order} LIMIT ?'
+        rows = _run_limited(conn, sql, tuple(before) + (limit + 1,))
+        has_prev = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_next = True
+    else:
+        if after is not None:
+            sql = f'{select} WHERE {key_tuple} > {value_tuple} ORDER BY {key_expr} LIMIT ?'
+            rows = _run_limited(conn, sql, tuple(after) + (limit + 1,))
+        else:
+            rows = _run_limited(conn, f'{select} ORDER BY {key_expr} LIMIT ?', (limit + 1,))
+        has_prev = after is not None
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+    cursor = conn.execute(f'SELECT * FROM {quoted} LIMIT 0')
+    columns = [d[0] for d in cursor.description]
+    keys = [list(row[:len(key)]) for row in rows]
+    rows = [row[len(key):] for row in rows]
+    return columns, rows, keys, has_prev, has_next
+
+
+def _format_cell(value):
+    if value is None:
+        return '<span class="text-muted">NULL</span>'
+    if isinstance(value, bytes):
+        return f'<span class="text-muted">&lt;BLOB {len(value)} 字节&gt;</span>'
+    text = str(value)
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS] + '…'
+    return escape(text)
+
+
+def _dump_key(key):
+    """把键编码为 JSON 放进翻页链接，BLOB 值编码为 {"hex": 十六进制}"""
+    return json.dumps([{'hex': v.hex()} if isinstance(v, bytes) else v for v in key])
+
+
+def _parse_key(value):
+    """解析前端传回的键（_dump_key 生成的 JSON 列表）"""
+    if not value:
+        return None
+    try:
+        key = json.loads(value)
+        if not isinstance(key, list):
+            return None
+        return [bytes.fromhex(v['hex']) if isinstance(v, dict) else v for v in key]
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+@traced('preview.sqlite')
+def render_sqlite_preview(full_path, params=None):
+    """渲染 SQLite 数据库预览，params 可包含 sqlite_table、sqlite_after、sqlite_before"""
+    params = params or {}
+    try:
+        conn = open_readonly(full_path)
+    except sqlite3.Error as e:
+        return f'<div class="office-preview-info">无法打开数据库: {escape(str(e))}</div>'
+    try:
+        tables = list_tables(conn)
+        if not tables:
+            return '<div class="office-preview-info">数据库中没有表</div>'
+        names = [t['name'] for t in tables]
+        table = params.get('sqlite_table')
+        if table not in names:
+            table = names[0]
+
+        tabs = []
+        for t in tables:
+            label = f'{escape(t["name"])} ({t["count"] if t["count"] is not None else "?"})'
+            if t['name'] == table:
+                tabs.append(f'<span class="btn btn-sm btn-primary">{label}</span>')
+            else:
+                tabs.append(page_link(label, {'sqlite_table': t['name']}))
+        columns, rows, keys, has_prev, has_next = fetch_page(
+            conn, table, _parse_key(params.get('sqlite_after')), _parse_key(params.get('sqlite_before')))
+
+        header = ''.join(f'<th>{escape(c)}</th>' for c in columns)
+        body = ''.join('<tr>' + ''.join(f'<td>{_format_cell(v)}</td>' for v in row) + '</tr>' for row in rows)
+        nav = []
+        if has_prev and keys and keys[0] is not None:
+            nav.append(page_link('首页', {'sqlite_table': table}))
+            nav.append(page_link('上一页', {'sqlite_table': table, 'sqlite_before': _dump_key(keys[0])}))
+        if has_next and keys and keys[-1] is not None:
+            nav.append(page_link('下一页', {'sqlite_table': table, 'sqlite_after': _dump_key(keys[-1])}))
+        if keys and keys[0] is None and has_next:
+            nav.append('<span class="text-muted">视图只显示前 %d 行</span>' % SQLITE_PAGE_ROWS)
+        return (f'<div class="d-flex flex-wrap gap-2 mb-2 align-items-center">{"".join(tabs)}</div>'
+                f'<div class="table-responsive"><table class="table table-sm table-bordered office-sheet">'
+                f'<thead><tr>{header}</tr></thead><tbody>{body}</tbody></table></div>'
+                f'<div class="d-flex gap-2 my-2 align-items-center">{"".join(nav)}</div>')
+    except QueryTimeout as e:
+        return f'<div class="office-preview-info">{escape(str(e))}</div>'
+    except sqlite3.Error as e:
+        return f'<div class="office-preview-info">读取数据库失败: {escape(str(e))}</div>'
+    finally:
+        conn.close()
@@ -0,0 +1,138 @@
+# streaming.py
+from urllib.parse import quote
+
+from flask import request, Response
+from werkzeug.datastructures import ContentRange
+
+
+# 流式发送时每次读取的块大小
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def iter_file_range(path, start, length, chunk_size=STREAM_CHUNK_SIZE):
+    """按块读取文件的指定区间"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def content_disposition(filename, as_attachment):
+    """生成 Content-Disposition 头，非 ASCII 文件名使用 RFC 5987 编码"""
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+def send_virtual_file(read_range, size, mimetype=None, download_name=None, as_attachment=False,
+                      etag=None, last_modified=None, accept_ranges=True):
+    """
+    发送一个"虚拟文件"（压缩包成员、重排后的视频等），支持 Range 请求
+    read_range(start, length) 返回该区间字节块的可迭代对象
+    """
+    status = 200
+    start, length = 0, size
+
+    if accept_ranges and size is not None and request.range is not None:
+        # If-Range 与当前版本不一致时忽略 Range，返回完整内容
+        if 'If-Range' not in request.headers or (etag and request.if_range.etag == etag):
+            byte_range = request.range.range_for_length(size)
+            if byte_range is None:
+                response = Response(status=416)
+                response.content_range = ContentRange('bytes', None, None, size)
+                return response
+            start, stop = byte_range
+            length = stop - start
+            status = 206
+
+    response = Response(read_range(start, length), status=status, mimetype=mimetype or 'application/octet-stream',
+                        direct_passthrough=True)
+    if length is not None:
+        response.content_length = length
+    if status == 206:
+        response.content_range = ContentRange('bytes', start, start + length, size)
+    response.accept_ranges = 'bytes' if accept_ranges else 'none'
+    if download_name:
+        response.headers['Content-Disposition'] = content_disposition(download_name, as_attachment)
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    if status == 200:
+        # 处理 If-None-Match / If-Modified-Since，命中时返回 304
+        response = response.make_conditional(request)
+    return response
+
+
+# 请求在 WSGI environ 中登记的“响应体发送完”回调
+RESPONSE_CLOSE_CALLBACKS = 'yobboy.response_close_callbacks'
+
+
+class ResponseBody:
+    """
+    包装应用返回的最终响应体：统计实际发出的字节数，服务器关闭响应体（发送完或连接中断）时
+    依次调用登记的回调 callback(已发送字节数, 是否交给了事件循环异步发送)
+    """
+
+    def __init__(self, body, callbacks):
+        self.body = body
+        self.callbacks = callbacks
+        self.sent = 0
+        self.async_sent = False
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.sent += len(chunk)
+            yield chunk
+
+    def handed_off(self, length):
+        """响应体交给事件循环异步发送（见 server.py hand_off）：无法知道何时发完，按 Content-Length 计数"""
+        self.sent = length
+        self.async_sent = True
+
+    def close(self):
+        callbacks, self.callbacks = self.callbacks, []
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            for callback in callbacks:
+                try:
+                    callback(self.sent, self.async_sent)
+                except Exception as e:
+                    print(f"[警告] 响应结束回调出错: {e}")
+
+
+def on_response_close(callback):
+    """
+    登记在当前请求的响应体发送完后调用的 callback(已发送字节数, 是否异步发送)，应用需已调用 install_response_close
+    异步发送时回调在交出连接时就会执行，字节数为 Content-Length
+    """
+    request.environ.setdefault(RESPONSE_CLOSE_CALLBACKS, []).append(callback)
+
+
+def install_response_close(app):
+    """
+    在 WSGI 层包装响应体（重复调用无影响）：
+    Flask 的 teardown_request 在响应体发送之前就已执行，send_file 等直接透传的响应也不会触发
+    response.call_on_close，只有包装最终的响应体才能得到发送完成的时刻和实际发送的字节数
+    """
+    if 'response_close' in app.extensions:
+        return
+    app.extensions['response_close'] = True
+    wsgi_app = app.wsgi_app
+
+    def wsgi_app_with_close(environ, start_response):
+        body = wsgi_app(environ, start_response)
+        callbacks = environ.get(RESPONSE_CLOSE_CALLBACKS)
+        return ResponseBody(body, callbacks) if callbacks else body
+
+    app.wsgi_app = wsgi_app_with_close
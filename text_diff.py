@@ -0,0 +1,414 @@
+# text_diff.py
+import time
+from array import array
+from html import escape
+
+from file_cache import FileCache, file_signature
+from file_types import detect_file_type
+from preview_utils import page_link
+from tracing import traced
+
+
+# 每隔多少行记录一次行首偏移，读取任意行时从最近的记录点向后跳
+LINE_CHECKPOINT = 1024
+# 差异上下文行数
+DIFF_CONTEXT = 3
+# 单次对比允许的最大编辑距离，超过后把剩余区间整体视为替换
+MAX_EDIT_DISTANCE = 20000
+# 单次对比的时间上限（秒），超时后同样整体视为替换
+DIFF_TIME_LIMIT = 10.0
+# 预览区每页大约显示的差异行数
+DIFF_PAGE_LINES = 500
+# 预览区中单行最多显示的字符数
+MAX_LINE_CHARS = 2000
+
+diff_cache = FileCache('text_diff', max_entries=16)
+
+
+def scan_lines(full_path):
+    """
+    顺序读取文件，只保留每行的哈希值和稀疏的行首偏移
+    500 MB 的文件也不会把文本读入内存
+    """
+    hashes = array('q')
+    checkpoints = array('Q')
+    offset = 0
+    with open(full_path, 'rb') as f:
+        for line in f:
+            if len(hashes) % LINE_CHECKPOINT == 0:
+                checkpoints.append(offset)
+            hashes.append(hash(line.rstrip(b'\r\n')))
+            offset += len(line)
+    return hashes, checkpoints
+
+
+def _bisect(a, a_lo, a_hi, b, b_lo, b_hi, deadline):
+    """
+    Myers 算法的线性空间版本：从两端同时搜索，找到中间蛇形路径后返回分割点 (x, y)
+    编辑距离超过 MAX_EDIT_DISTANCE 或超时时返回 None
+    """
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    max_d = min((n + m + 1) // 2, MAX_EDIT_DISTANCE)
+    v_offset = max_d + 1
+    v_length = 2 * v_offset + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d):
+        if d % 64 == 0 and time.monotonic() > deadline:
+            return None
+        # 正向搜索
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return x1, y1
+        # 反向搜索
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a_hi - x2 - 1] == b[b_hi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = v_offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return x1, y1
+    return None
+
+
+def diff_sequences(a, b, time_limit=DIFF_TIME_LIMIT):
+    """
+    对两个哈希序列求差异，返回与 difflib 相同格式的操作码:
+    [(tag, a起, a止, b起, b止)]，tag 为 equal/replace/delete/insert
+    """
+    deadline = time.monotonic() + time_limit
+    raw = []
+    # 用显式栈代替递归，区间按从前到后的顺序处理
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] == 'suffix':
+            # 公共后缀在前后两半都处理完之后输出
+            raw.append(('equal',) + item[1:])
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+        # 去掉公共前缀与后缀
+        start_a, start_b = a_lo, b_lo
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        if a_lo > start_a:
+            raw.append(('equal', start_a, a_lo, start_b, b_lo))
+        end_a, end_b = a_hi, b_hi
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+        suffix = ('equal', a_hi, end_a, b_hi, end_b) if a_hi < end_a else None
+
+        if a_lo == a_hi or b_lo == b_hi:
+            if a_lo < a_hi:
+                raw.append(('delete', a_lo, a_hi, b_lo, b_lo))
+            if b_lo < b_hi:
+                raw.append(('insert', a_lo, a_lo, b_lo, b_hi))
+            if suffix:
+                raw.append(suffix)
+            continue
+
+        split = _bisect(a, a_lo, a_hi, b, b_lo, b_hi, deadline)
+        if split is None:
+            raw.append(('delete', a_lo, a_hi, b_lo, b_lo))
+            raw.append(('insert', a_hi, a_hi, b_lo, b_hi))
+            if suffix:
+                raw.append(suffix)
+            continue
+        x, y = split
+        # 后压入的先处理：前半段 -> 后半段 -> 公共后缀
+        if suffix:
+            stack.append(('suffix',) + suffix[1:])
+        stack.append((a_lo + x, a_hi, b_lo + y, b_hi))
+        stack.append((a_lo, a_lo + x, b_lo, b_lo + y))
+    return _merge_opcodes(raw)
+
+
+def _merge_opcodes(raw):
+    """合并相邻的同类操作，相邻的删除与插入合并为替换"""
+    merged = []
+    for tag, a_lo, a_hi, b_lo, b_hi in raw:
+        if a_lo == a_hi and b_lo == b_hi:
+            continue
+        if merged:
+            last_tag, la_lo, la_hi, lb_lo, lb_hi = merged[-1]
+            if last_tag == tag or (last_tag != 'equal' and tag != 'equal'):
+                new_tag = tag if last_tag == tag else 'replace'
+                merged[-1] = (new_tag, la_lo, a_hi, lb_lo, b_hi)
+                continue
+        merged.append((tag, a_lo, a_hi, b_lo, b_hi))
+    return merged
+
+
+def group_opcodes(opcodes, n=DIFF_CONTEXT):
+    """按上下文行数把操作码分组为差异块（与 difflib.SequenceMatcher.get_grouped_opcodes 相同）"""
+    codes = list(opcodes)
+    if not codes:
+        return []
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > n * 2:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return groups
+
+
+def compute_diff(a_path, b_path):
+    """计算两个文件的差异块，按两个文件的 inode/大小/mtime 缓存"""
+    def compute():
+        a_hashes, a_checkpoints = scan_lines(a_path)
+        b_hashes, b_checkpoints = scan_lines(b_path)
+        hunks = group_opcodes(diff_sequences(a_hashes, b_hashes))
+        # 按输出行数分页，记录每页的第一个差异块
+        pages = [0]
+        lines = 0
+        for i, hunk in enumerate(hunks):
+            if lines >= DIFF_PAGE_LINES:
+                pages.append(i)
+                lines = 0
+            lines += sum(max(i2 - i1, j2 - j1) for _, i1, i2, j1, j2 in hunk)
+        return {
+            'hunks': hunks,
+            'pages': pages,
+            'a_lines': len(a_hashes),
+            'b_lines': len(b_hashes),
+            'a_checkpoints': a_checkpoints,
+            'b_checkpoints': b_checkpoints,
+        }
+    return diff_cache.get_or_compute(a_path, compute, key=(b_path, file_signature(b_path)))
+
+
+class LineReader:
+    """按行号读取文件：向后读取时顺序跳过，其余情况从最近的行首偏移记录点开始"""
+
+    def __init__(self, full_path, checkpoints):
+        self.file = open(full_path, 'rb')
+        self.checkpoints = checkpoints
+        self.line = 0
+        self.encoding = detect_file_type(full_path).get('encoding') or 'utf-8'
+
+    def read(self, lo, hi):
+        if lo < self.line or lo - self.line > LINE_CHECKPOINT:
+            index = lo // LINE_CHECKPOINT
+            self.file.seek(self.checkpoints[index])
+            self.line = index * LINE_CHECKPOINT
+        while self.line < lo:
+            self.file.readline()
+            self.line += 1
+        lines = []
+        while self.line < hi:
+            lines.append(self.file.readline().rstrip(b'\r\n').decode(self.encoding, errors='replace'))
+            self.line += 1
+        return lines
+
+    def close(self):
+        self.file.close()
+
+
+def _hunk_header(hunk):
+    first, last = hunk[0], hunk[-1]
+    a_start, a_len = first[1], last[2] - first[1]
+    b_start, b_len = first[3], last[4] - first[3]
+    return f'@@ -{a_start + 1 if a_len else a_start},{a_len} +{b_start + 1 if b_len else b_start},{b_len} @@'
+
+
+def _iter_hunk_rows(hunk, a_reader, b_reader, paired=True):
+    """
+    逐行产出 (标记, 左侧行, 右侧行)，标记为 ' '、'-'、'+' 或 '!'（替换）
+    paired 为 False（统一格式）时替换块不成对输出，而是先输出全部 '-' 行再输出全部 '+' 行
+    """
+    for tag, i1, i2, j1, j2 in hunk:
+        if tag == 'equal':
+            for line in a_reader.read(i1, i2):
+                yield ' ', line, line
+        elif tag == 'delete':
+            for line in a_reader.read(i1, i2):
+                yield '-', line, None
+        elif tag == 'insert':
+            for line in b_reader.read(j1, j2):
+                yield '+', None, line
+        else:
+            left = a_reader.read(i1, i2)
+            right = b_reader.read(j1, j2)
+            if not paired:
+                for line in left:
+                    yield '-', line, None
+                for line in right:
+                    yield '+', None, line
+                continue
+            for k in range(max(len(left), len(right))):
+                yield '!', left[k] if k < len(left) else None, right[k] if k < len(right) else None
+
+
+def iter_diff_text(a_path, b_path, a_label, b_label, mode='unified', width=80):
+    """流式生成完整的差异文本（unified 或 side 并排）"""
+    result = compute_diff(a_path, b_path)
+    a_reader = LineReader(a_path, result['a_checkpoints'])
+    b_reader = LineReader(b_path, result['b_checkpoints'])
+    try:
+        yield f'--- {a_label}\n+++ {b_label}\n'
+        for hunk in result['hunks']:
+            yield _hunk_header(hunk) + '\n'
+            chunk = []
+            for mark, left, right in _iter_hunk_rows(hunk, a_reader, b_reader, paired=mode == 'side'):
+                if mode == 'side':
+                    left_text = (left or '').expandtabs()[:width].ljust(width)
+                    sep = {' ': ' ', '-': '<', '+': '>', '!': '|'}[mark]
+                    chunk.append(f'{left_text} {sep} {right or ""}\n')
+                else:
+                    chunk.append(f'{mark}{left if mark != "+" else right}\n')
+                if len(chunk) >= 1000:
+                    yield ''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield ''.join(chunk)
+    finally:
+        a_reader.close()
+        b_reader.close()
+
+
+def _cell(text):
+    if text is None:
+        return ''
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + '…'
+    return escape(text)
+
+
+@traced('preview.diff')
+def render_diff_page(a_path, b_path, b_rel_path, download_url, params=None):
+    """渲染预览区中的一页差异，params 可包含 diff_page、diff_mode；download_url 为完整差异的流式下载地址"""
+    params = params or {}
+    try:
+        page = max(int(params.get('diff_page', 0)), 0)
+    except (TypeError, ValueError):
+        page = 0
+    mode = 'side' if params.get('diff_mode') == 'side' else 'unified'
+
+    result = compute_diff(a_path, b_path)
+    hunks, pages = result['hunks'], result['pages']
+    if not hunks:
+        return '<div class="office-preview-info">两个文件内容相同</div>'
+    page = min(page, len(pages) - 1)
+    end = pages[page + 1] if page + 1 < len(pages) else len(hunks)
+
+    a_reader = LineReader(a_path, result['a_checkpoints'])
+    b_reader = LineReader(b_path, result['b_checkpoints'])
+    rows = []
+    truncated = False
+    try:
+        for hunk in hunks[pages[page]:end]:
+            if len(rows) >= DIFF_PAGE_LINES * 4:
+                # 单个差异块过大（如两个文件完全不同）时只显示开头部分
+                truncated = True
+                break
+            rows.append(f'<tr class="diff-hunk"><td colspan="4">{escape(_hunk_header(hunk))}</td></tr>')
+            first = hunk[0]
+            a_no, b_no = first[1], first[3]
+            for mark, left, right in _iter_hunk_rows(hunk, a_reader, b_reader, paired=mode == 'side'):
+                if len(rows) >= DIFF_PAGE_LINES * 4:
+                    truncated = True
+                    break
+                a_num = a_no + 1 if left is not None else ''
+                b_num = b_no + 1 if right is not None else ''
+                a_no += left is not None
+                b_no += right is not None
+                if mode == 'side':
+                    left_cls = 'diff-del' if mark in '-!' and left is not None else ''
+                    right_cls = 'diff-add' if mark in '+!' and right is not None else ''
+                    rows.append(f'<tr><td class="diff-num">{a_num}</td><td class="{left_cls}">{_cell(left)}</td>'
+                                f'<td class="diff-num">{b_num}</td><td class="{right_cls}">{_cell(right)}</td></tr>')
+                else:
+                    if mark == '-':
+                        rows.append(f'<tr><td class="diff-num">{a_num}</td><td class="diff-num"></td>'
+                                    f'<td class="diff-del" colspan="2">-{_cell(left)}</td></tr>')
+                    elif mark == '+':
+                        rows.append(f'<tr><td class="diff-num"></td><td class="diff-num">{b_num}</td>'
+                                    f'<td class="diff-add" colspan="2">+{_cell(right)}</td></tr>')
+                    else:
+                        rows.append(f'<tr><td class="diff-num">{a_num}</td><td class="diff-num">{b_num}</td>'
+                                    f'<td colspan="2"> {_cell(left)}</td></tr>')
+    finally:
+        a_reader.close()
+        b_reader.close()
+
+    if truncated:
+        rows.append('<tr class="diff-hunk"><td colspan="4">本页差异过多，只显示前面部分，完整内容请下载差异文件</td></tr>')
+
+    base = {'diff_with': b_rel_path, 'diff_mode': mode}
+    nav = []
+    if page > 0:
+        nav.append(page_link('上一页', dict(base, diff_page=page - 1)))
+    if page + 1 < len(pages):
+        nav.append(page_link('下一页', dict(base, diff_page=page + 1)))
+    other_mode = 'unified' if mode == 'side' else 'side'
+    nav.append(page_link('并排显示' if other_mode == 'side' else '统一格式',
+                         dict(base, diff_mode=other_mode, diff_page=page)))
+    info = (f'<span class="text-muted ms-2">共 {len(hunks)} 处差异，第 {page + 1}/{len(pages)} 页，'
+            f'{result["a_lines"]} 行 → {result["b_lines"]} 行</span>')
+    nav.append(f'<a class="btn btn-sm btn-outline-secondary" href="{escape(download_url, quote=True)}" target="_blank">完整差异</a>')
+    nav_html = f'<div class="d-flex gap-2 my-2 align-items-center">{"".join(nav)}{info}</div>'
+    return (f'{nav_html}<div class="table-responsive"><table class="diff-table">{"".join(rows)}</table></div>'
+            f'{nav_html}')
+
+
+def diff_form():
+    """文本预览上方的"与其他文件比较"表单"""
+    return (
+        '<form class="preview-param-form d-flex flex-wrap gap-2 my-2">'
+        '<input class="form-control form-control-sm" style="max-width: 360px" name="diff_with" '
+        'placeholder="与其他文件比较（相对根目录的路径）">'
+        '<button class="btn btn-sm btn-outline-primary" type="submit">比较</button>'
+        '</form>'
+    )
@@ -0,0 +1,186 @@
+# block_delta_client.py
+"""
+增量下载客户端（参考实现）：用本地旧版本文件加上服务器返回的差异块重建新版本
+
+原理与 zsync 相同：
+1. 从 /block_signature 获取新文件每一块的弱校验和（rsync 滚动校验和）与强校验和
+2. 在本地旧文件的每个字节偏移上滚动计算弱校验和，命中后再用强校验和确认，找出本地已有的块
+3. 只通过 /block_delta 下载缺少的块，按顺序拼出新文件，并用 SHA-256 校验（服务器提供时）
+
+用法：
+    python block_delta_client.py --server http://192.168.1.10:5000 --password 密码 远程路径 本地文件 [-o 输出文件]
+不指定 -o 时直接更新本地文件。依赖 NumPy（服务器端同样需要）。
+"""
+import argparse
+import base64
+import hashlib
+import http.cookiejar
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+
+
+# 每次处理的旧文件字节数（另加一块的重叠），控制前缀和数组的内存占用
+SCAN_CHUNK = 4 * 1024 * 1024
+# 与服务器 block_delta.py 保持一致
+STRONG_BYTES = 8
+
+
+def strong_checksum(data):
+    return hashlib.blake2b(data, digest_size=STRONG_BYTES).digest()
+
+
+def rolling_weak(window_data, block_size):
+    """
+    计算 window_data 中每个起点（需有完整的一块）的 rsync 弱校验和
+    用前缀和一次算出所有偏移：a_k = S[k+L]-S[k]，b_k = (L+k)·a_k - (T[k+L]-T[k])
+    其中 S 为字节前缀和，T 为 j·x_j 的前缀和；只需要低 16 位，uint32 溢出回绕不影响结果
+    """
+    x = np.frombuffer(window_data, dtype=np.uint8).astype(np.uint32)
+    n = len(x) - block_size + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint32)
+    zero = np.zeros(1, dtype=np.uint32)
+    s = np.concatenate((zero, np.cumsum(x, dtype=np.uint32)))
+    t = np.concatenate((zero, np.cumsum(x * np.arange(len(x), dtype=np.uint32), dtype=np.uint32)))
+    k = np.arange(block_size, block_size + n, dtype=np.uint32)
+    a = s[block_size:block_size + n] - s[:n]
+    b = k * a - (t[block_size:block_size + n] - t[:n])
+    return ((b & 0xFFFF) << 16) | (a & 0xFFFF)
+
+
+def find_local_blocks(old_path, weak, strong, block_size, block_count, file_size):
+    """返回 {块序号: 旧文件中的偏移}，即本地已经有的块"""
+    found = {}
+    if not os.path.exists(old_path):
+        return found
+    # 最后一块不足整块时服务器补零计算，本地无法匹配，总是下载
+    full_blocks = block_count if file_size % block_size == 0 else block_count - 1
+    by_weak = defaultdict(list)
+    for index in range(full_blocks):
+        by_weak[int(weak[index])].append(index)
+    # 以弱校验和的低 24 位建一张 16 MB 的布尔表做初筛，比对每个偏移做集合查找快得多
+    table = np.zeros(1 << 24, dtype=bool)
+    table[np.fromiter(by_weak.keys(), dtype=np.uint32) & 0xFFFFFF] = True
+
+    with open(old_path, 'rb') as f:
+        base = 0
+        while len(found) < full_blocks:
+            f.seek(base)
+            data = f.read(SCAN_CHUNK + block_size - 1)
+            if len(data) < block_size:
+                break
+            values = rolling_weak(data, block_size)
+            for k in np.nonzero(table[values & 0xFFFFFF])[0]:
+                candidates = [i for i in by_weak.get(int(values[k]), ()) if i not in found]
+                if not candidates:
+                    continue
+                digest = strong_checksum(data[k:k + block_size])
+                for index in candidates:
+                    if strong[index] == digest:
+                        found[index] = base + int(k)
+            base += SCAN_CHUNK
+    return found
+
+
+def missing_ranges(found, block_count):
+    """把缺少的块合并为 [起始块, 结束块) 区间"""
+    ranges = []
+    for index in range(block_count):
+        if index in found:
+            continue
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+
+def read_exact(stream, length):
+    chunks = []
+    while length > 0:
+        data = stream.read(min(length, 1024 * 1024))
+        if not data:
+            raise IOError('差异数据提前结束')
+        chunks.append(data)
+        length -= len(data)
+    return b''.join(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从文件服务器增量下载文件')
+    parser.add_argument('--server', required=True, help='服务器地址，例如 http://127.0.0.1:5000')
+    parser.add_argument('--password', required=True, help='登录密码')
+    parser.add_argument('remote', help='文件在服务器上相对根目录的路径')
+    parser.add_argument('local', help='本地旧版本文件（不存在时相当于完整下载）')
+    parser.add_argument('-o', '--output', help='输出文件，默认覆盖本地文件')
+    args = parser.parse_args()
+
+    server = args.server.rstrip('/')
+    remote = urllib.parse.quote(args.remote.strip('/'))
+    output = args.output or args.local
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(server + '/login', urllib.parse.urlencode({'password': args.password}).encode())
+
+    started = time.time()
+    with opener.open(f'{server}/block_signature/{remote}') as response:
+        headers = response.headers
+        signature = response.read()
+    block_size = int(headers['X-Block-Size'])
+    block_count = int(headers['X-Block-Count'])
+    record_size = int(headers['X-Record-Size'])
+    file_size = int(headers['X-File-Size'])
+    version = headers['X-File-Version']
+    records = np.frombuffer(signature, dtype=np.uint8).reshape(-1, record_size)
+    weak = records[:, :4].copy().view('>u4').reshape(-1)
+    strong = [bytes(r[4:]) for r in records]
+
+    found = find_local_blocks(args.local, weak, strong, block_size, block_count, file_size)
+    ranges = missing_ranges(found, block_count)
+
+    tmp_path = output + '.part'
+    sha256 = hashlib.sha256()
+    downloaded = 0
+    request = urllib.request.Request(f'{server}/block_delta/{remote}',
+                                     data=json.dumps({'version': version, 'ranges': ranges}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with opener.open(request) as delta, open(tmp_path, 'wb') as out:
+        old = open(args.local, 'rb') if found else None
+        try:
+            for index in range(block_count):
+                length = min(block_size, file_size - index * block_size)
+                if index in found:
+                    old.seek(found[index])
+                    data = old.read(length)
+                else:
+                    data = read_exact(delta, length)
+                    downloaded += length
+                sha256.update(data)
+                out.write(data)
+        finally:
+            if old is not None:
+                old.close()
+
+    # 服务器已缓存摘要时校验重建结果
+    expected = headers.get('Repr-Digest')
+    if expected:
+        actual = 'sha-256=:' + base64.b64encode(sha256.digest()).decode('ascii') + ':'
+        if actual != expected:
+            os.unlink(tmp_path)
+            print('校验失败：重建的文件与服务器不一致', file=sys.stderr)
+            sys.exit(1)
+    os.replace(tmp_path, output)
+
+    reused = file_size - downloaded
+    print(f'完成：{file_size} 字节，复用本地 {reused} 字节，下载 {downloaded} 字节'
+          f'（另加签名 {len(signature)} 字节），用时 {time.time() - started:.1f} 秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# tracing.py
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import before_render_template, request, template_rendered
+
+
+# 环形缓冲区保留的最近请求数
+DEFAULT_BUFFER_SIZE = 200
+# 单个请求最多记录的 span 数，超出后只计数不记录
+MAX_SPANS_PER_TRACE = 2000
+SERVICE_NAME = 'yobboy-file-server'
+
+_local = threading.local()
+
+
+class Trace:
+    """一个请求的跟踪记录：span 按开始顺序保存，时间为相对请求开始的秒数"""
+
+    __slots__ = ('trace_id', 'method', 'path', 'endpoint', 'status', 'started_wall', 'started',
+                 'duration', 'spans', 'dropped', 'thread_id', '_stack')
+
+    def __init__(self, method, path, endpoint):
+        self.trace_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.status = None
+        self.started_wall = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        # 每个 span 为 [名称, 开始, 结束, 层级, span_id, 父 span_id, 属性]
+        self.spans = []
+        self.dropped = 0
+        self.thread_id = threading.get_ident()
+        self._stack = []
+
+    def start_span(self, name, attrs):
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return None
+        parent = self._stack[-1][4] if self._stack else None
+        record = [name, time.perf_counter() - self.started, None, len(self._stack),
+                  uuid.uuid4().hex[:16], parent, attrs]
+        self.spans.append(record)
+        self._stack.append(record)
+        return record
+
+    def end_span(self, record):
+        if record is None:
+            return
+        record[2] = time.perf_counter() - self.started
+        # 正常情况下就是栈顶；异常跳出时把更内层未结束的一并结束
+        while self._stack:
+            top = self._stack.pop()
+            if top[2] is None:
+                top[2] = record[2]
+            if top is record:
+                break
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'method': self.method,
+            'path': self.path,
+            'endpoint': self.endpoint,
+            'status': self.status,
+            'started': self.started_wall,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'dropped_spans': self.dropped,
+            'spans': [{'name': name, 'start_ms': round(start * 1000, 3),
+                       'duration_ms': round(((end or start) - start) * 1000, 3),
+                       'depth': depth, 'attributes': attrs}
+                      for name, start, end, depth, _, _, attrs in self.spans],
+        }
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'attrs', 'record')
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.record = self.trace.start_span(self.name, self.attrs)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.record is not None:
+            self.record[6] = dict(self.record[6], error=exc_type.__name__)
+        self.trace.end_span(self.record)
+        return False
+
+
+class _NullSpan:
+    """当前线程没有正在跟踪的请求时使用，进入和退出都不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def span(name, **attrs):
+    """记录一段耗时：with span('fs.scandir', path=...): ...；不在请求中（或请求未跟踪）时开销可以忽略"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, attrs)
+
+
+def traced(name):
+    """函数装饰器，把整个函数调用记录为一个 span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = getattr(_local, 'trace', None)
+            if trace is None:
+                return func(*args, **kwargs)
+            with _Span(trace, name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceBuffer:
+    """保存最近完成的请求跟踪（本进程），供慢请求页面和导出使用"""
+
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def resize(self, size):
+        with self._lock:
+            self._traces = deque(self._traces, maxlen=size)
+
+    def add(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def list(self, min_ms=0.0, limit=None):
+        """按耗时从长到短返回"""
+        with self._lock:
+            traces = list(self._traces)
+        traces = [t for t in traces if (t.duration or 0) * 1000 >= min_ms]
+        traces.sort(key=lambda t: t.duration or 0, reverse=True)
+        return traces[:limit] if limit else traces
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self._traces:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+
+trace_buffer = TraceBuffer()
+
+
+def to_chrome_trace(traces):
+    """Chrome trace 事件格式（chrome://tracing、Perfetto 可直接打开），每个请求一条根事件"""
+    pid = os.getpid()
+    events = []
+    for trace in traces:
+        base_us = trace.started_wall * 1e6
+        events.append({'name': f'{trace.method} {trace.path}', 'cat': 'request', 'ph': 'X',
+                       'ts': base_us, 'dur': (trace.duration or 0) * 1e6, 'pid': pid, 'tid': trace.thread_id,
+                       'args': {'trace_id': trace.trace_id, 'endpoint': trace.endpoint, 'status': trace.status}})
+        for name, start, end, depth, _, _, attrs in trace.spans:
+            events.append({'name': name, 'cat': name.split('.', 1)[0], 'ph': 'X',
+                           'ts': base_us + start * 1e6, 'dur': ((end or start) - start) * 1e6,
+                           'pid': pid, 'tid': trace.thread_id, 'args': attrs})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def _otlp_attributes(attrs):
+    result = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            result.append({'key': key, 'value': {'boolValue': value}})
+        elif isinstance(value, int):
+            result.append({'key': key, 'value': {'intValue': str(value)}})
+        elif isinstance(value, float):
+            result.append({'key': key, 'value': {'doubleValue': value}})
+        else:
+            result.append({'key': key, 'value': {'stringValue': str(value)}})
+    return result
+
+
+def to_otlp(traces):
+    """OTLP/JSON（ExportTraceServiceRequest）格式，可发送给 OpenTelemetry Collector 的 /v1/traces"""
+    spans = []
+    for trace in traces:
+        base_ns = int(trace.started_wall * 1e9)
+        root_id = trace.trace_id[:16]
+        spans.append({
+            'traceId': trace.trace_id,
+            'spanId': root_id,
+            'name': f'{trace.method} {trace.endpoint}',
+            'kind': 2,
+            'startTimeUnixNano': str(base_ns),
+            'endTimeUnixNano': str(base_ns + int((trace.duration or 0) * 1e9)),
+            'attributes': _otlp_attributes({'http.request.method': trace.method, 'url.path': trace.path,
+                                            'http.response.status_code': trace.status or 0}),
+        })
+        for name, start, end, _, span_id, parent, attrs in trace.spans:
+            spans.append({
+                'traceId': trace.trace_id,
+                'spanId': span_id,
+                'parentSpanId': parent or root_id,
+                'name': name,
+                'kind': 1,
+                'startTimeUnixNano': str(base_ns + int(start * 1e9)),
+                'endTimeUnixNano': str(base_ns + int((end or start) * 1e9)),
+                'attributes': _otlp_attributes(attrs),
+            })
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME, 'process.pid': os.getpid()})},
+        'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}],
+    }]}
+
+
+def init_app(app, skip_endpoints=()):
+    """
+    注册请求钩子：每个请求开始时创建跟踪，请求上下文结束时放入环形缓冲区
+    （普通流式响应的请求上下文在响应体发送前就已结束，只有 stream_with_context 的响应包含发送响应体的耗时）
+    模板渲染通过 Flask 信号自动记录；skip_endpoints 中的端点（静态资源、跟踪页面本身）不跟踪
+    """
+
+    @app.before_request
+    def start_trace():
+        _local.trace = None
+        if not app.config.get('TRACE_BUFFER_SIZE', DEFAULT_BUFFER_SIZE):
+            return
+        if request.endpoint in skip_endpoints:
+            return
+        _local.trace = Trace(request.method, request.path, request.endpoint or 'none')
+
+    @app.after_request
+    def record_trace_status(response):
+        trace = current_trace()
+        if trace is not None:
+            trace.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        trace = current_trace()
+        _local.trace = None
+        if trace is None:
+            return
+        if trace._stack:
+            # 渲染出错时收不到 template_rendered 信号，仍未结束的 span 在这里结束并标记错误
+            for record in trace._stack:
+                record[6] = dict(record[6], error=type(exc).__name__ if exc else 'unfinished')
+            trace.end_span(trace._stack[0])
+        trace.duration = time.perf_counter() - trace.started
+        trace_buffer.add(trace)
+
+    def template_started(sender, template, context, **extra):
+        trace = current_trace()
+        if trace is not None:
+            trace.start_span('template.render', {'template': template.name})
+
+    def template_finished(sender, template, context, **extra):
+        trace = current_trace()
+        if trace is not None and trace._stack and trace._stack[-1][0] == 'template.render':
+            trace.end_span(trace._stack[-1])
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
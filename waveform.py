@@ -0,0 +1,190 @@
+# waveform.py
+import base64
+import os
+import shutil
+import struct
+import subprocess
+
+import numpy as np
+
+from file_cache import PersistentFileCache
+from tracing import traced
+
+
+# 预先计算的缩放级别（每个级别的峰值对数），前端按画布宽度选择最接近的级别
+WAVEFORM_LEVELS = [512, 2048, 8192]
+# 每次处理的峰值个数，控制 NumPy 临时数组的内存占用
+BINS_PER_SLAB = 256
+# ffmpeg 解码时的采样率与每个块的采样数（用于非 WAV 格式）
+FFMPEG_SAMPLE_RATE = 8000
+FFMPEG_BLOCK = 64
+
+waveform_cache = PersistentFileCache('waveform', max_memory_entries=256)
+
+
+def read_wav_layout(full_path):
+    """读取 WAV 的格式与 data 块位置，返回 dict；不支持的格式返回 None"""
+    file_size = os.path.getsize(full_path)
+    layout = {}
+    with open(full_path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+        pos = 12
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            if chunk_id == b'fmt ':
+                fmt = f.read(min(chunk_size, 40))
+                audio_format, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+                if audio_format == 0xFFFE and len(fmt) >= 26:
+                    # WAVE_FORMAT_EXTENSIBLE：真实格式在子格式 GUID 的前两个字节
+                    audio_format = struct.unpack('<H', fmt[24:26])[0]
+                layout.update({'format': audio_format, 'channels': channels, 'sample_rate': sample_rate,
+                               'block_align': block_align, 'bits': bits})
+            elif chunk_id == b'data':
+                layout['data_offset'] = pos + 8
+                layout['data_size'] = min(chunk_size, file_size - pos - 8)
+                break
+            pos += 8 + chunk_size + (chunk_size & 1)
+    if 'data_offset' not in layout or 'format' not in layout or not layout['channels']:
+        return None
+    if (layout['format'], layout['bits']) not in ((1, 8), (1, 16), (1, 24), (1, 32), (3, 32), (3, 64)):
+        return None
+    return layout
+
+
+def _to_float(raw, layout):
+    """把一段原始 PCM 字节转换为 [-1, 1] 的浮点数组（形状：帧数 × 声道数）"""
+    bits, channels = layout['bits'], layout['channels']
+    if layout['format'] == 3:
+        samples = raw.view('<f4' if bits == 32 else '<f8').astype(np.float32)
+    elif bits == 8:
+        samples = (raw.astype(np.float32) - 128) / 128
+    elif bits == 16:
+        samples = raw.view('<i2').astype(np.float32) / 32768
+    elif bits == 24:
+        # 24 位没有对应的 dtype，补一个低字节后按 32 位整数解释
+        triples = raw.reshape(-1, 3)
+        padded = np.zeros((len(triples), 4), dtype=np.uint8)
+        padded[:, 1:] = triples
+        samples = padded.view('<i4').reshape(-1).astype(np.float32) / 2147483648
+    else:
+        samples = raw.view('<i4').astype(np.float32) / 2147483648
+    return samples.reshape(-1, channels)
+
+
+def wav_peaks(full_path, bins):
+    """
+    用 NumPy 对 WAV 采样帧做向量化的分段最小/最大值计算
+    文件通过 memmap 映射，按块处理，不会一次性读入整个文件
+    返回 (mins, maxs, 时长秒)
+    """
+    layout = read_wav_layout(full_path)
+    if layout is None:
+        return None
+    block_align = layout['block_align'] or layout['channels'] * layout['bits'] // 8
+    total_frames = layout['data_size'] // block_align
+    if total_frames == 0:
+        return np.zeros(0), np.zeros(0), 0.0
+    data = np.memmap(full_path, dtype=np.uint8, mode='r', offset=layout['data_offset'],
+                     shape=(total_frames * block_align,))
+    bins = min(bins, total_frames)
+    # 每个峰值覆盖的帧数，最后一段可能不足
+    edges = np.linspace(0, total_frames, bins + 1).astype(np.int64)
+    mins = np.empty(bins, dtype=np.float32)
+    maxs = np.empty(bins, dtype=np.float32)
+    for start in range(0, bins, BINS_PER_SLAB):
+        stop = min(start + BINS_PER_SLAB, bins)
+        first, last = edges[start], edges[stop]
+        frames = _to_float(np.asarray(data[first * block_align:last * block_align]), layout)
+        # 多声道取各声道的包络
+        frame_max = frames.max(axis=1)
+        frame_min = frames.min(axis=1)
+        offsets = edges[start:stop] - first
+        maxs[start:stop] = np.maximum.reduceat(frame_max, offsets)
+        mins[start:stop] = np.minimum.reduceat(frame_min, offsets)
+    del data
+    return mins, maxs, total_frames / layout['sample_rate']
+
+
+def ffmpeg_peaks(full_path, bins):
+    """其他格式交给 ffmpeg 解码为 8kHz 单声道 PCM，边读边计算块峰值；没有 ffmpeg 时返回 None"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    command = [ffmpeg, '-v', 'error', '-i', full_path, '-vn', '-ac', '1', '-ar', str(FFMPEG_SAMPLE_RATE),
+               '-f', 's16le', '-']
+    block_bytes = FFMPEG_BLOCK * 2
+    block_mins, block_maxs = [], []
+    total_samples = 0
+    pending = b''
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as proc:
+        while True:
+            chunk = proc.stdout.read(block_bytes * 4096)
+            if not chunk:
+                break
+            chunk = pending + chunk
+            usable = len(chunk) - len(chunk) % block_bytes
+            pending = chunk[usable:]
+            samples = np.frombuffer(chunk[:usable], dtype='<i2').reshape(-1, FFMPEG_BLOCK)
+            block_mins.append(samples.min(axis=1))
+            block_maxs.append(samples.max(axis=1))
+            total_samples += usable // 2
+        if proc.wait() != 0 and total_samples == 0:
+            return None
+    if total_samples == 0:
+        return np.zeros(0), np.zeros(0), 0.0
+    mins = np.concatenate(block_mins).astype(np.float32) / 32768
+    maxs = np.concatenate(block_maxs).astype(np.float32) / 32768
+    bins = min(bins, len(mins))
+    offsets = np.linspace(0, len(mins), bins + 1).astype(np.int64)[:-1]
+    return (np.minimum.reduceat(mins, offsets), np.maximum.reduceat(maxs, offsets),
+            total_samples / FFMPEG_SAMPLE_RATE)
+
+
+def _downsample(mins, maxs, bins):
+    """由细粒度峰值合并出较粗的级别"""
+    if len(mins) <= bins:
+        return mins, maxs
+    offsets = np.linspace(0, len(mins), bins + 1).astype(np.int64)[:-1]
+    return np.minimum.reduceat(mins, offsets), np.maximum.reduceat(maxs, offsets)
+
+
+def _encode_level(mins, maxs):
+    """峰值量化为 int8 并交错存放 (min, max)，Base64 编码后体积很小"""
+    pairs = np.empty(len(mins) * 2, dtype=np.int8)
+    pairs[0::2] = np.clip(np.round(mins * 127), -127, 127)
+    pairs[1::2] = np.clip(np.round(maxs * 127), -127, 127)
+    return base64.b64encode(pairs.tobytes()).decode('ascii')
+
+
+def compute_waveform(full_path):
+    """计算全部缩放级别的峰值，无法解码时返回空字典"""
+    finest = max(WAVEFORM_LEVELS)
+    result = wav_peaks(full_path, finest)
+    if result is None:
+        result = ffmpeg_peaks(full_path, finest)
+    if result is None:
+        return {}
+    mins, maxs, duration = result
+    levels = {}
+    for level in WAVEFORM_LEVELS:
+        level_mins, level_maxs = _downsample(mins, maxs, level)
+        levels[str(level)] = _encode_level(level_mins, level_maxs)
+    return {'duration': duration, 'levels': levels}
+
+
+@traced('preview.waveform')
+def get_waveform(full_path, level=None):
+    """
+    获取（按 inode/大小/mtime 持久缓存的）波形峰值
+    返回 {'duration', 'level', 'peaks'(Base64 的 int8 min/max 交错数组)}，无法解码时返回 None
+    """
+    waveform = waveform_cache.get_or_compute(full_path, lambda: compute_waveform(full_path))
+    waveform_cache.flush()
+    if not waveform:
+        return None
+    if level not in WAVEFORM_LEVELS:
+        level = WAVEFORM_LEVELS[len(WAVEFORM_LEVELS) // 2]
+    return {'duration': waveform['duration'], 'level': level, 'peaks': waveform['levels'][str(level)]}